@@ -0,0 +1,577 @@
+"""
+Benchmark suite untuk Flask API dan model hot paths (offline, data sintetis)
+- Synthetic detectors, traffic CSV (ukuran bisa diatur) dan stand-in Random Forest kecil
+- Latency percentiles per endpoint lewat Flask test client, throughput (sequential + concurrent)
+- Import / startup time (cold: cache kosong, warm: cache terisi) dan peak RSS per server process
+- Model: latency predict_proba dan ukuran (pickle / compact) vs jumlah trees
+- Hasil disimpan sebagai JSON, bandingkan antar commit dengan --compare
+
+Contoh:
+    python benchmark.py                                   # -> benchmark_results/<commit>-<waktu>.json
+    python benchmark.py --rows 2000000 --detectors 1500   # mendekati ukuran data Marseille
+    python benchmark.py --compare benchmark_results/abc1234-20261017-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_PATH, 'benchmark_results')
+RESULTS_VERSION = 1
+
+# Pusat peta Marseille (sama dengan dashboard) dan luas area sensor sintetis (derajat)
+CENTER_LAT, CENTER_LONG = 43.2965, 5.3698
+SPREAD_LAT, SPREAD_LONG = 0.06, 0.08
+ROAD_TYPES = ['primary', 'secondary', 'tertiary', 'residential', 'trunk']
+
+# Env server saat benchmark: offline, tanpa hot reload / ingest, response cache off
+# (yang diukur adalah jalur komputasi, bukan cache hit)
+SERVER_ENV = {
+    'STARTUP_MODE': 'lazy',
+    'ARTIFACT_WATCH_INTERVAL': '0',
+    'RESPONSE_CACHE_MB': '0',
+    'ARTIFACT_FETCH_WORKERS': '1',
+}
+SERVER_ENV_DROP = ('GDRIVE_', 'INGEST_', 'ARTIFACT_MANIFEST', 'GUNICORN_MASTER_PID', 'CITY_', 'CITIES_DIR')
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+def make_detectors(n_detectors, rng):
+    """detectors_public.csv sintetis: sensor tersebar di sekitar pusat Marseille"""
+    return pd.DataFrame({
+        'detid': [f'BENCH{i:05d}' for i in range(n_detectors)],
+        'length': rng.uniform(0.05, 0.4, n_detectors),
+        'pos': rng.uniform(0, 0.01, n_detectors),
+        'fclass': rng.choice(ROAD_TYPES, n_detectors),
+        'road': [f'Rue Benchmark {i % 97}' for i in range(n_detectors)],
+        'limit': rng.choice([30, 50, 70], n_detectors),
+        'citycode': 'marseille',
+        'lanes': rng.integers(1, 4, n_detectors),
+        'linkid': np.arange(n_detectors),
+        'long': CENTER_LONG + rng.uniform(-SPREAD_LONG, SPREAD_LONG, n_detectors),
+        'lat': CENTER_LAT + rng.uniform(-SPREAD_LAT, SPREAD_LAT, n_detectors),
+    })
+
+
+def make_traffic(detectors, n_rows, rng):
+    """marseille_clean.csv sintetis: occupancy = base per detector + profil jam sibuk + noise"""
+    n_detectors = len(detectors)
+    detector = rng.integers(0, n_detectors, n_rows)
+    minutes = rng.integers(0, 365 * 24 * 60, n_rows)
+    dt = pd.Timestamp('2021-01-01') + pd.to_timedelta(minutes, unit='m')
+    hour = dt.hour.to_numpy()
+    weekday = dt.dayofweek.to_numpy()
+
+    rush = np.exp(-((hour - 8) ** 2) / 4) + np.exp(-((hour - 18) ** 2) / 4)
+    base = rng.uniform(0.02, 0.15, n_detectors)
+    occ = np.clip(base[detector] + 0.12 * rush * (weekday < 5) + rng.normal(0, 0.03, n_rows), 0, 1)
+    flow = np.clip(80 + 900 * occ + rng.normal(0, 40, n_rows), 0, None)
+    return pd.DataFrame({
+        'day': dt.strftime('%Y-%m-%d'),
+        'interval': 180,
+        'detid': detectors['detid'].to_numpy()[detector],
+        'flow': flow.round(1),
+        'occ': occ.round(5),
+        'city': 'marseille',
+        'datetime': dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'hour': hour,
+        'weekday': weekday,
+        'road_type': detectors['fclass'].to_numpy()[detector],
+    })
+
+
+def train_stand_in_forest(df, n_trees, max_depth, seed, max_samples=50000):
+    """Random Forest kecil + encoders dengan feature engineering yang sama seperti serving"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+    from website.features import DEFAULT_FEATURE_COLUMNS, FeatureEncoder, HistoricalFeatures, build_features, \
+        get_time_period
+
+    threshold_low, threshold_high = np.quantile(df['occ'], [0.5, 0.75])
+    encoders = {
+        'road_type': LabelEncoder().fit(ROAD_TYPES),
+        'detector': LabelEncoder().fit(df['detid'].unique()),
+        'time_period': LabelEncoder().fit([get_time_period(h) for h in range(24)]),
+        'feature_columns': list(DEFAULT_FEATURE_COLUMNS),
+        'traffic_level_names': {0: 'Lancar', 1: 'Sedang', 2: 'Macet'},
+        'threshold_low': float(threshold_low),
+        'threshold_high': float(threshold_high),
+    }
+
+    sample = df.sample(min(len(df), max_samples), random_state=seed)
+    X = build_features(FeatureEncoder(encoders), sample['hour'], sample['weekday'], sample['detid'],
+                       sample['road_type'], HistoricalFeatures.from_frame(df), interval=sample['interval'].to_numpy())
+    y = np.digitize(sample['occ'].to_numpy(), [threshold_low, threshold_high])
+    rf_model = RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, random_state=seed, n_jobs=-1)
+    return rf_model.fit(X, y), encoders
+
+
+def make_dataset(directory, n_detectors, n_rows, n_trees, max_depth, seed):
+    """Tulis semua file yang dibaca app.py ke directory (dipakai sebagai BASE_PATH)"""
+    import joblib
+    from website.forest_runtime import export_compact_forest
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, name)
+
+    detectors = make_detectors(n_detectors, rng)
+    detectors.to_csv(path('detectors_public.csv'), index=False)
+    traffic = make_traffic(detectors, n_rows, rng)
+    traffic.to_csv(path('marseille_clean.csv'), index=False)
+
+    rf_model, encoders = train_stand_in_forest(traffic, n_trees, max_depth, seed)
+    joblib.dump(rf_model, path('traffic_model_optimized.pkl'), compress=3)
+    joblib.dump(encoders, path('model_encoders_optimized.pkl'), compress=3)
+    export_compact_forest(rf_model, path('traffic_model_compact.npz'))
+
+    # Prophet predictions: profil 24 jam per sensor (ternormalisasi seperti pipeline Prophet)
+    profile = traffic.groupby(['detid', 'hour'])['occ'].mean().unstack().reindex(detectors['detid'])
+    profile = (profile.T.fillna(profile.mean(axis=1)).T.fillna(0) / max(float(traffic['occ'].max()), 1e-9)).clip(0, 1)
+    predictions = pd.DataFrame({
+        'detid': detectors['detid'], 'road': detectors['road'], 'lat': detectors['lat'], 'long': detectors['long'],
+        'prediction_date': '2026-01-02',
+        'avg_occupancy': profile.mean(axis=1).to_numpy(),
+        'peak_occupancy': profile.max(axis=1).to_numpy(),
+        'min_occupancy': profile.min(axis=1).to_numpy(),
+        'peak_hour': profile.to_numpy().argmax(axis=1),
+    })
+    predictions['predicted_status'] = pd.cut(predictions['avg_occupancy'], [-1, 0.3, 0.6, 2],
+                                             labels=['Lancar', 'Sedang', 'Macet']).astype(str)
+    for hour in range(24):
+        predictions[f'hour_{hour:02d}'] = profile[hour].to_numpy() if hour in profile else 0.0
+    predictions.to_csv(path('sensor_predictions_2026-01-02.csv'), index=False)
+
+    pd.DataFrame({
+        'Model': ['K-Means', 'GMM', 'Spectral'], 'N_Clusters': [3, 3, 3],
+        'Silhouette': [0.23, 0.26, 0.14], 'Davies_Bouldin': [1.63, 1.69, 2.24],
+        'Calinski_Harabasz': [13051.8, 12731.7, 874.6], 'Training_Time': [40.0, 38.8, 2.6],
+        'Status': 'Success', 'Noise_Points': np.nan, 'BIC': np.nan, 'AIC': np.nan, 'Note': ''
+    }).to_csv(path('clustering_models_comparison.csv'), index=False)
+
+    files = sorted(os.listdir(directory))
+    return {
+        'detectors': n_detectors,
+        'rows': n_rows,
+        'trees': n_trees,
+        'max_depth': max_depth,
+        'seed': seed,
+        'files_mb': {f: round(os.path.getsize(path(f)) / 1024 / 1024, 2) for f in files if os.path.isfile(path(f))},
+        'seconds': round(time.perf_counter() - start, 2),
+    }, rf_model, encoders, detectors, traffic
+
+# ============================================================================
+# MODEL HOT PATH (memory vs trees)
+# ============================================================================
+
+def benchmark_model(rf_model, encoders, detectors, traffic, tree_counts, repeats):
+    """
+    Latency predict_proba (sklearn dan CompactForest) dan ukuran model per jumlah trees
+
+    Batch sizes: 1 baris (24hours satu jam), 24 (24hours satu detector),
+    semua detector x 24 jam (map / cube satu hari)
+    """
+    import io
+    import pickle
+    import warnings
+    from optimize_model import median_latency_ms, subset_forest
+    from website.features import FeatureEncoder, HistoricalFeatures, build_features
+    from website.forest_runtime import CompactForest, export_compact_forest
+
+    n = len(detectors)
+    encoder = FeatureEncoder(encoders)
+    historical = HistoricalFeatures.from_frame(traffic)
+    hours = np.tile(np.arange(24), n)
+    days = np.zeros(len(hours), dtype=np.int64)
+    detector_rows = np.repeat(detectors['detid'].to_numpy(), 24)
+    road_rows = np.repeat(detectors['fclass'].to_numpy(), 24)
+    build = lambda: build_features(encoder, hours, days, detector_rows, road_rows, historical)
+    X_day = build()
+    batches = {'1': X_day[:1], '24': X_day[:24], f'{n}x24': X_day}
+
+    results = {
+        # Feature engineering saja, satu hari untuk semua detector
+        'features_ms': {f'{n}x24': round(median_latency_ms(build, repeats), 3)},
+        'trees': []
+    }
+
+    with tempfile.TemporaryDirectory() as tmp, warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for count in tree_counts:
+            subset = subset_forest(rf_model, list(range(count)))
+            subset.n_jobs = 1   # seperti serving: satu request, satu thread
+            compact_path = os.path.join(tmp, f'compact_{count}.npz')
+            export_compact_forest(subset, compact_path)
+            compact = CompactForest.load(compact_path)
+
+            buffer = io.BytesIO()
+            pickle.dump(subset, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+            entry = {
+                'trees': count,
+                'pickle_mb': round(buffer.tell() / 1024 / 1024, 3),
+                'compact_mb': round(os.path.getsize(compact_path) / 1024 / 1024, 3),
+                'compact_nbytes_mb': round(compact.nbytes / 1024 / 1024, 3),
+                'sklearn_ms': {},
+                'compact_ms': {},
+            }
+            for name, X in batches.items():
+                entry['sklearn_ms'][name] = round(median_latency_ms(lambda: subset.predict_proba(X), repeats), 3)
+                entry['compact_ms'][name] = round(median_latency_ms(lambda: compact.predict_proba(X), repeats), 3)
+            results['trees'].append(entry)
+            del compact
+    return results
+
+# ============================================================================
+# SERVER (satu subprocess per run: import time & peak RSS process yang bersih)
+# ============================================================================
+
+def endpoint_cases(detector_ids):
+    """(name, url(i)) untuk setiap endpoint; query berubah per request supaya tidak sama terus"""
+    first = ','.join(detector_ids[:50])
+    lat0, long0 = CENTER_LAT - SPREAD_LAT / 4, CENTER_LONG - SPREAD_LONG / 4
+    bbox = f'{long0:.4f},{lat0:.4f},{long0 + SPREAD_LONG / 2:.4f},{lat0 + SPREAD_LAT / 2:.4f}'
+    slot = lambda i: f'hour={i % 24}&day={(i // 24) % 7}'
+    return [
+        ('models_info', lambda i: '/api/models/info'),
+        ('predict_24hours', lambda i: f'/api/predict/24hours?day={i % 7}&detector={detector_ids[i % len(detector_ids)]}'),
+        ('predict_map', lambda i: f'/api/predict/map?{slot(i)}'),
+        ('predict_map_viewport', lambda i: f'/api/predict/map?{slot(i)}&bbox={bbox}&zoom=14'),
+        ('predict_map_clusters', lambda i: f'/api/predict/map?{slot(i)}&zoom=10'),
+        ('predict_map_columns', lambda i: f'/api/predict/map?{slot(i)}&shape=columns'),
+        ('predict_batch_week', lambda i: f'/api/predict/batch?detectors={first}&start=2026-01-{5 + i % 7:02d}&horizon=168'),
+        ('prophet_predictions', lambda i: f'/api/prophet/predictions?hour={i % 24}'),
+        ('prophet_viewport', lambda i: f'/api/prophet/predictions?hour={i % 24}&bbox={bbox}&zoom=14'),
+        ('prophet_columns', lambda i: f'/api/prophet/predictions?hour={i % 24}&shape=columns'),
+        ('clustering_spectral', lambda i: '/api/clustering/spectral'),
+        ('clustering_models', lambda i: '/api/clustering/models'),
+        ('detectors_list', lambda i: f'/api/detectors/list?limit=50&cursor={i % len(detector_ids)}'),
+        ('detectors_search', lambda i: f'/api/detectors/list?q=benchmark+{i % 97}'),
+    ]
+
+
+def summarize_latencies(latencies_ms):
+    values = np.asarray(latencies_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'min_ms': round(float(values.min()), 3),
+        **{f'p{q}_ms': round(float(np.percentile(values, q)), 3) for q in (50, 90, 95, 99)},
+        'max_ms': round(float(values.max()), 3),
+        'rps': round(len(values) / (values.sum() / 1000), 1) if values.sum() > 0 else None,
+    }
+
+
+def worker_main(args):
+    """Dijalankan di subprocess: import app, tunggu startup, ukur endpoints, tulis JSON"""
+    from memory import process_memory
+
+    result = {}
+    start = time.perf_counter()
+    import app as server
+    result['import_s'] = round(time.perf_counter() - start, 3)
+    ready = server.wait_for_startup(timeout=args.timeout)
+    result['ready_s'] = round(time.perf_counter() - start, 3)
+    result['ready'] = ready
+    result['components'] = {name: {k: state.get(k) for k in ('status', 'seconds', 'error') if k in state}
+                            for name, state in server.startup_state.items()}
+
+    client = server.app.test_client()
+    headers = {'Accept-Encoding': args.accept_encoding} if args.accept_encoding else {}
+    # Spectral clustering dihitung di background (202 sampai selesai)
+    deadline = time.time() + args.timeout
+    while client.get('/api/clustering/spectral').status_code == 202 and time.time() < deadline:
+        time.sleep(0.05)
+    result['spectral_ready_s'] = round(time.perf_counter() - start, 3)
+    result['memory_ready'] = process_memory()
+
+    if not args.startup_only:
+        detector_ids = server.detectors_df['detid'].astype(str).tolist()
+        cases = endpoint_cases(detector_ids)
+        endpoints = {}
+        for name, url in cases:
+            t = time.perf_counter()
+            response = client.get(url(0), headers=headers)
+            cold_ms = (time.perf_counter() - t) * 1000
+            for i in range(args.warmup):
+                client.get(url(i + 1), headers=headers)
+            latencies, statuses, sizes = [], {}, []
+            for i in range(args.requests):
+                t = time.perf_counter()
+                response = client.get(url(args.warmup + 1 + i), headers=headers)
+                body = response.get_data()
+                latencies.append((time.perf_counter() - t) * 1000)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+                sizes.append(len(body))
+            endpoints[name] = {'cold_ms': round(cold_ms, 3), **summarize_latencies(latencies),
+                               'statuses': statuses, 'bytes': int(np.mean(sizes))}
+        result['endpoints'] = endpoints
+
+        # Throughput campuran semua endpoint dengan beberapa thread (seperti gunicorn gthread)
+        def hit(i):
+            name, url = cases[i % len(cases)]
+            return client.get(url(i), headers=headers).status_code
+
+        total = args.concurrency * args.requests
+        t = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            codes = list(pool.map(hit, range(total)))
+        seconds = time.perf_counter() - t
+        result['throughput'] = {
+            'concurrency': args.concurrency,
+            'requests': total,
+            'seconds': round(seconds, 3),
+            'rps': round(total / seconds, 1),
+            'errors': sum(code >= 500 for code in codes),
+        }
+        result['memory_end'] = process_memory()
+
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(args.worker_output, 'w') as f:
+        json.dump(result, f)
+
+
+def run_server(data_dir, args, startup_only):
+    """Satu server process dengan BASE_PATH = data sintetis -> dict hasil worker_main"""
+    output = os.path.join(data_dir, 'worker_result.json')
+    log_path = os.path.join(data_dir, 'worker.log')
+    env = {k: v for k, v in os.environ.items() if not k.startswith(SERVER_ENV_DROP)}
+    env.update(SERVER_ENV, BASE_PATH=data_dir, CACHE_DIR=os.path.join(data_dir, 'cache'),
+               CITIES_DIR=os.path.join(data_dir, 'cities'), RF_RUNTIME=args.runtime)
+    if args.response_cache:
+        env.pop('RESPONSE_CACHE_MB')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--worker-output', output,
+               '--requests', str(args.requests), '--warmup', str(args.warmup),
+               '--concurrency', str(args.concurrency), '--timeout', str(args.timeout),
+               '--accept-encoding', args.accept_encoding]
+    if startup_only:
+        command.append('--startup-only')
+
+    with open(log_path, 'w') as log:
+        output_to = None if args.verbose else log
+        process = subprocess.run(command, cwd=os.path.join(BASE_PATH, 'website'), env=env,
+                                 stdout=output_to, stderr=output_to)
+    if process.returncode != 0 or not os.path.exists(output):
+        with open(log_path) as f:
+            print(f.read()[-4000:])
+        raise RuntimeError(f"Benchmark server failed (exit {process.returncode}), log: {log_path}")
+    with open(output) as f:
+        result = json.load(f)
+    os.remove(output)
+    return result
+
+# ============================================================================
+# RESULTS & COMPARISON
+# ============================================================================
+
+def git_info():
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], cwd=BASE_PATH, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {'commit': git('rev-parse', '--short', 'HEAD') or None,
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def optional_version(name):
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def environment_info():
+    from importlib.metadata import version
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': version('scikit-learn'),
+        'flask': version('flask'),
+        **{name: optional_version(name) for name in ('orjson', 'brotli')},
+    }
+
+
+def flatten_metrics(results):
+    """(metric, value, higher_is_better, noise floor) untuk perbandingan antar run"""
+    metrics = []
+    for run in ('cold', 'warm'):
+        server = results.get('server', {}).get(run, {})
+        for key in ('import_s', 'ready_s', 'spectral_ready_s'):
+            if key in server:
+                metrics.append((f'{run}.{key}', server[key], False, 0.05))
+        if 'peak_rss_mb' in server:
+            metrics.append((f'{run}.peak_rss_mb', server['peak_rss_mb'], False, 5))
+    warm = results.get('server', {}).get('warm', {})
+    for name, stats in warm.get('endpoints', {}).items():
+        for key in ('p50_ms', 'p95_ms'):
+            metrics.append((f'{name}.{key}', stats[key], False, 1.0))
+    if 'throughput' in warm:
+        metrics.append(('throughput.rps', warm['throughput']['rps'], True, 1.0))
+    for entry in results.get('model', {}).get('trees', []):
+        for runtime in ('sklearn_ms', 'compact_ms'):
+            for batch, value in entry[runtime].items():
+                metrics.append((f'model.{entry["trees"]}trees.{runtime[:-3]}.{batch}_ms', value, False, 0.5))
+        metrics.append((f'model.{entry["trees"]}trees.compact_mb', entry['compact_mb'], False, 0.1))
+    return metrics
+
+
+def compare_results(baseline, current, threshold):
+    """Print perubahan per metric; return daftar regressions (> threshold dan > noise floor)"""
+    before = {name: value for name, value, _, _ in flatten_metrics(baseline)}
+    print("\n" + "=" * 60)
+    print(f"📊 COMPARE vs {baseline.get('git', {}).get('commit')} ({baseline.get('timestamp')})")
+    print("=" * 60)
+    print(f"{'Metric':<48} {'Before':>10} {'After':>10} {'Change':>8}")
+    regressions = []
+    for name, value, higher_better, floor in flatten_metrics(current):
+        old = before.get(name)
+        if old is None or value is None:
+            continue
+        change = (value - old) / old if old else 0.0
+        worse = (value < old) if higher_better else (value > old)
+        regressed = worse and abs(change) > threshold and abs(value - old) > floor
+        marker = ' ❌' if regressed else ''
+        print(f"{name:<48} {old:>10.3f} {value:>10.3f} {change:>+7.1%}{marker}")
+        if regressed:
+            regressions.append(name)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) > {threshold:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"\n✅ No regressions > {threshold:.0%}")
+    return regressions
+
+
+def print_summary(results):
+    print("\n" + "=" * 60)
+    print("📈 RESULTS")
+    print("=" * 60)
+    for run in ('cold', 'warm'):
+        server = results['server'][run]
+        print(f"Startup {run:<4}: import {server['import_s']:.2f}s, ready {server['ready_s']:.2f}s, "
+              f"spectral {server['spectral_ready_s']:.2f}s, peak RSS {server['peak_rss_mb']:.1f} MB")
+    warm = results['server']['warm']
+    print(f"\n{'Endpoint':<24} {'cold':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'KB':>8}")
+    for name, stats in warm['endpoints'].items():
+        print(f"{name:<24} {stats['cold_ms']:>8.2f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {stats['rps'] or 0:>8.1f} {stats['bytes'] / 1024:>8.1f}")
+    throughput = warm['throughput']
+    print(f"\nThroughput ({throughput['concurrency']} threads, mixed): {throughput['rps']:.1f} req/s, "
+          f"{throughput['errors']} errors")
+    print(f"\n{'Trees':>6} {'pickle MB':>10} {'compact MB':>11} {'sklearn ms':>22} {'compact ms':>22}")
+    for entry in results['model']['trees']:
+        sk = '/'.join(f'{v:g}' for v in entry['sklearn_ms'].values())
+        cf = '/'.join(f'{v:g}' for v in entry['compact_ms'].values())
+        print(f"{entry['trees']:>6} {entry['pickle_mb']:>10.2f} {entry['compact_mb']:>11.2f} {sk:>22} {cf:>22}")
+    print(f"(batch sizes: {', '.join(results['model']['trees'][0]['sklearn_ms'])})")
+
+
+def main(args):
+    print("=" * 60)
+    print("⏱️  TRAFFIC PREDICTION BENCHMARK")
+    print("=" * 60)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='traffic_benchmark_')
+    if os.path.exists(os.path.join(data_dir, 'cache')):
+        shutil.rmtree(os.path.join(data_dir, 'cache'))
+
+    try:
+        print(f"\n📦 Synthetic data: {args.detectors} detectors, {args.rows:,} rows, {args.trees} trees -> {data_dir}")
+        dataset, rf_model, encoders, detectors, traffic = make_dataset(
+            data_dir, args.detectors, args.rows, args.trees, args.depth, args.seed)
+        print(f"   {dataset['seconds']}s, files: {dataset['files_mb']}")
+
+        print("\n🌲 Model hot path (predict_proba vs trees)...")
+        tree_counts = sorted({max(1, args.trees // 4), max(1, args.trees // 2), args.trees})
+        model = benchmark_model(rf_model, encoders, detectors, traffic, tree_counts, args.model_repeats)
+        del rf_model, traffic
+
+        print("\n🧊 Server cold start (empty cache)...")
+        cold = run_server(data_dir, args, startup_only=True)
+        print(f"   import {cold['import_s']}s, ready {cold['ready_s']}s, peak RSS {cold['peak_rss_mb']} MB")
+        print(f"\n🔥 Server warm start + endpoints ({args.requests} requests each)...")
+        warm = run_server(data_dir, args, startup_only=False)
+    finally:
+        if not args.data_dir and not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git': git_info(),
+        'environment': environment_info(),
+        'params': {key: getattr(args, key) for key in ('detectors', 'rows', 'trees', 'depth', 'seed', 'requests',
+                                                       'warmup', 'concurrency', 'runtime', 'response_cache',
+                                                       'accept_encoding')},
+        'dataset': dataset,
+        'model': model,
+        'server': {'cold': cold, 'warm': warm},
+    }
+    print_summary(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{results['git']['commit'] or 'nogit'}-{stamp}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare_results(json.load(f), results, args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Flask API dan model hot paths dengan data sintetis")
+    parser.add_argument('--detectors', type=int, default=300)
+    parser.add_argument('--rows', type=int, default=200000, help="Baris traffic CSV sintetis")
+    parser.add_argument('--trees', type=int, default=25, help="Trees stand-in forest (production: 25)")
+    parser.add_argument('--depth', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=50, help="Timed requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4, help="Threads untuk throughput campuran")
+    parser.add_argument('--model-repeats', type=int, default=7)
+    parser.add_argument('--runtime', choices=['auto', 'sklearn'], default='auto',
+                        help="RF_RUNTIME server (auto = compact forest jika ada)")
+    parser.add_argument('--response-cache', action='store_true', help="Aktifkan response cache (default off)")
+    parser.add_argument('--accept-encoding', default='gzip, deflate, br',
+                        help="Header Accept-Encoding per request ('' = tanpa kompresi); bytes = ukuran di wire")
+    parser.add_argument('--timeout', type=float, default=600, help="Batas waktu startup server (detik)")
+    parser.add_argument('--output', help="File JSON hasil (default benchmark_results/<commit>-<waktu>.json)")
+    parser.add_argument('--compare', help="JSON hasil sebelumnya; exit 1 jika ada regression")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Batas regression relatif (0.25 = 25%%)")
+    parser.add_argument('--data-dir', help="Directory data sintetis (default temp, dihapus setelah selesai)")
+    parser.add_argument('--keep-data', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Tampilkan log server")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-output', help=argparse.SUPPRESS)
+    parser.add_argument('--startup-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, os.path.join(BASE_PATH, 'website'))
+        worker_main(args)
+    else:
+        sys.exit(main(args))
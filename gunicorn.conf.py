@@ -0,0 +1,53 @@
+# ============================================================================
+# GUNICORN CONFIG - Shared model loading across workers
+# ============================================================================
+# PRELOAD_APP=1 (default): app.py (model, detectors, aggregates, cube) di-load
+# sekali di master sebelum fork. Workers berbagi pages tersebut via copy-on-write,
+# jadi memory hampir flat saat WEB_CONCURRENCY dinaikkan. gc.freeze() memindahkan
+# semua object ke permanent generation supaya garbage collector di worker tidak
+# menyentuh (dan meng-copy) pages milik master.
+#
+# PRELOAD_APP=0: setiap worker load sendiri (memory x jumlah worker), tapi
+# worker bisa di-restart tanpa restart master.
+#
+# STARTUP_MODE (lihat STARTUP di app.py) menentukan kapan data di-load:
+#   lazy (default): import app.py hanya library + routes, jadi port langsung
+#     dibuka. Setiap worker me-load model/data di background threads
+#     (post_worker_init). Preload tetap membagi pages library (pandas, sklearn);
+#     compact forest dan prediction cube di-mmap sehingga tetap dibagi lewat page
+#     cache, tapi traffic aggregates / detectors ada per worker.
+#   eager: semua di-load di master sebelum fork (memory paling kecil), tapi port
+#     baru dibuka setelah loading selesai.
+# Threads (startup, spectral clustering, artifact downloads, watcher, tailer) tidak
+# pernah dimulai di master: fork dari process dengan threads bisa mewarisi lock yang
+# sedang dipegang. Semuanya dimulai per worker di post_worker_init.
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'website'))
+from memory import process_memory  # noqa: E402
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Workers membaca ini untuk /api/system/memory (report semua worker)
+os.environ['GUNICORN_MASTER_PID'] = str(os.getpid())
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+    server.log.info(f"Master memory: {process_memory()} (preload={preload_app}, workers={workers})")
+
+
+def post_worker_init(worker):
+    if preload_app:
+        # Background threads (lazy startup, INGEST_TAIL_PATH tailer) tidak ikut fork dari master
+        app_module = sys.modules.get('app')
+        if app_module is not None and hasattr(app_module, 'start_worker_threads'):
+            app_module.start_worker_threads()
+    worker.log.info(f"Worker {worker.pid} memory: {process_memory()}")
@@ -3,13 +3,22 @@ Optimize Random Forest model untuk reduce file size
 - Convert float64 → float32 (50% reduction)
 - Compress dengan joblib
 - Optional: reduce number of trees
+- Export ke compact flat-array format (website/forest_runtime.py)
 """
+import argparse
+import copy
 import pickle
+import time
 import joblib
 import numpy as np
+import pandas as pd
 import os
+import warnings
 
-def optimize_random_forest(input_path, output_path, n_estimators_keep=None, compress_level=9):
+from website.features import FeatureEncoder, HistoricalFeatures, build_features
+from website.forest_runtime import CompactForest, compact_arrays_from_sklearn, export_compact_forest
+
+def optimize_random_forest(input_path, output_path, n_estimators_keep=None, compress_level=9, tree_indices=None):
     """
     Optimize Random Forest model untuk reduce size
     
@@ -18,6 +27,7 @@ def optimize_random_forest(input_path, output_path, n_estimators_keep=None, comp
         output_path: Path untuk save optimized model
         n_estimators_keep: Berapa trees yang mau dikeep (None = semua)
         compress_level: 0-9, higher = smaller file but slower
+        tree_indices: Index trees yang dikeep (hasil benchmark_tree_pruning), override n_estimators_keep
     """
     print("=" * 60)
     print("🔧 OPTIMIZING RANDOM FOREST MODEL")
@@ -33,7 +43,11 @@ def optimize_random_forest(input_path, output_path, n_estimators_keep=None, comp
     print(f"   Number of trees: {len(rf_model.estimators_)}")
     
     # Option 1: Reduce number of trees
-    if n_estimators_keep and n_estimators_keep < len(rf_model.estimators_):
+    if tree_indices is not None:
+        print(f"\n✂️  Keeping selected trees: {len(rf_model.estimators_)} → {len(tree_indices)}")
+        rf_model.estimators_ = [rf_model.estimators_[i] for i in tree_indices]
+        rf_model.n_estimators = len(tree_indices)
+    elif n_estimators_keep and n_estimators_keep < len(rf_model.estimators_):
         print(f"\n✂️  Reducing trees: {len(rf_model.estimators_)} → {n_estimators_keep}")
         rf_model.estimators_ = rf_model.estimators_[:n_estimators_keep]
         rf_model.n_estimators = n_estimators_keep
@@ -41,6 +55,7 @@ def optimize_random_forest(input_path, output_path, n_estimators_keep=None, comp
     
     # Note: Cannot convert tree internals to float32 (read-only)
     # Compression will still reduce size significantly
+    # (float32 thresholds: lihat export_compact_model)
     
     # Save with compression
     print(f"\n💾 Saving optimized model with compression level {compress_level}...")
@@ -59,6 +74,277 @@ def optimize_random_forest(input_path, output_path, n_estimators_keep=None, comp
     
     return rf_model
 
+def export_compact_model(rf_model, output_path):
+    """
+    Export Random Forest ke compact format (flat arrays, float32 thresholds, int16/int32 index)
+    
+    File .npz bisa di-load oleh website/app.py sebagai pengganti sklearn object
+    (CompactForest, pure NumPy inference, memory-mapped).
+    """
+    print("\n" + "=" * 60)
+    print("📦 EXPORTING COMPACT FOREST")
+    print("=" * 60)
+    
+    arrays = export_compact_forest(rf_model, output_path)
+    compact_size = os.path.getsize(output_path)
+    
+    print(f"   Trees:  {len(arrays['roots'])}")
+    print(f"   Nodes:  {len(arrays['feature']):,}")
+    print(f"   Leaves: {len(arrays['value']):,}")
+    print(f"   Size:   {compact_size:,} bytes ({compact_size/1024/1024:.1f} MB)")
+    print(f"   Saved to: {output_path}")
+    
+    return compact_size
+
+def sample_feature_space(rf_model, n_samples=20000, seed=42):
+    """
+    Random feature matrix yang mencakup semua split threshold model
+    
+    Setiap feature diambil uniform dari [min threshold - 1, max threshold + 1], ditambah
+    baris yang tepat berada di threshold (kasus batas <= pada float32).
+    """
+    rng = np.random.default_rng(seed)
+    n_features = rf_model.n_features_in_
+    low = np.zeros(n_features)
+    high = np.ones(n_features)
+    boundary = []
+    
+    for estimator in rf_model.estimators_:
+        tree = estimator.tree_
+        internal = tree.feature >= 0
+        for feature in np.unique(tree.feature[internal]):
+            thresholds = tree.threshold[internal & (tree.feature == feature)]
+            low[feature] = min(low[feature], thresholds.min() - 1)
+            high[feature] = max(high[feature], thresholds.max() + 1)
+        boundary.append(np.stack([tree.feature[internal], tree.threshold[internal]], axis=1)[:50])
+    
+    X = rng.uniform(low, high, size=(n_samples, n_features))
+    boundary = np.concatenate(boundary)
+    X_boundary = rng.uniform(low, high, size=(len(boundary), n_features))
+    X_boundary[np.arange(len(boundary)), boundary[:, 0].astype(int)] = boundary[:, 1]
+    return np.vstack([X, X_boundary]).astype(np.float32)
+
+def verify_compact_model(rf_model, compact_path, X=None, atol=1e-6):
+    """
+    Equivalence check: CompactForest.predict_proba vs sklearn predict_proba
+    
+    Raises:
+        AssertionError jika probabilitas berbeda > atol atau kelas prediksi berbeda
+    """
+    if X is None:
+        X = sample_feature_space(rf_model)
+    
+    compact = CompactForest.load(compact_path)
+    with warnings.catch_warnings():
+        # Model di-fit dengan feature names, X di sini plain ndarray
+        warnings.simplefilter('ignore', UserWarning)
+        expected = rf_model.predict_proba(X)
+    actual = compact.predict_proba(X)
+    
+    max_diff = float(np.abs(expected - actual).max())
+    mismatches = int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+    print(f"\n🔍 Compact vs sklearn on {len(X):,} samples: max |Δp| = {max_diff:.2e}, class mismatches = {mismatches}")
+    
+    assert max_diff <= atol, f"predict_proba differs by {max_diff} (> {atol})"
+    assert mismatches == 0, f"{mismatches} predicted classes differ"
+    assert np.array_equal(compact.classes_, rf_model.classes_), "classes_ differ"
+    print("✅ Compact forest matches sklearn predict_proba")
+    return max_diff
+
+# ============================================================================
+# TREE PRUNING BENCHMARK (accuracy vs size)
+# ============================================================================
+
+def load_holdout(csv_path, encoders, max_samples=50000, test_size=0.2, random_state=42):
+    """
+    Holdout set dari marseille_clean.csv dengan feature engineering yang sama seperti notebook
+    
+    Split train/test sama persis dengan training (test_size=0.2, random_state=42, stratify=y),
+    lalu test set di-subsample ke max_samples.
+    
+    Returns:
+        (X, y) - DataFrame dengan encoders['feature_columns'] dan label 0/1/2
+    """
+    from sklearn.model_selection import train_test_split
+    
+    print(f"\n📂 Building holdout set from {csv_path}...")
+    df = pd.read_csv(csv_path)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df['hour'] = df['datetime'].dt.hour
+    
+    # Feature engineering yang sama dengan serving (website/features.py)
+    encoder = FeatureEncoder(encoders)
+    features = build_features(encoder, df['hour'], df['datetime'].dt.dayofweek, df['detid'].astype(str),
+                              df['road_type'], HistoricalFeatures.from_frame(df),
+                              interval=df['interval'].to_numpy(), fill_missing=False)
+    
+    y = np.digitize(df['occ'].to_numpy(), [encoders['threshold_low'], encoders['threshold_high']])
+    X = pd.DataFrame(features, columns=encoder.feature_columns)
+    X = X.fillna(X.median())
+    
+    _, X_test, _, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
+    if len(X_test) > max_samples:
+        rng = np.random.default_rng(random_state)
+        keep = np.sort(rng.choice(len(X_test), max_samples, replace=False))
+        X_test, y_test = X_test.iloc[keep], y_test[keep]
+    print(f"   Holdout: {len(X_test):,} samples")
+    return X_test, y_test
+
+def subset_forest(rf_model, tree_indices):
+    """Shallow copy forest dengan hanya trees terpilih"""
+    subset = copy.copy(rf_model)
+    subset.estimators_ = [rf_model.estimators_[i] for i in tree_indices]
+    subset.n_estimators = len(tree_indices)
+    return subset
+
+def tree_orderings(tree_proba, y_select, classes):
+    """
+    Urutan trees untuk setiap strategi seleksi (ensemble N = N trees pertama di urutan)
+    
+    - first_n:          urutan asli (seperti n_estimators_keep)
+    - best_individual:  accuracy individual tertinggi dulu
+    - diversity:        mulai dari tree terbaik, lalu greedy tambah tree yang paling sering
+                        tidak setuju dengan ensemble saat ini (kandidat: accuracy >= median)
+    """
+    n_trees = len(tree_proba)
+    tree_pred = classes[tree_proba.argmax(axis=2)]
+    accuracy = (tree_pred == y_select).mean(axis=1)
+    
+    orderings = {
+        'first_n': list(range(n_trees)),
+        'best_individual': list(np.argsort(-accuracy, kind='stable'))
+    }
+    
+    candidates = set(np.flatnonzero(accuracy >= np.median(accuracy)))
+    chosen = [int(np.argmax(accuracy))]
+    candidates.discard(chosen[0])
+    ensemble_sum = tree_proba[chosen[0]].astype(np.float64)
+    while candidates:
+        ensemble_pred = ensemble_sum.argmax(axis=1)
+        best = max(candidates, key=lambda t: ((tree_proba[t].argmax(axis=1) != ensemble_pred).mean(), accuracy[t]))
+        chosen.append(best)
+        candidates.discard(best)
+        ensemble_sum += tree_proba[best]
+    # Trees di bawah median ditambahkan terakhir, urut accuracy
+    chosen += [t for t in orderings['best_individual'] if t not in set(chosen)]
+    orderings['diversity'] = [int(t) for t in chosen]
+    return orderings
+
+def median_latency_ms(fn, repeats=7):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def benchmark_tree_pruning(rf_model, X, y, output_csv='tree_pruning_benchmark.csv', tree_counts=None,
+                           tolerance=0.005, batch_size=169, random_state=42):
+    """
+    Sweep jumlah trees x strategi seleksi, ukur accuracy / size / load time / latency
+    
+    Holdout dibagi dua: separuh untuk memilih trees (selection), separuh untuk accuracy
+    yang dilaporkan (evaluation), supaya seleksi tidak overfit ke angka yang dilaporkan.
+    
+    Args:
+        rf_model: RandomForestClassifier (semua trees)
+        X, y: Holdout set (lihat load_holdout)
+        output_csv: Path hasil (format seperti clustering_models_comparison.csv)
+        tree_counts: List jumlah trees yang diuji (default: 5, 10, 15, 25, 35, 50, 75, 100, ..., semua)
+        tolerance: Penurunan accuracy maksimum vs full model untuk rekomendasi
+        batch_size: Ukuran batch untuk latency (default: jumlah sensor Marseille di /api/predict/map)
+    
+    Returns:
+        (results_df, best) - best = dict row terpilih + 'tree_indices'
+    """
+    print("\n" + "=" * 60)
+    print("📊 TREE PRUNING BENCHMARK")
+    print("=" * 60)
+    
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(len(X))
+    select_idx, eval_idx = order[: len(X) // 2], order[len(X) // 2:]
+    classes = np.asarray(rf_model.classes_)
+    n_total = len(rf_model.estimators_)
+    
+    if tree_counts is None:
+        tree_counts = [5, 10, 15, 25, 35, 50, 75, 100, 150, 200, 300, 500]
+    tree_counts = sorted({n for n in tree_counts if n < n_total} | {n_total})
+    
+    # Per-tree predictions dan biaya (size/load additive per tree), dihitung sekali
+    print(f"   Scoring {n_total} trees on {len(X):,} holdout samples...")
+    tree_proba = np.empty((n_total, len(X), len(classes)), dtype=np.float32)
+    tree_bytes = np.empty(n_total, dtype=np.int64)
+    tree_load_s = np.empty(n_total)
+    tree_nodes = np.empty(n_total, dtype=np.int64)
+    tree_leaves = np.empty(n_total, dtype=np.int64)
+    for t, estimator in enumerate(rf_model.estimators_):
+        tree_proba[t] = estimator.predict_proba(X)
+        blob = pickle.dumps(estimator, protocol=pickle.HIGHEST_PROTOCOL)
+        tree_bytes[t] = len(blob)
+        start = time.perf_counter()
+        pickle.loads(blob)
+        tree_load_s[t] = time.perf_counter() - start
+        tree_nodes[t] = estimator.tree_.node_count
+        tree_leaves[t] = int((estimator.tree_.children_left == -1).sum())
+    
+    # Compact format: int16 feature + float32 threshold + 2x int32 children per node, 3x float32 per leaf
+    compact_bytes = tree_nodes * (2 + 4 + 8) + tree_leaves * 4 * len(classes)
+    
+    orderings = tree_orderings(tree_proba[:, select_idx], y[select_idx], classes)
+    batch = X[eval_idx[:batch_size]]
+    
+    rows = []
+    for strategy, ordering in orderings.items():
+        for n in tree_counts:
+            trees = ordering[:n]
+            proba = tree_proba[trees][:, eval_idx].mean(axis=0)
+            accuracy = float((classes[proba.argmax(axis=1)] == y[eval_idx]).mean())
+            
+            subset = subset_forest(rf_model, trees)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                latency = median_latency_ms(lambda: subset.predict_proba(batch))
+            compact = CompactForest(compact_arrays_from_sklearn(subset))
+            compact_latency = median_latency_ms(lambda: compact.predict_proba(batch))
+            
+            rows.append({
+                'Strategy': strategy,
+                'N_Trees': n,
+                'Accuracy': accuracy,
+                'Model_Bytes': int(tree_bytes[trees].sum()),
+                'Compact_Bytes': int(compact_bytes[trees].sum()),
+                'Load_Time': float(tree_load_s[trees].sum()),
+                'Latency_ms': latency,
+                'Compact_Latency_ms': compact_latency,
+                'Batch_Size': len(batch)
+            })
+            print(f"   {strategy:16s} {n:4d} trees  acc={accuracy:.4f}  "
+                  f"size={rows[-1]['Model_Bytes']/1024/1024:8.1f} MB  latency={latency:6.1f} ms")
+    
+    results = pd.DataFrame(rows)
+    full_accuracy = results.loc[(results['Strategy'] == 'first_n') & (results['N_Trees'] == n_total), 'Accuracy'].iloc[0]
+    results['Accuracy_Drop'] = full_accuracy - results['Accuracy']
+    
+    # Ensemble terkecil (lalu accuracy tertinggi) dalam toleransi
+    within = results[results['Accuracy_Drop'] <= tolerance].sort_values(['N_Trees', 'Accuracy'], ascending=[True, False])
+    best_idx = within.index[0]
+    results['Selected'] = results.index == best_idx
+    results.to_csv(output_csv, index=False)
+    
+    best = results.loc[best_idx].to_dict()
+    best['tree_indices'] = [int(t) for t in orderings[best['Strategy']][:int(best['N_Trees'])]]
+    
+    print("\n" + "=" * 60)
+    print(f"✅ Full model ({n_total} trees): accuracy {full_accuracy:.4f}")
+    print(f"✅ Selected: {best['Strategy']} with {int(best['N_Trees'])} trees, accuracy {best['Accuracy']:.4f} "
+          f"(drop {best['Accuracy_Drop']:.4f} <= {tolerance}), {best['Model_Bytes']/1024/1024:.1f} MB")
+    print(f"   Results saved to: {output_csv}")
+    print("=" * 60)
+    return results, best
+
 def optimize_encoders(input_path, output_path, compress_level=9):
     """Optimize encoders file"""
     print("\n" + "=" * 60)
@@ -84,16 +370,47 @@ def optimize_encoders(input_path, output_path, compress_level=9):
     return encoders
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize / benchmark Random Forest model")
+    parser.add_argument('--trees', type=int, default=25,
+                        help="Jumlah trees yang dikeep (default 25, untuk Railway 512MB RAM)")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Sweep jumlah trees x strategi seleksi, simpan ke tree_pruning_benchmark.csv")
+    parser.add_argument('--data', default="marseille_clean.csv", help="Traffic data untuk holdout set")
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help="Penurunan accuracy maksimum untuk ensemble terpilih")
+    parser.add_argument('--holdout-samples', type=int, default=50000)
+    parser.add_argument('--apply', action='store_true',
+                        help="Dengan --benchmark: simpan model optimized memakai trees terpilih")
+    args = parser.parse_args()
+    
     # File paths
     rf_model_input = "traffic_model_time_location.pkl"
     rf_model_output = "traffic_model_optimized.pkl"
+    compact_output = "traffic_model_compact.npz"
     
     encoders_input = "model_encoders_revised.pkl"
     encoders_output = "model_encoders_optimized.pkl"
     
+    tree_indices = None
+    if args.benchmark:
+        with open(rf_model_input, 'rb') as f:
+            full_model = pickle.load(f)
+        encoders = joblib.load(encoders_input if os.path.exists(encoders_input) else encoders_output)
+        X_holdout, y_holdout = load_holdout(args.data, encoders, max_samples=args.holdout_samples)
+        _, best = benchmark_tree_pruning(full_model, X_holdout, y_holdout, tolerance=args.tolerance)
+        del full_model
+        if not args.apply:
+            raise SystemExit(0)
+        tree_indices = best['tree_indices']
+    
     # Optimize Random Forest
-    # Reduce to 25 trees untuk fit Railway 512MB RAM
-    optimize_random_forest(rf_model_input, rf_model_output, n_estimators_keep=25, compress_level=9)
+    # Reduce to 25 trees untuk fit Railway 512MB RAM (atau trees terpilih dari benchmark)
+    rf_model = optimize_random_forest(rf_model_input, rf_model_output, n_estimators_keep=args.trees,
+                                      compress_level=9, tree_indices=tree_indices)
+    
+    # Export compact format + equivalence check terhadap sklearn
+    export_compact_model(rf_model, compact_output)
+    verify_compact_model(rf_model, compact_output)
     
     # Optimize Encoders
     if os.path.exists(encoders_input):
@@ -104,6 +421,7 @@ if __name__ == "__main__":
     print("=" * 60)
     print("1. Upload file optimized ke Google Drive:")
     print(f"   - {rf_model_output}")
+    print(f"   - {compact_output} (optional, set GDRIVE_RF_COMPACT)")
     print(f"   - {encoders_output}")
     print("2. Update File ID di Railway environment variables")
     print("3. Update app.py untuk load dengan joblib.load()")
@@ -0,0 +1,400 @@
+"""
+Offline Prophet forecast pipeline -> sensor_predictions_YYYY-MM-DD.csv
+- Fit Prophet per detector dari marseille_clean.csv (sama seperti notebook)
+- Process pool: skala dengan jumlah core, memory cap per worker (RLIMIT_AS)
+- Failure isolation: sensor yang error/crash memakai historical average
+- Resumable: hasil per sensor di-checkpoint, run yang terputus dilanjutkan
+- Report fit time per sensor (prophet_fit_times_YYYY-MM-DD.csv)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+MIN_SAMPLES = 48          # Minimum raw records untuk Prophet (notebook)
+MIN_STD = 0.001           # Series tanpa variasi -> historical average
+DEFAULT_OCC = 0.3         # Default jam tanpa data (notebook)
+MAX_CRASHES = 2           # Sensor yang membuat worker crash 2x -> fallback
+PROPHET_PARAMS = {
+    'daily_seasonality': True,
+    'weekly_seasonality': True,
+    'yearly_seasonality': False,
+    'changepoint_prior_scale': 0.05,
+    'seasonality_mode': 'multiplicative'
+}
+
+
+def categorize_status(occ):
+    """Status berdasarkan peak occupancy (threshold notebook 30% / 60%)"""
+    if occ < 0.3:
+        return 'Lancar'
+    elif occ < 0.6:
+        return 'Sedang'
+    return 'Macet'
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# ============================================================================
+# DATA PREPARATION
+# ============================================================================
+
+def load_hourly_series(csv_path, detector_ids, chunksize=500_000):
+    """
+    Aggregate marseille_clean.csv per (detector, jam) secara streaming
+
+    Returns:
+        DataFrame (detid, ds, occ_sum, count), urut per detid lalu ds
+    """
+    parts = []
+    reader = pd.read_csv(csv_path, usecols=['detid', 'datetime', 'occ'],
+                         dtype={'detid': str, 'occ': 'float32'}, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk['detid'].isin(detector_ids)].dropna(subset=['occ'])
+        if len(chunk) == 0:
+            continue
+        ds = pd.to_datetime(chunk['datetime']).dt.floor('h')
+        parts.append(chunk.groupby([chunk['detid'], ds.rename('ds')])['occ'].agg(occ_sum='sum', count='count'))
+
+    if not parts:
+        return pd.DataFrame(columns=['detid', 'ds', 'occ_sum', 'count'])
+    hourly = pd.concat(parts).groupby(level=[0, 1]).sum().reset_index()
+    return hourly.sort_values(['detid', 'ds'], ignore_index=True)
+
+
+def build_tasks(hourly, prediction_date):
+    """Satu task per detector: series per jam + historical average per jam (fallback)"""
+    tasks = []
+    for detid, group in hourly.groupby('detid', sort=True):
+        hour_of_day = group['ds'].dt.hour.to_numpy()
+        sums = np.bincount(hour_of_day, weights=group['occ_sum'].to_numpy(), minlength=24)
+        counts = np.bincount(hour_of_day, weights=group['count'].to_numpy(), minlength=24)
+        pattern = np.where(counts > 0, sums / np.where(counts > 0, counts, 1), DEFAULT_OCC)
+        tasks.append({
+            'detid': detid,
+            'ds': group['ds'].to_numpy(dtype='datetime64[ns]'),
+            'y': (group['occ_sum'] / group['count']).to_numpy(dtype=np.float64),
+            'n_samples': int(group['count'].sum()),
+            'pattern': pattern.tolist(),
+            'prediction_date': prediction_date
+        })
+    return tasks
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def init_worker(max_memory_mb):
+    """Initializer process pool: memory cap dan satu thread numerik per worker"""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = '1'
+    if max_memory_mb:
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def fallback_result(task, error=None, fit_seconds=0.0):
+    return {
+        'detid': task['detid'],
+        'method': 'pattern',
+        'hourly': [float(v) for v in task['pattern']],
+        'n_samples': task['n_samples'],
+        'fit_seconds': round(fit_seconds, 3),
+        'error': error
+    }
+
+
+def forecast_sensor(task, pattern_only=False):
+    """Prediksi 24 jam untuk satu detector (Prophet, atau historical average)"""
+    start = time.perf_counter()
+    y = task['y']
+    if pattern_only or task['n_samples'] < MIN_SAMPLES or len(y) < 2 or np.std(y, ddof=1) < MIN_STD:
+        return fallback_result(task)
+
+    try:
+        import logging
+        from cmdstanpy.utils import get_logger
+        from prophet import Prophet
+        # Logger cmdstanpy dibuat lazy (level DEBUG + handler INFO): "Chain [1] start processing" per fit
+        get_logger().setLevel(logging.WARNING)
+
+        model = Prophet(**PROPHET_PARAMS)
+        model.fit(pd.DataFrame({'ds': task['ds'], 'y': y}))
+        future = pd.DataFrame({'ds': pd.date_range(task['prediction_date'], periods=24, freq='h')})
+        forecast = model.predict(future)
+        hourly = np.clip(forecast['yhat'].to_numpy(), 0, 1)
+    except Exception as e:
+        # Termasuk MemoryError dari RLIMIT_AS: sensor ini saja yang fallback
+        return fallback_result(task, error=f"{type(e).__name__}: {e}", fit_seconds=time.perf_counter() - start)
+
+    return {
+        'detid': task['detid'],
+        'method': 'prophet',
+        'hourly': [float(v) for v in hourly],
+        'n_samples': task['n_samples'],
+        'fit_seconds': round(time.perf_counter() - start, 3),
+        'error': None
+    }
+
+
+# ============================================================================
+# CHECKPOINTS
+# ============================================================================
+
+def load_checkpoint(work_dir, run_info):
+    """Hasil sensor yang sudah selesai; kosong jika run sebelumnya memakai input/parameter lain"""
+    run_path = os.path.join(work_dir, 'run.json')
+    checkpoint_path = os.path.join(work_dir, 'checkpoint.jsonl')
+    if os.path.exists(run_path):
+        with open(run_path) as f:
+            previous = json.load(f)
+        if previous != run_info:
+            print("⚠ Input/parameter berubah sejak checkpoint terakhir, mulai dari awal")
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+
+    os.makedirs(work_dir, exist_ok=True)
+    with open(run_path, 'w') as f:
+        json.dump(run_info, f, indent=2)
+
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'rb+') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Baris terakhir terpotong (proses dihentikan saat menulis)
+                done[result['detid']] = result
+            # Tutup baris terpotong supaya append berikutnya mulai di baris baru
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+    return done
+
+
+def append_checkpoint(f, result):
+    f.write(json.dumps(result) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def run_pool(tasks, jobs, max_memory_mb, tasks_per_child, pattern_only, on_result):
+    """
+    Jalankan forecast_sensor di process pool, maksimal 2 x jobs task in-flight
+
+    Jika worker mati (OOM killer, segfault di Stan), pool dibuat ulang dan sensor yang
+    sedang berjalan dicoba lagi; setelah MAX_CRASHES kali sensor tersebut fallback.
+    """
+    pending = deque(tasks)
+    crashes = {}
+    context = multiprocessing.get_context('spawn')
+
+    while pending:
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=init_worker,
+                                   initargs=(max_memory_mb,), max_tasks_per_child=tasks_per_child)
+        in_flight = {}
+        broken = False
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < 2 * jobs and not broken:
+                    task = pending.popleft()
+                    in_flight[pool.submit(forecast_sensor, task, pattern_only)] = task
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = in_flight.pop(future)
+                    try:
+                        on_result(future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        crashes[task['detid']] = crashes.get(task['detid'], 0) + 1
+                        if crashes[task['detid']] >= MAX_CRASHES:
+                            on_result(fallback_result(task, error='Worker process crashed'))
+                        else:
+                            pending.append(task)
+                if broken and not in_flight:
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if broken:
+            print(f"⚠ Worker crashed, restarting pool ({len(pending)} sensors remaining)")
+
+
+def build_predictions(results, sensors, prediction_date):
+    """DataFrame dengan schema sensor_predictions notebook"""
+    rows = []
+    sensors = sensors.drop_duplicates('detid').set_index('detid')
+    for detid in sorted(results):
+        if detid not in sensors.index:
+            continue
+        hourly = results[detid]['hourly']
+        sensor = sensors.loc[detid]
+        peak = float(np.max(hourly))
+        row = {
+            'detid': detid,
+            'road': sensor.get('road', 'N/A'),
+            'lat': sensor['lat'],
+            'long': sensor['long'],
+            'prediction_date': prediction_date,
+            'avg_occupancy': float(np.mean(hourly)),
+            'peak_occupancy': peak,
+            'min_occupancy': float(np.min(hourly)),
+            'peak_hour': int(np.argmax(hourly)),
+            'predicted_status': categorize_status(peak)
+        }
+        for h in range(24):
+            row[f'hour_{h:02d}'] = hourly[h]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def run_pipeline(data_path, detectors_path, prediction_date, output_dir='.', work_dir=None, jobs=None,
+                 max_memory_mb=2048, tasks_per_child=50, pattern_only=False, limit=None):
+    """
+    Forecast semua detector Marseille dan tulis sensor_predictions_<date>.csv
+
+    Args:
+        data_path: marseille_clean.csv
+        detectors_path: detectors_public.csv (lokasi sensor)
+        prediction_date: Tanggal target (YYYY-MM-DD), 24 jam mulai 00:00
+        output_dir: Folder output (app membaca sensor_predictions_* terbaru dari root)
+        work_dir: Folder checkpoint (default prophet_runs/<date>)
+        jobs: Jumlah worker process (default semua core)
+        max_memory_mb: RLIMIT_AS per worker (0 = tanpa batas)
+        tasks_per_child: Worker di-recycle setelah N sensor (membatasi memory growth)
+        pattern_only: Lewati Prophet, pakai historical average
+        limit: Hanya N sensor pertama (testing)
+    """
+    print("=" * 60)
+    print("🔮 PROPHET FORECAST PIPELINE")
+    print("=" * 60)
+    jobs = jobs or os.cpu_count() or 1
+    work_dir = work_dir or os.path.join('prophet_runs', prediction_date)
+
+    sensors = pd.read_csv(detectors_path)
+    sensors = sensors[sensors['citycode'] == 'marseille'].copy()
+    sensors['detid'] = sensors['detid'].astype(str)
+
+    start = time.time()
+    hourly = load_hourly_series(data_path, set(sensors['detid']))
+    tasks = build_tasks(hourly, prediction_date)
+    if limit:
+        tasks = tasks[:limit]
+    del hourly
+    print(f"✓ {len(tasks)} sensors with location + traffic data ({time.time() - start:.1f}s)")
+
+    run_info = {
+        'prediction_date': prediction_date,
+        'data': [os.path.basename(data_path)] + file_signature(data_path),
+        'detectors': [os.path.basename(detectors_path)] + file_signature(detectors_path),
+        'pattern_only': pattern_only,
+        'prophet_params': PROPHET_PARAMS
+    }
+    results = load_checkpoint(work_dir, run_info)
+    remaining = [t for t in tasks if t['detid'] not in results]
+    if results:
+        print(f"✓ Resuming from checkpoint: {len(results)} done, {len(remaining)} remaining")
+
+    print(f"\n⏳ Forecasting {len(remaining)} sensors with {jobs} workers "
+          f"(memory cap {max_memory_mb or 'none'} MB/worker)...")
+    fit_start = time.time()
+    completed = [0]
+    with open(os.path.join(work_dir, 'checkpoint.jsonl'), 'a') as checkpoint:
+        def on_result(result):
+            results[result['detid']] = result
+            append_checkpoint(checkpoint, result)
+            completed[0] += 1
+            if completed[0] % 50 == 0 or completed[0] == len(remaining):
+                print(f"  📊 {completed[0]}/{len(remaining)} ({time.time() - fit_start:.0f}s)")
+
+        if remaining:
+            run_pool(remaining, jobs, max_memory_mb, tasks_per_child, pattern_only, on_result)
+
+    task_ids = {t['detid'] for t in tasks}
+    results = {detid: r for detid, r in results.items() if detid in task_ids}
+
+    # Output (tmp + rename: app tidak pernah membaca file setengah jadi)
+    os.makedirs(output_dir, exist_ok=True)
+    predictions = build_predictions(results, sensors, prediction_date)
+    output_path = os.path.join(output_dir, f'sensor_predictions_{prediction_date}.csv')
+    predictions.to_csv(output_path + '.tmp', index=False)
+    os.replace(output_path + '.tmp', output_path)
+
+    fit_times = pd.DataFrame(
+        [{k: r[k] for k in ('detid', 'method', 'n_samples', 'fit_seconds', 'error')} for r in results.values()]
+    ).sort_values('fit_seconds', ascending=False)
+    fit_times_path = os.path.join(output_dir, f'prophet_fit_times_{prediction_date}.csv')
+    fit_times.to_csv(fit_times_path, index=False)
+
+    print_summary(predictions, fit_times, time.time() - fit_start, jobs)
+    print(f"\n✓ Saved: {output_path}")
+    print(f"✓ Fit times: {fit_times_path}")
+    return predictions, fit_times
+
+
+def print_summary(predictions, fit_times, elapsed, jobs):
+    methods = fit_times['method'].value_counts()
+    errors = fit_times['error'].notna().sum()
+    prophet_times = fit_times.loc[fit_times['method'] == 'prophet', 'fit_seconds']
+    status = predictions['predicted_status'].value_counts()
+
+    print("\n" + "=" * 60)
+    print("📊 SUMMARY")
+    print("=" * 60)
+    print(f"Sensors:        {len(predictions)}")
+    print(f"  - Prophet:    {methods.get('prophet', 0)}")
+    print(f"  - Pattern:    {methods.get('pattern', 0)} ({errors} after error)")
+    print(f"Wall time:      {elapsed:.1f}s with {jobs} workers")
+    if len(prophet_times):
+        print(f"Fit time/sensor: median {prophet_times.median():.2f}s, "
+              f"p95 {prophet_times.quantile(0.95):.2f}s, max {prophet_times.max():.2f}s, "
+              f"total {prophet_times.sum():.1f}s")
+        for _, row in fit_times.head(5).iterrows():
+            print(f"  {row['detid']}: {row['fit_seconds']:.2f}s ({row['n_samples']} samples)")
+    print(f"Status (peak):  🟢 {status.get('Lancar', 0)}  🟠 {status.get('Sedang', 0)}  🔴 {status.get('Macet', 0)}")
+
+
+if __name__ == "__main__":
+    tomorrow = (datetime.now().date() + timedelta(days=1)).isoformat()
+    parser = argparse.ArgumentParser(description="Parallel per-sensor Prophet forecast (sensor_predictions_*.csv)")
+    parser.add_argument('--data', default="marseille_clean.csv")
+    parser.add_argument('--detectors', default="detectors_public.csv")
+    parser.add_argument('--date', default=tomorrow, help="Tanggal prediksi YYYY-MM-DD (default besok)")
+    parser.add_argument('--output-dir', default=".")
+    parser.add_argument('--work-dir', default=None, help="Folder checkpoint (default prophet_runs/<date>)")
+    parser.add_argument('--jobs', type=int, default=int(os.environ.get('PROPHET_JOBS', 0)) or None)
+    parser.add_argument('--max-memory-mb', type=int, default=int(os.environ.get('PROPHET_WORKER_MEMORY_MB', 2048)),
+                        help="Memory cap (RLIMIT_AS) per worker, 0 = tanpa batas")
+    parser.add_argument('--tasks-per-child', type=int, default=50)
+    parser.add_argument('--pattern-only', action='store_true', help="Tanpa Prophet (historical average saja)")
+    parser.add_argument('--limit', type=int, default=None, help="Hanya N sensor pertama (testing)")
+    args = parser.parse_args()
+
+    if not args.pattern_only:
+        import importlib.util
+        if importlib.util.find_spec('prophet') is None:
+            parser.error("prophet is not installed (pip install prophet) - or use --pattern-only")
+
+    run_pipeline(args.data, args.detectors, args.date, output_dir=args.output_dir, work_dir=args.work_dir,
+                 jobs=args.jobs, max_memory_mb=args.max_memory_mb, tasks_per_child=args.tasks_per_child,
+                 pattern_only=args.pattern_only, limit=args.limit)
@@ -0,0 +1,96 @@
+# ============================================================================
+# CompactForest vs sklearn RandomForestClassifier (hasil harus sama)
+# ============================================================================
+# Jalankan dari root repo: python -m pytest -q tests
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'website'))
+
+from forest_runtime import CompactForest, compact_arrays_from_sklearn, export_compact_forest  # noqa: E402
+
+
+def make_data(n_samples=600, n_features=6, n_classes=3, seed=0):
+    """Fitur integer (threshold sklearn jadi x.5) + fitur continuous, label dari kombinasi keduanya"""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.integers(0, 24, n_samples), rng.integers(0, 7, n_samples),
+                         rng.random((n_samples, n_features - 2))]).astype(np.float64)
+    score = np.sin(X[:, 0] / 24 * 2 * np.pi) + X[:, 2] + 0.3 * rng.standard_normal(n_samples)
+    y = np.digitize(score, np.quantile(score, np.linspace(0, 1, n_classes + 1)[1:-1]))
+    return X, y
+
+
+def assert_same_predictions(rf_model, forest, X):
+    expected = rf_model.predict_proba(X)
+    np.testing.assert_allclose(forest.predict_proba(X), expected, atol=1e-6)
+    # Argmax hanya dibandingkan jika tidak ada tie di antara dua kelas teratas
+    top2 = np.sort(expected, axis=1)[:, -2:]
+    decided = top2[:, 1] - top2[:, 0] > 1e-6
+    np.testing.assert_array_equal(forest.predict(X)[decided], rf_model.predict(X)[decided])
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = make_data()
+    rf_model = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+    return rf_model, X
+
+
+def test_export_roundtrip_matches_sklearn(fitted, tmp_path):
+    rf_model, X = fitted
+    path = tmp_path / 'forest.npz'
+    export_compact_forest(rf_model, path)
+
+    X_test, _ = make_data(n_samples=400, seed=1)
+    for forest in (CompactForest.load(path), CompactForest.load(path, mmap=False)):
+        assert forest.n_estimators == rf_model.n_estimators
+        np.testing.assert_array_equal(forest.classes_, rf_model.classes_)
+        assert_same_predictions(rf_model, forest, X_test)
+
+
+def test_sample_exactly_on_threshold(fitted):
+    rf_model, X = fitted
+    forest = CompactForest(compact_arrays_from_sklearn(rf_model))
+
+    # Setiap split node: sample dengan nilai fitur tepat di threshold (sklearn: <= ke kiri)
+    rows = []
+    for estimator in rf_model.estimators_:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != -1):
+            row = X[node % len(X)].copy()
+            row[tree.feature[node]] = np.float32(tree.threshold[node])
+            rows.append(row)
+    X_edge = np.asarray(rows)
+    # Threshold fitur integer adalah x.5 (tepat di float32), jadi sample benar-benar di batas
+    assert (X_edge[:, :2] % 1 == 0.5).any()
+    assert_same_predictions(rf_model, forest, X_edge)
+
+
+def test_single_row_batch(fitted):
+    rf_model, X = fitted
+    forest = CompactForest(compact_arrays_from_sklearn(rf_model))
+    for i in (0, 17, len(X) - 1):
+        assert forest.predict_proba(X[i:i + 1]).shape == (1, len(rf_model.classes_))
+        assert_same_predictions(rf_model, forest, X[i:i + 1])
+
+
+def test_one_node_trees():
+    X, y = make_data(n_samples=50)
+    # min_samples_split > n_samples: setiap tree hanya root (leaf)
+    rf_model = RandomForestClassifier(n_estimators=5, min_samples_split=len(X) + 1, random_state=0).fit(X, y)
+    assert all(estimator.tree_.node_count == 1 for estimator in rf_model.estimators_)
+
+    forest = CompactForest(compact_arrays_from_sklearn(rf_model))
+    assert_same_predictions(rf_model, forest, X)
+
+
+def test_wrong_feature_count_raises(fitted):
+    rf_model, X = fitted
+    forest = CompactForest(compact_arrays_from_sklearn(rf_model))
+    with pytest.raises(ValueError):
+        forest.predict_proba(X[:, :-1])
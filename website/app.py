@@ -2,64 +2,48 @@
 # TRAFFIC PREDICTION WEBSITE - Model-Focused Dashboard
 # ============================================================================
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import pickle
+import gc
+import hashlib
+import io
+import json
 import os
+import resource
+import threading
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
+from traffic_stats import FRAMES_VERSION, TrafficAggregates, aggregate_traffic_csv
+from data_cache import cached_frames
+from memory import memory_report, process_memory
+from forest_runtime import CompactForest
+from response_cache import ResponseCache, cached_response
+from artifacts import ArtifactManager, load_manifest
+from features import FEATURES_VERSION, FeatureEncoder, HistoricalFeatures, build_features
+from spatial import GridIndex, clamp_zoom, cluster_points, parse_bbox
+from city_shards import CityShard, ShardCache
+from detector_catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CatalogLoader, read_catalog
+from metrics import (CONTENT_TYPE, profile_response, registry, server_timing, stage, start_profile,
+                     stop_profile)
+from serialization import Compressor, JSONProvider, parse_shape, records_from_columns, round_list, take
+from cube_precompute import CUBE_SLOTS, CubeJob, attach_cube, build_cube, create_partial, cube_paths, slots_ready
+from clustering import (claim_computation, claim_lock, clustering_key, clustering_sensors, compute_and_save,
+                        hourly_profiles, load_result)
+
 app = Flask(__name__)
+app.json = JSONProvider(app)   # jsonify() lewat orjson, tercatat sebagai stage 'serialize' (lihat SERIALIZATION)
 
 # ============================================================================
 # PATHS
 # ============================================================================
-BASE_PATH = os.path.dirname(os.path.dirname(__file__))
-
-# ============================================================================
-# HELPER FUNCTIONS
-# ============================================================================
-def download_file_from_google_drive(file_id, destination):
-    """Download file from Google Drive using gdown (handles large files reliably)"""
-    try:
-        import gdown
-        url = f"https://drive.google.com/uc?id={file_id}"
-        gdown.download(url, destination, quiet=False)
-        
-        # Verify download
-        if os.path.exists(destination):
-            size = os.path.getsize(destination)
-            print(f"✓ Downloaded: {os.path.basename(destination)} ({size:,} bytes)")
-            
-            # Check if it's actually HTML (failed download)
-            with open(destination, 'rb') as f:
-                header = f.read(100)
-                if header.startswith(b'<!DOCTYPE') or header.startswith(b'<html'):
-                    print(f"❌ Download failed: received HTML instead of file")
-                    os.remove(destination)
-                    return False
-            return True
-        return False
-    except Exception as e:
-        print(f"❌ Download error: {e}")
-        return False
-
-def ensure_model_exists(file_path, gdrive_id=None):
-    """Check if model exists, if not download from Google Drive"""
-    if os.path.exists(file_path):
-        return True
-    
-    if gdrive_id:
-        print(f"⚠ {os.path.basename(file_path)} not found, downloading from Google Drive...")
-        try:
-            success = download_file_from_google_drive(gdrive_id, file_path)
-            return success
-        except Exception as e:
-            print(f"❌ Failed to download: {e}")
-            return False
-    return False
+# BASE_PATH bisa diganti (mis. benchmark.py dengan data sintetis di temp directory)
+BASE_PATH = os.environ.get('BASE_PATH', os.path.dirname(os.path.dirname(__file__)))
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_PATH, 'cache'))
 
 # ============================================================================
 # LOAD MODELS & DATA
@@ -75,98 +59,256 @@ print("=" * 60)
 GDRIVE_RF_MODEL = os.environ.get('GDRIVE_RF_MODEL', '')  # Google Drive ID untuk traffic_model_time_location.pkl
 GDRIVE_ENCODERS = os.environ.get('GDRIVE_ENCODERS', '')  # Google Drive ID untuk model_encoders_revised.pkl
 GDRIVE_MARSEILLE_DATA = os.environ.get('GDRIVE_MARSEILLE_DATA', '')  # Google Drive ID untuk marseille_clean.csv
+GDRIVE_RF_COMPACT = os.environ.get('GDRIVE_RF_COMPACT', '')  # Google Drive ID untuk traffic_model_compact.npz (optional)
+
+# 'auto' = compact forest (NumPy runtime) jika tersedia, fallback ke sklearn; 'sklearn' = selalu sklearn
+RF_RUNTIME = os.environ.get('RF_RUNTIME', 'auto')
 
-# Load Random Forest Model (Optimized - 25 trees for Railway 512MB RAM)
-rf_model = None
-model_encoders = None
+# 'lazy' = server langsung menerima request, model & data di-load di background threads
+# (lihat STARTUP); 'eager' = semua di-load saat import (dengan PRELOAD_APP=1: sekali di master)
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'lazy')
+startup_state = {}   # component -> {'status', 'started', 'seconds', 'error'}
+
+def in_gunicorn_master():
+    """True saat app.py di-import di gunicorn master (preload): threads baru dimulai di worker"""
+    return os.environ.get('GUNICORN_MASTER_PID') == str(os.getpid())
 
 # Use optimized model names
 rf_model_path = os.path.join(BASE_PATH, 'traffic_model_optimized.pkl')
 encoders_path = os.path.join(BASE_PATH, 'model_encoders_optimized.pkl')
+rf_compact_path = os.path.join(BASE_PATH, 'traffic_model_compact.npz')
+marseille_csv_path = os.path.join(BASE_PATH, 'marseille_clean.csv')
 
-# Try to download and load optimized model from Google Drive
-try:
-    if ensure_model_exists(rf_model_path, GDRIVE_RF_MODEL):
-        import joblib
-        rf_model = joblib.load(rf_model_path)
-        print(f"✓ Random Forest model loaded: {len(rf_model.estimators_)} trees")
-    else:
+# Artifact manager: download paralel + resume + SHA-256 (artifacts.json dan/atau GDRIVE_* env,
+# *_SHA256 env opsional untuk verifikasi). Pre-start: `python website/artifacts.py fetch`
+ARTIFACT_MANIFEST = os.environ.get('ARTIFACT_MANIFEST', os.path.join(BASE_PATH, 'artifacts.json'))
+artifact_manager = ArtifactManager(
+    load_manifest(ARTIFACT_MANIFEST, {
+        os.path.basename(rf_model_path): (GDRIVE_RF_MODEL, os.environ.get('GDRIVE_RF_MODEL_SHA256')),
+        os.path.basename(encoders_path): (GDRIVE_ENCODERS, os.environ.get('GDRIVE_ENCODERS_SHA256')),
+        os.path.basename(marseille_csv_path): (GDRIVE_MARSEILLE_DATA, os.environ.get('GDRIVE_MARSEILLE_DATA_SHA256')),
+        os.path.basename(rf_compact_path): (GDRIVE_RF_COMPACT, os.environ.get('GDRIVE_RF_COMPACT_SHA256')),
+    }),
+    BASE_PATH, os.path.join(CACHE_DIR, 'artifacts'),
+    max_workers=int(os.environ.get('ARTIFACT_FETCH_WORKERS', 4))
+)
+
+def artifact_name(file_path):
+    """Nama artifact = path relatif terhadap BASE_PATH (mis. 'cities/lyon/lyon_clean.csv')"""
+    return os.path.relpath(file_path, BASE_PATH)
+
+def ensure_model_exists(file_path):
+    """Tunggu artifact (download jika perlu), True jika file tersedia"""
+    return artifact_manager.ensure(artifact_name(file_path)) is not None
+
+def prefetch_artifacts():
+    """
+    Mulai download paralel semua artifact yang dibutuhkan; loader hanya menunggu file miliknya.
+    Pickle sklearn (besar) hanya jika compact forest tidak tersedia.
+
+    Dipanggil saat startup (run_startup), bukan saat import: dengan preload, import terjadi di
+    gunicorn master dan download threads tidak ikut fork ke workers.
+    """
+    rf_artifact = rf_compact_path if RF_RUNTIME == 'auto' and artifact_manager.available(artifact_name(rf_compact_path)) \
+        else rf_model_path
+    artifact_manager.prefetch([artifact_name(p) for p in (rf_artifact, encoders_path, marseille_csv_path)])
+
+def file_signature(path):
+    """(size, mtime) sebuah file, None jika tidak ada"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+@stage('load_model')
+def load_rf_model(compact_path=rf_compact_path, pickle_path=rf_model_path):
+    """Load Random Forest (Optimized - 25 trees for Railway 512MB RAM) -> (model, source path)"""
+    # Compact forest (optimize_model.py): flat float32 arrays, memory-mapped dan dibagi antar workers
+    if RF_RUNTIME == 'auto':
+        try:
+            if ensure_model_exists(compact_path):
+                rf_model = CompactForest.load(compact_path)
+                print(f"✓ Random Forest model loaded: {rf_model.n_estimators} trees "
+                      f"(compact, {rf_model.nbytes / 1024 / 1024:.1f} MB)")
+                return rf_model, compact_path
+        except Exception as e:
+            print(f"⚠ Compact Random Forest error: {e}")
+    
+    # Try to download and load optimized model from Google Drive
+    try:
+        if ensure_model_exists(pickle_path):
+            import joblib
+            rf_model = joblib.load(pickle_path)
+            print(f"✓ Random Forest model loaded: {len(rf_model.estimators_)} trees")
+            return rf_model, pickle_path
         print("⚠ Random Forest model not available")
         print("   Upload optimized model (25 trees) to Google Drive and set GDRIVE_RF_MODEL")
-except Exception as e:
-    print(f"⚠ Random Forest model error: {e}")
-
-try:
-    if ensure_model_exists(encoders_path, GDRIVE_ENCODERS):
-        import joblib
-        model_encoders = joblib.load(encoders_path)
-        print("✓ Model encoders loaded")
-    else:
+    except Exception as e:
+        print(f"⚠ Random Forest model error: {e}")
+    return None, None
+
+@stage('load_encoders')
+def load_encoders(path=encoders_path):
+    try:
+        if ensure_model_exists(path):
+            import joblib
+            encoders = joblib.load(path)
+            print("✓ Model encoders loaded")
+            return encoders
         print("⚠ Model encoders not available")
-except Exception as e:
-    print(f"⚠ Model encoders error: {e}")
+    except Exception as e:
+        print(f"⚠ Model encoders error: {e}")
+    return None
+
+class ModelSnapshot:
+    """
+    Random Forest + encoders dan semua turunannya (thresholds, feature lookups, prediction cube)
+    
+    Request membaca `models` sekali dan memakai snapshot itu sampai selesai. Hot reload
+    membangun snapshot baru di background lalu mengganti `models` dengan satu assignment,
+    jadi request tidak pernah melihat model baru dengan encoders/cube lama.
+    """
+    
+    def __init__(self, rf_model, encoders, source):
+        self.rf_model = rf_model
+        self.encoders = encoders
+        self.source = source
+        self.threshold_low = encoders.get('threshold_low', 0.0364) if encoders else 0.0364
+        self.threshold_high = encoders.get('threshold_high', 0.0722) if encoders else 0.0722
+        self.features = FeatureEncoder(encoders)
+        self.cube = None
+        self.cube_index = {}
+        # Progress bitmap selama cube masih dibangun (slot = day * 24 + hour), None = lengkap
+        self.cube_progress = None
+    
+    @property
+    def ready(self):
+        return self.rf_model is not None and self.encoders is not None
+
+def load_models():
+    """Startup component 'model': snapshot aktif = model + encoders yang baru di-load"""
+    global models
+    rf_model, source = load_rf_model()
+    snapshot = ModelSnapshot(rf_model, load_encoders(), source)
+    # Thresholds (dari encoders, bagian dari ModelSnapshot)
+    print(f"✓ Thresholds: Low={snapshot.threshold_low:.4f}, High={snapshot.threshold_high:.4f}")
+    models = snapshot
+    return snapshot.ready
+
+# Snapshot kosong sampai component 'model' selesai (thresholds default)
+models = ModelSnapshot(None, None, None)
 
 # Load Sensor Data
+# Home city: di-load saat startup dan disimpan di globals (live ingestion, hot reload).
+# Kota lain di detectors_public.csv: lihat MULTI-CITY SHARDS.
+HOME_CITY = 'marseille'
 detectors_df = None
-try:
-    detectors_df = pd.read_csv(os.path.join(BASE_PATH, 'detectors_public.csv'))
-    detectors_df = detectors_df[detectors_df['citycode'] == 'marseille'].copy()
-    print(f"✓ Detectors loaded: {len(detectors_df)} sensors")
-except Exception as e:
-    print(f"⚠ Detectors not found: {e}")
-
-# Load Traffic Data for historical patterns (SAMPLE ONLY - save memory)
-traffic_df = None
-detector_hourly_avg = None
-marseille_csv_path = os.path.join(BASE_PATH, 'marseille_clean.csv')
+detectors_csv_path = os.path.join(BASE_PATH, 'detectors_public.csv')
 
-try:
+def build_detector_frames(city=HOME_CITY):
+    detectors = pd.read_csv(detectors_csv_path)
+    return {'detectors': detectors[detectors['citycode'] == city]}
+
+@stage('load_detectors')
+def load_detector_frames(city=HOME_CITY):
+    """Detectors satu kota -> (DataFrame, from_cache)"""
+    frames, from_cache = cached_frames(CACHE_DIR, f'detectors_{city}', [detectors_csv_path],
+                                       lambda: build_detector_frames(city))
+    return frames['detectors'], from_cache
+
+# Spatial index + field statis per sensor (urutan detectors_df = row cube), untuk viewport peta.
+# detector_columns: field yang sama sebagai columns (response ?shape=columns)
+detector_grid = None
+detector_records = []
+detector_columns = {}
+# Road type input model per sensor (urutan detectors_df) dan detid -> road type; satu sumber
+# untuk cube, map dan batch/24h supaya hasil sama dengan/tanpa cube
+detector_road_types = None
+detector_road_type_index = {}
+
+def build_road_types(df):
+    """fclass per sensor sebagai road_type model ('secondary' jika kosong / tidak ada kolom)"""
+    fclasses = df['fclass'] if 'fclass' in df.columns else pd.Series('secondary', index=df.index)
+    road_types = fclasses.fillna('secondary').to_numpy(dtype=object)
+    return road_types, dict(zip(df['detid'].astype(str), road_types))
+
+def build_detector_columns(df):
+    roads = df['road'] if 'road' in df.columns else pd.Series('Unknown', index=df.index)
+    fclasses = df['fclass'] if 'fclass' in df.columns else pd.Series('Unknown', index=df.index)
+    return {
+        'detid': [str(detid) for detid in df['detid'].tolist()],
+        'lat': df['lat'].to_numpy(dtype=np.float64),
+        'long': df['long'].to_numpy(dtype=np.float64),
+        'road': [str(road) for road in roads.fillna('Unknown').tolist()],
+        'fclass': [str(fclass) for fclass in fclasses.fillna('Unknown').tolist()]
+    }
+
+def load_detectors():
+    global detectors_df, detector_grid, detector_records, detector_columns
+    global detector_road_types, detector_road_type_index
+    df, from_cache = load_detector_frames()
+    detector_columns = build_detector_columns(df)
+    detector_road_types, detector_road_type_index = build_road_types(df)
+    detector_records = records_from_columns(detector_columns, len(df))
+    detector_grid = GridIndex(df['lat'].to_numpy(), df['long'].to_numpy())
+    detectors_df = df
+    print(f"✓ Detectors loaded: {len(detectors_df)} sensors{' (cache)' if from_cache else ''}")
+    return True
+
+# Load Traffic Data for historical patterns (streaming aggregation, full file)
+traffic_aggregates = None
+sensor_stats = None
+hourly_avg_index = {}
+hourly_avg_table = None
+historical_features = None   # features.HistoricalFeatures (input model), diganti utuh saat ingest
+
+@stage('load_traffic')
+def load_traffic_aggregates(csv_path, cache_name):
+    """
+    TrafficAggregates dari CSV readings -> (aggregates, from_cache)
+    
+    Read in chunks: peak memory bounded by chunk size, not file size (Railway 512MB RAM).
+    Hasil agregasi di-cache sebagai Feather, dibangun ulang hanya jika CSV berubah.
+    """
+    frames, from_cache = cached_frames(CACHE_DIR, cache_name, [csv_path],
+                                       lambda: aggregate_traffic_csv(csv_path).to_frames())
+    return TrafficAggregates.from_frames(frames), from_cache
+
+def load_traffic_data():
+    global traffic_aggregates, hourly_avg_index, hourly_avg_table, historical_features, sensor_stats
     # Try to load or download marseille_clean.csv from Google Drive
-    if ensure_model_exists(marseille_csv_path, GDRIVE_MARSEILLE_DATA):
-        # Load only 20% sample to save memory (Railway 512MB RAM limit)
-        print("⚠ Loading sample data (20%) to conserve memory...")
-        traffic_df = pd.read_csv(marseille_csv_path, skiprows=lambda i: i > 0 and i % 5 != 0)
-        traffic_df['datetime'] = pd.to_datetime(traffic_df['datetime'])
-        traffic_df['hour'] = traffic_df['datetime'].dt.hour
-        traffic_df['day_of_week'] = traffic_df['datetime'].dt.dayofweek
-        
-        # Pre-compute hourly averages per detector
-        detector_hourly_avg = traffic_df.groupby(['detid', 'hour', 'day_of_week'])['occ'].mean().reset_index()
-        detector_hourly_avg.columns = ['detid', 'hour', 'day_of_week', 'avg_occ']
-        print(f"✓ Traffic data loaded: {len(traffic_df):,} records (20% sample)")
-    else:
+    if not ensure_model_exists(marseille_csv_path):
         print("⚠ marseille_clean.csv not available (set GDRIVE_MARSEILLE_DATA env variable)")
-except Exception as e:
-    print(f"⚠ Traffic data not found: {e}")
+        return False
+    # Accumulator tetap disimpan: live readings (lihat LIVE INGESTION) di-merge ke sini
+    aggregates, from_cache = load_traffic_aggregates(marseille_csv_path, f'traffic_aggregates_v{FRAMES_VERSION}')
+    hourly_avg_table = aggregates.hourly_avg_table()
+    hourly_avg_index = dict(aggregates.detector_index)
+    historical_features = HistoricalFeatures.from_aggregates(aggregates)
+    sensor_stats = aggregates.sensor_stats()
+    traffic_aggregates = aggregates
+    print(f"✓ Traffic data aggregated: {aggregates.total_records:,} records, "
+          f"{len(sensor_stats)} detectors{' (cache)' if from_cache else ''}")
+    return True
 
-# Load Pre-computed Predictions if exists
-predictions_df = None
-try:
-    pred_files = [f for f in os.listdir(BASE_PATH) if f.startswith('sensor_predictions_')]
-    if pred_files:
-        latest = sorted(pred_files)[-1]
-        predictions_df = pd.read_csv(os.path.join(BASE_PATH, latest))
-        print(f"✓ Prophet predictions loaded: {latest}")
-except Exception as e:
-    print(f"⚠ Prophet predictions not found: {e}")
+def latest_predictions_path(directory=BASE_PATH):
+    """sensor_predictions_YYYY-MM-DD.csv terbaru (file .tmp yang sedang ditulis diabaikan)"""
+    if not os.path.isdir(directory):
+        return None
+    pred_files = [f for f in os.listdir(directory) if f.startswith('sensor_predictions_') and f.endswith('.csv')]
+    return os.path.join(directory, sorted(pred_files)[-1]) if pred_files else None
 
 # Load Clustering Comparison
 clustering_comparison = None
-try:
-    clustering_comparison = pd.read_csv(os.path.join(BASE_PATH, 'clustering_models_comparison.csv'))
-    print(f"✓ Clustering comparison loaded")
-except Exception as e:
-    print(f"⚠ Clustering comparison not found: {e}")
+clustering_comparison_path = os.path.join(BASE_PATH, 'clustering_models_comparison.csv')
 
-# Thresholds
-THRESHOLD_LOW = 0.0364
-THRESHOLD_HIGH = 0.0722
-if model_encoders:
-    THRESHOLD_LOW = model_encoders.get('threshold_low', 0.0364)
-    THRESHOLD_HIGH = model_encoders.get('threshold_high', 0.0722)
-
-print(f"✓ Thresholds: Low={THRESHOLD_LOW:.4f}, High={THRESHOLD_HIGH:.4f}")
-print("=" * 60)
+@stage('load_clustering_comparison')
+def load_clustering_comparison():
+    global clustering_comparison
+    clustering_comparison = pd.read_csv(clustering_comparison_path)
+    print(f"✓ Clustering comparison loaded")
+    return True
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -174,115 +316,1208 @@ print("=" * 60)
 
 def categorize_traffic(occ):
     """Kategorisasi traffic berdasarkan occupancy"""
-    if occ < THRESHOLD_LOW:
+    snapshot = models
+    if occ < snapshot.threshold_low:
         return {'level': 0, 'status': 'Lancar', 'color': '#2ecc71'}
-    elif occ < THRESHOLD_HIGH:
+    elif occ < snapshot.threshold_high:
         return {'level': 1, 'status': 'Sedang', 'color': '#f39c12'}
     else:
         return {'level': 2, 'status': 'Macet', 'color': '#e74c3c'}
 
-def get_time_period(hour):
-    """Get time period from hour"""
-    if 0 <= hour < 6:
-        return 'Night'
-    elif 6 <= hour < 9:
-        return 'Morning Rush'
-    elif 9 <= hour < 12:
-        return 'Late Morning'
-    elif 12 <= hour < 14:
-        return 'Lunch'
-    elif 14 <= hour < 17:
-        return 'Afternoon'
-    elif 17 <= hour < 20:
-        return 'Evening Rush'
-    else:
-        return 'Evening'
+STATUS_NAMES = {0: 'Lancar', 1: 'Sedang', 2: 'Macet'}
+STATUS_COLORS = {0: '#2ecc71', 1: '#f39c12', 2: '#e74c3c'}
+
+def build_feature_matrix(hours, days, detector_ids, road_types, snapshot, historical):
+    """Feature matrix float32 (n_samples x n_features), definisi yang sama dengan training (features.py)"""
+    with stage('avg_lookup'):
+        averages = historical.lookup(detector_ids, hours) if historical is not None else None
+    with stage('features'):
+        return build_features(snapshot.features, hours, days, detector_ids, road_types, averages=averages)
+
+def predict_rf_batch(hours, days, detector_ids, road_types, snapshot=None, historical=None):
+    """
+    Batched Random Forest inference: satu feature matrix, satu predict_proba
+    
+    Args:
+        hours, days, detector_ids, road_types: array dengan panjang sama
+            (scalar akan di-broadcast)
+        snapshot: ModelSnapshot (default: `models` saat ini)
+        historical: HistoricalFeatures (default: home city, `historical_features`)
+    
+    Returns:
+        (levels, probabilities) - int array (n,) dan float array (n, 3),
+        atau None jika model belum tersedia
+    """
+    snapshot = snapshot or models
+    historical = historical if historical is not None else historical_features
+    if not snapshot.ready:
+        return None
+    
+    n = max(np.size(hours), np.size(days), np.size(detector_ids), np.size(road_types))
+    hours = np.broadcast_to(np.asarray(hours), (n,))
+    days = np.broadcast_to(np.asarray(days), (n,))
+    detector_ids = np.broadcast_to(np.asarray(detector_ids, dtype=object), (n,))
+    road_types = np.broadcast_to(np.asarray(road_types, dtype=object), (n,))
+    
+    X = build_feature_matrix(hours, days, detector_ids, road_types, snapshot, historical)
+    with stage('inference'):
+        probabilities = snapshot.rf_model.predict_proba(X)
+        levels = np.asarray(snapshot.rf_model.classes_)[probabilities.argmax(axis=1)].astype(int)
+    return levels, probabilities
+
+def format_prediction(level, probabilities):
+    """Format satu hasil prediksi ke response dict"""
+    return {
+        'level': int(level),
+        'status': STATUS_NAMES[level],
+        'color': STATUS_COLORS[level],
+        'probabilities': {
+            'Lancar': round(float(probabilities[0]) * 100, 1),
+            'Sedang': round(float(probabilities[1]) * 100, 1),
+            'Macet': round(float(probabilities[2]) * 100, 1)
+        }
+    }
 
 def predict_with_rf(hour, day_of_week, detector_id=None, road_type='secondary'):
     """Predict traffic using Random Forest model"""
-    if rf_model is None or model_encoders is None:
+    result = predict_rf_batch(hour, day_of_week, [detector_id], [road_type])
+    if result is None:
         return None
     
-    is_weekend = 1 if day_of_week >= 5 else 0
-    is_rush = 1 if (day_of_week < 5 and ((7 <= hour <= 9) or (17 <= hour <= 19))) else 0
+    levels, probabilities = result
+    return format_prediction(levels[0], probabilities[0])
+
+def build_prophet_payload(df, snapshot=None):
+    """
+    Precompute payload /api/prophet/predictions sekali saat load
+    
+    Semua kolom hour_XX dikategorikan sekaligus dengan np.digitize terhadap
+    threshold low/high model (sama dengan categorize_traffic, termasuk NaN -> Macet).
+    Request hanya memilih kolom level yang sesuai.
+    """
+    snapshot = snapshot or models
+    hour_columns = [(h, f'hour_{h:02d}') for h in range(24) if f'hour_{h:02d}' in df.columns]
+    bins = [snapshot.threshold_low, snapshot.threshold_high]
+    
+    occupancy = df[[col for _, col in hour_columns]].to_numpy(dtype=float)
+    hour_levels = np.digitize(occupancy, bins)
+    hours = [h for h, _ in hour_columns]
     
-    hour_sin = np.sin(2 * np.pi * hour / 24)
-    hour_cos = np.cos(2 * np.pi * hour / 24)
-    day_sin = np.sin(2 * np.pi * day_of_week / 7)
-    day_cos = np.cos(2 * np.pi * day_of_week / 7)
+    roads = df['road'].fillna('Unknown') if 'road' in df.columns else pd.Series('Unknown', index=df.index)
+    percent = lambda name: round_list(df[name].to_numpy(dtype=float) * 100, 1)
     
-    # Encode detector
+    # Columns (?shape=columns) dan records dibangun dari nilai yang sama
+    sensors = {
+        'detid': [str(detid) for detid in df['detid'].tolist()],
+        'lat': df['lat'].to_numpy(dtype=np.float64),
+        'long': df['long'].to_numpy(dtype=np.float64),
+        'road': [str(road) for road in roads.tolist()],
+        'prediction_date': [str(date) for date in df['prediction_date'].tolist()],
+        'avg_occupancy': percent('avg_occupancy'),
+        'peak_occupancy': percent('peak_occupancy'),
+        'min_occupancy': percent('min_occupancy'),
+        'peak_hour': [int(h) for h in df['peak_hour'].tolist()]
+    }
+    columns = {
+        **sensors,
+        'hourly_occupancy': [[round(v, 1) for v in row] for row in (occupancy * 100).tolist()],
+        'hourly_level': hour_levels
+    }
+    
+    records = records_from_columns(sensors, len(df))
+    for record, occupancy_row, levels in zip(records, columns['hourly_occupancy'], hour_levels.tolist()):
+        record['hourly'] = [
+            {'hour': h, 'occupancy': occ, 'status': STATUS_NAMES[level], 'color': STATUS_COLORS[level]}
+            for h, occ, level in zip(hours, occupancy_row, levels)
+        ]
+    
+    return {
+        'records': records,
+        'columns': columns,
+        'hours': hours,
+        'hour_levels': {h: hour_levels[:, j] for j, (h, _) in enumerate(hour_columns)},
+        'avg_levels': np.digitize(df['avg_occupancy'].to_numpy(dtype=float), bins),
+        'peak_levels': np.digitize(df['peak_occupancy'].to_numpy(dtype=float), bins),
+        'prediction_date': df['prediction_date'].iloc[0] if len(df) > 0 else None,
+        'grid': GridIndex(df['lat'].to_numpy(dtype=float), df['long'].to_numpy(dtype=float)),
+        'total': len(df),
+        'thresholds': tuple(bins)
+    }
+
+@stage('load_prophet')
+def load_prophet_payload(path, snapshot=None):
+    """Baca sensor_predictions CSV dan precompute payload (DataFrame tidak disimpan)"""
+    payload = build_prophet_payload(pd.read_csv(path), snapshot)
+    payload['path'] = path
+    payload['nbytes'] = os.path.getsize(path)   # estimasi kasar untuk budget city shards
+    return payload
+
+# ============================================================================
+# PREDICTION CUBE (detector x day x hour)
+# ============================================================================
+# Input Random Forest hanya (hour, day, detector, road_type), jadi semua jawaban
+# bisa dihitung di depan: cube[row, day, hour] = [level, p_lancar, p_sedang, p_macet].
+# Row terakhir adalah profil default (tanpa detector, road_type 'secondary').
+# Cube adalah bagian dari ModelSnapshot (snapshot.cube / snapshot.cube_index).
+# Build per slot (day, hour) di CUBE_WORKERS processes (cube_precompute.py); cube
+# partial sudah di-attach selama build, slot yang belum selesai dijawab dengan inference.
+
+# Setiap pool process memakai memory sendiri (encoders, historical averages, batch inference)
+CUBE_WORKERS = int(os.environ.get('CUBE_WORKERS', min(4, os.cpu_count() or 1)))
+CUBE_POLL_INTERVAL = 0.5   # detik, worker yang menunggu build di process lain
+
+def compute_cube_version(detector_ids, snapshot):
+    """Version key cube: berubah jika model, encoders, historical averages, atau daftar detector berubah"""
+    h = hashlib.sha1()
+    for path in (snapshot.source, encoders_path):
+        h.update(f"{os.path.basename(path)}:{file_signature(path)};".encode())
+    h.update(f"features:{FEATURES_VERSION};".encode())
+    historical = historical_features
+    if historical is not None:
+        for table in (historical.occ_by_hour, historical.flow_by_hour, historical.detector_occ):
+            h.update(np.ascontiguousarray(table).tobytes())
+        h.update('\n'.join(str(d) for d in historical.detector_index).encode())
+    h.update('\n'.join(str(d) for d in detector_ids).encode())
+    return h.hexdigest()[:16]
+
+def remove_stale_cubes(version):
+    """Hapus cube (dan sisa build) versi lain di CACHE_DIR"""
+    for f in os.listdir(CACHE_DIR):
+        if f.startswith('prediction_cube_') and not f.startswith(f'prediction_cube_{version}.') \
+                and f.endswith(('.npy', '.progress')):
+            os.remove(os.path.join(CACHE_DIR, f))
+
+def attach_snapshot_cube(snapshot, paths):
+    """Attach cube final / partial ke snapshot -> True jika cube sudah lengkap"""
+    cube, progress = attach_cube(paths)
+    if cube is None:
+        return False
+    if snapshot.cube is None or progress is None:
+        # Progress dulu, baru cube: request membaca snapshot.cube sebelum snapshot.cube_progress
+        snapshot.cube_progress = progress
+        snapshot.cube = cube
+    return progress is None
+
+def load_prediction_cube(snapshot, cleanup=True):
+    """
+    Attach cube snapshot dari cache (memory-mapped), build jika version key berubah
+
+    Selama build cube partial sudah terpasang di snapshot (snapshot.cube_progress).
+    Jika process lain sedang membangun versi yang sama, process ini attach dan menunggu.
+    cleanup=False saat rebuild live: cube versi lain mungkin masih dipakai worker lain.
+    """
+    if not snapshot.ready or detectors_df is None:
+        return
+    
+    detector_ids = detectors_df['detid'].to_numpy(dtype=object)
+    road_types = detector_road_types
+    
+    version = compute_cube_version(detector_ids, snapshot)
+    paths = cube_paths(CACHE_DIR, version)
     try:
-        detector_encoded = model_encoders['detector'].transform([detector_id])[0]
-    except:
-        detector_encoded = 0
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if cleanup:
+            remove_stale_cubes(version)
+        # Index dulu, baru cube: request memeriksa `cube is not None` sebelum memakai index
+        snapshot.cube_index = {detid: i for i, detid in enumerate(detector_ids)}
+        while not attach_snapshot_cube(snapshot, paths):
+            lock = claim_lock(paths['lock'])
+            if lock is None:
+                time.sleep(CUBE_POLL_INTERVAL)
+                continue
+            try:
+                job = CubeJob(np.append(detector_ids, None), np.append(road_types, 'secondary'),
+                              snapshot.features, snapshot.rf_model, historical_features, snapshot.source)
+                create_partial(paths, job.n_rows)
+                attach_snapshot_cube(snapshot, paths)
+                now = datetime.now()
+                start = time.time()
+                with stage('cube_build'):
+                    built, workers = build_cube(paths, job, CUBE_WORKERS, first_slot=now.weekday() * 24 + now.hour)
+                print(f"✓ Prediction cube built: {version} ({built} slots, {workers} processes, "
+                      f"{time.time() - start:.1f}s)")
+            finally:
+                os.remove(lock)
+        print(f"✓ Prediction cube loaded: {snapshot.cube.shape[0] - 1} sensors x 7 days x 24 hours")
+    except Exception as e:
+        snapshot.cube = None
+        print(f"⚠ Prediction cube error: {e}")
+
+def cube_slots_ready(snapshot):
+    """Jumlah slot (day, hour) cube snapshot yang sudah bisa dipakai"""
+    if snapshot.cube is None:
+        return 0
+    progress = snapshot.cube_progress
+    return CUBE_SLOTS if progress is None else int(np.count_nonzero(progress))
+
+def cube_lookup(cube, rows, day, hour=slice(None)):
+    """Ambil (levels, probabilities) dari cube tanpa inference"""
+    with stage('cube_lookup'):
+        block = cube[rows, day, hour]
+    return block[..., 0].astype(int), block[..., 1:]
+
+def load_cube():
+    load_prediction_cube(models)
+    return models.cube is not None
+
+# ============================================================================
+# BATCH PREDICTION (banyak detector x banyak jam)
+# ============================================================================
+# Prediksi hanya bergantung pada (detector, weekday, hour): rentang waktu berapa
+# pun di-reduce ke slot (day, hour) unik, dijawab dari cube (satu batched
+# inference untuk detector di luar cube), lalu di-expand ke semua jam.
+# Response columnar (json), binary (npz), atau streaming per detector (ndjson).
+
+BATCH_MAX_HOURS = int(os.environ.get('BATCH_MAX_HOURS', 24 * 31))
+BATCH_MAX_CELLS = int(os.environ.get('BATCH_MAX_CELLS', 2_000_000))   # detector x jam, json/npz
+BATCH_CHUNK_DETECTORS = 256   # detector per chunk saat streaming (ndjson)
+BATCH_FORMATS = ('json', 'ndjson', 'npz')
+
+def parse_list(value, cast=str):
+    """List dari JSON list atau string "a,b,c" (None jika kosong)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(',') if v.strip()]
+    return [cast(v) for v in value]
+
+def parse_batch_request(args, shard):
+    """
+    Parameter batch -> dict (detector_ids, road_types, unknown, days, hours, timestamps)
+    
+    Args:
+        shard: CityShard (detectors kota yang diminta)
+        args: query string atau JSON body:
+            detectors: list / "a,b,c" (default: semua detector)
+            start + end / horizon (jam): rentang waktu per jam [start, end)
+            days: weekday 0-6 (default semua, jika tanpa start)
+            hours: filter jam 0-23 (default semua)
+    
+    Raises:
+        ValueError untuk parameter tidak valid
+    """
+    detectors = shard.detectors_df
+    all_ids = detectors['detid'].astype(str).to_numpy(dtype=object)
+    detector_ids = parse_list(args.get('detectors'))
+    if detector_ids is None:
+        detector_ids = all_ids
+    detector_ids = np.asarray(list(dict.fromkeys(detector_ids)), dtype=object)
+    road_by_detector = shard.detector_road_type_index
+    road_types = np.array([road_by_detector.get(d, 'secondary') for d in detector_ids], dtype=object)
+    unknown = [d for d in detector_ids if d not in road_by_detector]
+    
+    hour_filter = parse_list(args.get('hours'), int)
+    if hour_filter is not None and not all(0 <= h < 24 for h in hour_filter):
+        raise ValueError('hours must be between 0 and 23')
+    
+    timestamps = None
+    if args.get('start'):
+        start = pd.Timestamp(args['start']).floor('h')
+        if args.get('end'):
+            end = pd.Timestamp(args['end'])
+        else:
+            end = start + pd.Timedelta(hours=int(args.get('horizon', 24 * 7)))
+        timestamps = pd.date_range(start, end, freq='h', inclusive='left')
+        if hour_filter is not None:
+            timestamps = timestamps[timestamps.hour.isin(hour_filter)]
+        days = timestamps.dayofweek.to_numpy(dtype=np.int64)
+        hours = timestamps.hour.to_numpy(dtype=np.int64)
+    else:
+        day_list = parse_list(args.get('days'), int) or list(range(7))
+        if not all(0 <= d < 7 for d in day_list):
+            raise ValueError('days must be between 0 (Senin) and 6 (Minggu)')
+        hour_list = hour_filter if hour_filter is not None else list(range(24))
+        days = np.repeat(np.asarray(day_list, dtype=np.int64), len(hour_list))
+        hours = np.tile(np.asarray(hour_list, dtype=np.int64), len(day_list))
+    
+    if len(hours) == 0 or len(detector_ids) == 0:
+        raise ValueError('empty request: no detectors or no hours in range')
+    if len(hours) > BATCH_MAX_HOURS:
+        raise ValueError(f'too many hours ({len(hours)}), max {BATCH_MAX_HOURS}')
+    return {'detector_ids': detector_ids, 'road_types': road_types, 'unknown': unknown,
+            'days': days, 'hours': hours, 'timestamps': timestamps}
+
+def predict_batch_block(detector_ids, road_types, days, hours, snapshot, cube, cube_index, historical=None):
+    """
+    Prediksi detector_ids x slot (days[j], hours[j])
     
-    # Encode road type
+    Returns:
+        (levels, probabilities) - int8 (n_detectors, n_slots) dan float32
+        (n_detectors, n_slots, 3), atau None jika model belum tersedia
+    """
+    unique_slots, inverse = np.unique(days * 24 + hours, return_inverse=True)
+    slot_days, slot_hours = unique_slots // 24, unique_slots % 24
+    n, n_slots = len(detector_ids), len(unique_slots)
+    if cube is not None and not slots_ready(snapshot.cube_progress, slot_days, slot_hours):
+        # Cube masih dibangun dan belum punya semua slot ini
+        cube = None
+    
+    block = np.empty((n, n_slots, 4), dtype=np.float32)
+    rows = np.fromiter(((cube_index or {}).get(d, -1) if cube is not None else -1 for d in detector_ids),
+                       dtype=np.int64, count=n)
+    in_cube = rows >= 0
+    if in_cube.any():
+        with stage('cube_lookup'):
+            block[in_cube] = cube[rows[in_cube][:, None], slot_days[None, :], slot_hours[None, :]]
+    missing = np.flatnonzero(~in_cube)
+    if len(missing):
+        result = predict_rf_batch(np.tile(slot_hours, len(missing)), np.tile(slot_days, len(missing)),
+                                  np.repeat(detector_ids[missing], n_slots), np.repeat(road_types[missing], n_slots),
+                                  snapshot, historical)
+        if result is None:
+            return None
+        levels, probabilities = result
+        block[missing, :, 0] = levels.reshape(len(missing), n_slots)
+        block[missing, :, 1:] = probabilities[:, :3].reshape(len(missing), n_slots, 3)
+    
+    block = block[:, inverse]
+    return block[..., 0].astype(np.int8), block[..., 1:]
+
+def probability_columns(probabilities):
+    """Probabilities (..., 3) -> {'Lancar': [...], ...} dalam persen (1 desimal, sama dengan format_prediction)"""
+    percent = np.round(probabilities.astype(np.float64) * 100, 1)
+    return {STATUS_NAMES[i]: percent[..., i].tolist() for i in range(3)}
+
+def batch_header(batch):
+    """Bagian response yang sama untuk semua format"""
+    header = {
+        'day': batch['days'].tolist(),
+        'hour': batch['hours'].tolist(),
+        'shape': [len(batch['detector_ids']), len(batch['hours'])],
+        'status_names': STATUS_NAMES,
+        'unknown_detectors': batch['unknown']
+    }
+    if batch['timestamps'] is not None:
+        header['timestamp'] = batch['timestamps'].strftime('%Y-%m-%dT%H:%M').tolist()
+    return header
+
+def stream_batch(batch, shard):
+    """NDJSON: baris header, lalu satu baris per detector, dihitung per chunk (memory konstan)"""
+    snapshot = shard.models
+    cube = snapshot.cube
+    cube_index = snapshot.cube_index
+    with stage('serialize'):
+        header = json.dumps(batch_header(batch)) + '\n'
+    yield header
+    detector_ids, road_types = batch['detector_ids'], batch['road_types']
+    for start in range(0, len(detector_ids), BATCH_CHUNK_DETECTORS):
+        chunk = slice(start, start + BATCH_CHUNK_DETECTORS)
+        levels, probabilities = predict_batch_block(detector_ids[chunk], road_types[chunk], batch['days'],
+                                                    batch['hours'], snapshot, cube, cube_index, shard.historical)
+        with stage('serialize'):
+            percent = probability_columns(probabilities)
+            lines = []
+            for i, detid in enumerate(detector_ids[chunk]):
+                lines.append(json.dumps({
+                    'detid': str(detid),
+                    'level': levels[i].tolist(),
+                    'probabilities': {name: values[i] for name, values in percent.items()}
+                }))
+        yield '\n'.join(lines) + '\n'
+
+# ============================================================================
+# VIEWPORT (bbox / zoom) untuk endpoint peta
+# ============================================================================
+# /api/predict/map dan /api/prophet/predictions menerima bbox=west,south,east,north
+# dan zoom. Hanya sensor di dalam bbox yang dihitung (spatial.GridIndex); di bawah
+# MAP_CLUSTER_ZOOM response berisi clusters, bukan sensor satu per satu.
+# Tanpa bbox/zoom response sama seperti sebelumnya (semua sensor).
+
+MAP_CLUSTER_ZOOM = int(os.environ.get('MAP_CLUSTER_ZOOM', 12))
+
+def parse_viewport():
+    """(bbox atau None, zoom atau None) dari query string; ValueError jika bbox tidak valid"""
+    return parse_bbox(request.args.get('bbox')), clamp_zoom(request.args.get('zoom', type=int))
+
+def use_clusters(zoom):
+    return zoom is not None and zoom < MAP_CLUSTER_ZOOM
+
+def level_stats(levels):
+    counts = np.bincount(np.asarray(levels, dtype=np.int64), minlength=3)
+    return {STATUS_NAMES[level]: int(counts[level]) for level in range(3)}
+
+def format_clusters(clusters):
+    """Tambahkan stats per status dan warna status mayoritas ke hasil cluster_points"""
+    for cluster in clusters:
+        levels = cluster.pop('levels')
+        level = int(np.argmax(levels))
+        cluster.update(stats={STATUS_NAMES[i]: levels[i] for i in range(3)},
+                       status=STATUS_NAMES[level], color=STATUS_COLORS[level])
+    return clusters
+
+# Load Pre-computed Predictions if exists
+prophet_payload = None
+
+def load_prophet_predictions():
+    global prophet_payload
+    predictions_path = latest_predictions_path()
+    if not predictions_path:
+        return False
+    prophet_payload = load_prophet_payload(predictions_path, models)
+    print(f"✓ Prophet predictions loaded: {os.path.basename(predictions_path)}")
+    return True
+
+# ============================================================================
+# SPECTRAL CLUSTERING
+# ============================================================================
+# Spectral clustering pada profil occupancy 7x24 per sensor (lihat clustering.py).
+# Hasil disimpan di CACHE_DIR per data key: dihitung sekali di background thread
+# (atau offline: `python clustering.py`), request hanya membaca hasilnya.
+
+spectral_inputs = None   # (detector_ids, profiles, key)
+spectral_result = None   # (labels DataFrame, meta)
+spectral_error = None
+spectral_thread = None   # thread clustering di process ini (None di master, lihat start_service_threads)
+
+@stage('spectral_profiles')
+def prepare_spectral_inputs(shard=None):
+    """Sensor dengan data cukup dan koordinat -> (detector_ids, profiles, key)"""
+    shard = shard or home_shard()
+    if shard.sensor_stats is None or shard.detectors_df is None or shard.hourly_avg_table is None:
+        return None
+    detector_ids = clustering_sensors(shard.sensor_stats['detid'], shard.sensor_stats['count'],
+                                      set(shard.detectors_df['detid']))
+    if not detector_ids:
+        return None
+    rows = [shard.hourly_avg_index[d] for d in detector_ids]
+    profiles = hourly_profiles(shard.hourly_avg_table[rows])
+    return detector_ids, profiles, clustering_key(detector_ids, profiles)
+
+def compute_spectral(inputs):
+    """
+    Hitung clustering (hanya satu process per key, lainnya menunggu file hasil)
+    
+    Returns:
+        (result, error) - (None, None) jika process lain sedang menghitung key ini
+    """
+    detector_ids, profiles, key = inputs
+    lock_path = claim_computation(CACHE_DIR, key)
+    if lock_path is None:
+        return None, None
     try:
-        road_type_encoded = model_encoders['road_type'].transform([road_type])[0]
-    except:
-        road_type_encoded = 0
+        with stage('spectral_fit'):
+            result = compute_and_save(CACHE_DIR, key, detector_ids, profiles)
+        meta = result[1]
+        print(f"✓ Spectral clustering computed: {meta['n_sensors']} sensors, "
+              f"silhouette={meta['silhouette']}, {meta['training_time']}s")
+        return result, None
+    except Exception as e:
+        print(f"⚠ Spectral clustering error: {e}")
+        return None, str(e)
+    finally:
+        os.remove(lock_path)
+
+def run_spectral_clustering(inputs):
+    """Clustering home city (globals spectral_result / spectral_error)"""
+    global spectral_result, spectral_error
+    result, error = compute_spectral(inputs)
+    if result is not None:
+        spectral_result = result
+    if error is not None:
+        spectral_error = error
+
+def get_spectral_result():
+    """
+    Hasil clustering; dibaca dari cache jika sudah ditulis process lain
+
+    Selama hasil untuk key terbaru belum ada, hasil sebelumnya tetap dipakai.
+    """
+    global spectral_result
+    if spectral_inputs is None:
+        return spectral_result
+    if spectral_result is None or spectral_result[1].get('key') != spectral_inputs[2]:
+        try:
+            spectral_result = load_result(CACHE_DIR, spectral_inputs[2]) or spectral_result
+        except Exception as e:
+            print(f"⚠ Spectral clustering cache error: {e}")
+    return spectral_result
+
+def spectral_version():
+    """Data version + key hasil clustering yang sedang dipakai (cache key endpoint)"""
+    city = request_city()
+    if city == HOME_CITY:
+        result = get_spectral_result()
+    else:
+        shard = city_shards.peek(city)
+        result = shard.spectral_result if shard is not None else None
+    return f"{request_data_version()}:{result[1].get('key') if result else 'none'}"
+
+def start_spectral_thread():
+    global spectral_thread
+    spectral_thread = threading.Thread(target=run_spectral_clustering, args=(spectral_inputs,),
+                                       name='spectral-clustering', daemon=True)
+    spectral_thread.start()
+    print(f"✓ Spectral clustering started in background: {len(spectral_inputs[0])} sensors")
+
+def start_spectral_clustering():
+    """Startup component 'spectral': load hasil dari cache, atau mulai hitung di background"""
+    global spectral_inputs
+    spectral_inputs = prepare_spectral_inputs()
+    if spectral_inputs is None:
+        return False
+    if get_spectral_result() is not None:
+        print(f"✓ Spectral clustering loaded (cache): {len(spectral_result[0])} sensors")
+    elif not in_gunicorn_master():
+        # Di master (eager + preload): thread dimulai di worker oleh start_service_threads
+        start_spectral_thread()
+    return True
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+# Endpoint prediksi deterministik untuk (query args, data version): response JSON
+# di-cache sebagai bytes dengan ETag, jadi dashboard reload / geser slider jam
+# tidak menghitung ulang.
+
+def compute_data_version():
+    """Version string dari semua artifact yang di-load (bagian dari cache key & ETag)"""
+    h = hashlib.sha1()
+    predictions_path = prophet_payload['path'] if prophet_payload else None
+    for path in (models.source, encoders_path, detectors_csv_path, marseille_csv_path,
+                 predictions_path, clustering_comparison_path):
+        if path:
+            h.update(f"{os.path.basename(path)}:{file_signature(path)};".encode())
+    # Lazy startup: response yang dihitung sebelum component selesai di-load tidak dipakai lagi
+    h.update(','.join(sorted(name for name, state in startup_state.items() if state['status'] == 'ready')).encode())
+    return h.hexdigest()[:12]
+
+def refresh_data_version():
+    """Recompute DATA_VERSION (+ generation live ingestion)"""
+    global DATA_VERSION
+    generation = ingest_state['generation']
+    DATA_VERSION = f"{compute_data_version()}.{generation}" if generation else compute_data_version()
+
+DATA_VERSION = compute_data_version()
+# 0: browser revalidate setiap request (304 via ETag), tidak ada data basi setelah reload / ingest
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 0))
+response_cache = ResponseCache(max_bytes=int(os.environ.get('RESPONSE_CACHE_MB', 32)) * 1024 * 1024)
+
+def cached(defaults=None):
+    """Shortcut cached_response dengan data version kota yang diminta"""
+    return cached_response(response_cache, request_data_version, max_age=RESPONSE_CACHE_MAX_AGE, defaults=defaults)
+
+def current_hour():
+    return datetime.now().hour
+
+def current_day():
+    return datetime.now().weekday()
+
+# ============================================================================
+# LIVE INGESTION
+# ============================================================================
+# Readings baru (detid, datetime, occ, flow) di-merge ke accumulator Welford di
+# traffic_aggregates tanpa membaca ulang marseille_clean.csv. Historical averages
+# dan sensor stats langsung diperbarui; prediction cube dan spectral clustering
+# dibangun ulang di background setelah INGEST_REBUILD_DELAY detik tanpa data baru.
+#
+# Sumber readings:
+#   - file-tail: INGEST_TAIL_PATH (CSV dengan header) di-follow dari awal file oleh
+#     setiap worker, jadi semua worker konsisten dan readings tetap ada setelah restart
+#   - POST /api/ingest: jika INGEST_TAIL_PATH di-set, readings di-append ke file itu
+#     (diambil oleh tailer); jika tidak, langsung di-merge di worker yang menerima
+
+INGEST_COLUMNS = ['detid', 'datetime', 'occ', 'flow']
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN')
+INGEST_TAIL_PATH = os.environ.get('INGEST_TAIL_PATH')
+INGEST_TAIL_INTERVAL = float(os.environ.get('INGEST_TAIL_INTERVAL', 5))
+INGEST_TAIL_READ_BYTES = 8 * 1024 * 1024
+INGEST_REBUILD_DELAY = float(os.environ.get('INGEST_REBUILD_DELAY', 60))
+# Rentang valid: occupancy adalah fraksi [0, 1], flow kendaraan/jam per detector (flow boleh kosong)
+INGEST_MAX_FLOW = float(os.environ.get('INGEST_MAX_FLOW', 10000))
+
+ingest_lock = threading.Lock()
+ingest_state = {'generation': 0, 'records': 0, 'rejected': 0, 'last_ingest': None, 'last_rebuild': None}
+rebuild_timer = None
+
+def clean_readings(frame):
+    """Validasi readings -> (DataFrame bersih, jumlah baris ditolak)"""
+    missing = [c for c in ('detid', 'datetime', 'occ') if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    clean = pd.DataFrame({
+        'detid': frame['detid'].astype(str).where(frame['detid'].notna()),
+        'datetime': pd.to_datetime(frame['datetime'], errors='coerce', format='mixed'),
+        'occ': pd.to_numeric(frame['occ'], errors='coerce'),
+        'flow': pd.to_numeric(frame['flow'], errors='coerce') if 'flow' in frame.columns else np.nan
+    }).dropna(subset=['detid', 'datetime', 'occ'])
+    # NaN/inf, negatif dan di luar rentang ditolak (akan merusak averages secara permanen)
+    valid = clean['occ'].between(0, 1) & (clean['flow'].isna() | clean['flow'].between(0, INGEST_MAX_FLOW))
+    clean = clean[valid]
+    return clean, len(frame) - len(clean)
+
+def apply_readings(frame):
+    """Merge readings ke accumulator dan refresh historical averages / sensor stats"""
+    global hourly_avg_index, hourly_avg_table, historical_features, sensor_stats
+    if traffic_aggregates is None:
+        raise RuntimeError('Traffic aggregates not loaded')
+    clean, rejected = clean_readings(frame)
     
-    # Encode time period
+    with ingest_lock:
+        if len(clean):
+            traffic_aggregates.update_frame(clean)
+            hourly_avg_table = traffic_aggregates.hourly_avg_table()
+            hourly_avg_index = dict(traffic_aggregates.detector_index)
+            historical_features = HistoricalFeatures.from_aggregates(traffic_aggregates)
+            sensor_stats = traffic_aggregates.sensor_stats()
+            # Cube dihitung dari averages lama: pakai batch inference sampai rebuild
+            models.cube = None
+            ingest_state['generation'] += 1
+            ingest_state['last_ingest'] = datetime.now().isoformat(timespec='seconds')
+            refresh_data_version()
+        ingest_state['records'] += len(clean)
+        ingest_state['rejected'] += rejected
+    
+    if len(clean):
+        response_cache.clear()
+        schedule_rebuild()
+    return {'accepted': len(clean), 'rejected': rejected}
+
+def rebuild_derived():
+    """Rebuild prediction cube dan spectral clustering dari averages terbaru"""
+    global spectral_inputs
+    with ingest_lock:
+        generation = ingest_state['generation']
+    load_prediction_cube(models, cleanup=False)
     try:
-        time_period = get_time_period(hour)
-        time_period_encoded = model_encoders['time_period'].transform([time_period])[0]
-    except:
-        time_period_encoded = 0
-    
-    # Get historical average for this detector
-    avg_occ = 0.05
-    if detector_hourly_avg is not None and detector_id:
-        mask = (detector_hourly_avg['detid'] == detector_id) & \
-               (detector_hourly_avg['hour'] == hour) & \
-               (detector_hourly_avg['day_of_week'] == day_of_week)
-        matches = detector_hourly_avg[mask]
-        if len(matches) > 0:
-            avg_occ = matches['avg_occ'].values[0]
-    
-    features = {
-        'hour': hour,
-        'hour_sin': hour_sin,
-        'hour_cos': hour_cos,
-        'day_of_week': day_of_week,
-        'day_sin': day_sin,
-        'day_cos': day_cos,
-        'is_weekend': is_weekend,
-        'is_rush_hour': is_rush,
-        'time_period_encoded': time_period_encoded,
-        'interval': 180,
-        'road_type_encoded': road_type_encoded,
-        'detector_encoded': detector_encoded,
-        'avg_flow_per_hour': 100,
-        'avg_occ_per_hour': avg_occ,
-        'detector_avg_occ': avg_occ
-    }
+        spectral_inputs = prepare_spectral_inputs()
+        current = get_spectral_result()
+        if spectral_inputs is not None and (current is None or current[1].get('key') != spectral_inputs[2]):
+            run_spectral_clustering(spectral_inputs)
+    except Exception as e:
+        print(f"⚠ Spectral clustering rebuild error: {e}")
+    response_cache.clear()
+    ingest_state['last_rebuild'] = datetime.now().isoformat(timespec='seconds')
+    print(f"✓ Derived data rebuilt after live ingestion (generation {generation})")
+
+def schedule_rebuild():
+    """Debounce: rebuild setelah INGEST_REBUILD_DELAY detik tanpa readings baru"""
+    global rebuild_timer
+    if rebuild_timer is not None:
+        rebuild_timer.cancel()
+    rebuild_timer = threading.Timer(INGEST_REBUILD_DELAY, rebuild_derived)
+    rebuild_timer.daemon = True
+    rebuild_timer.start()
+
+def append_to_ingest_log(frame):
+    """Append readings ke INGEST_TAIL_PATH (satu write O_APPEND per request)"""
+    clean, rejected = clean_readings(frame)
+    try:
+        # Header hanya ditulis oleh process yang membuat file
+        fd = os.open(INGEST_TAIL_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        with os.fdopen(fd, 'w') as f:
+            f.write(','.join(INGEST_COLUMNS) + '\n')
+    except FileExistsError:
+        pass
+    body = clean.assign(datetime=clean['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'))[INGEST_COLUMNS] \
+        .to_csv(index=False, header=False)
+    with open(INGEST_TAIL_PATH, 'a') as f:
+        f.write(body)
+    return {'accepted': len(clean), 'rejected': rejected}
+
+def tail_ingest_log(path, interval):
+    """Follow CSV readings seperti `tail -F` (dari awal file; rotasi/truncate dideteksi)"""
+    position, inode, header = 0, None, None
+    while True:
+        try:
+            stat = os.stat(path)
+            if stat.st_ino != inode or stat.st_size < position:
+                position, inode, header = 0, stat.st_ino, None
+            while stat.st_size > position:
+                with open(path, 'rb') as f:
+                    f.seek(position)
+                    data = f.read(INGEST_TAIL_READ_BYTES)
+                # Hanya baris lengkap; sisa baris dibaca di putaran berikutnya
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    break
+                position += end
+                lines = data[:end]
+                if header is None:
+                    header, lines = lines.split(b'\n', 1)
+                if lines.strip():
+                    result = apply_readings(pd.read_csv(io.BytesIO(header + b'\n' + lines)))
+                    print(f"✓ Ingested {result['accepted']} readings from {os.path.basename(path)}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠ Ingest tail error: {e}")
+        time.sleep(interval)
+
+# ============================================================================
+# HOT RELOAD
+# ============================================================================
+# Watcher thread memeriksa artifact setiap ARTIFACT_WATCH_INTERVAL detik (0 = mati):
+#   - sensor_predictions_*.csv terbaru (mis. hasil prophet_pipeline.py)
+#   - traffic_model_compact.npz / traffic_model_optimized.pkl / model encoders
+# Artifact baru di-load dan di-precompute (payload, prediction cube) di thread watcher,
+# lalu di-swap dengan satu assignment global. Request yang sedang berjalan tetap memakai
+# snapshot lama sampai selesai; response cache dikosongkan saat swap. File harus stabil
+# (size/mtime sama) selama dua pemeriksaan berturut-turut supaya file yang masih
+# di-copy tidak ikut di-load.
+
+ARTIFACT_WATCH_INTERVAL = float(os.environ.get('ARTIFACT_WATCH_INTERVAL', 60))
+
+reload_state = {'reloads': 0, 'last_reload': None, 'last_error': None}
+
+def model_artifacts_signature():
+    """Signature semua file yang menentukan ModelSnapshot"""
+    paths = ([rf_compact_path] if RF_RUNTIME == 'auto' else []) + [rf_model_path, encoders_path]
+    return tuple((os.path.basename(p), file_signature(p)) for p in paths)
+
+def predictions_signature():
+    path = latest_predictions_path()
+    return (path, file_signature(path)) if path else None
+
+def swap_artifacts(new_models=None, new_payload=None):
+    """Ganti snapshot aktif, lalu invalidasi data version dan response cache"""
+    global models, prophet_payload
+    if new_models is not None:
+        models = new_models
+    if new_payload is not None:
+        prophet_payload = new_payload
+    refresh_data_version()
+    response_cache.clear()
+    reload_state['reloads'] += 1
+    reload_state['last_reload'] = datetime.now().isoformat(timespec='seconds')
+    # Snapshot lama dilepas begitu request terakhir yang memakainya selesai
+    gc.collect()
+
+def reload_models():
+    """Load model + encoders baru dan build cube-nya, di luar request path"""
+    rf_model, source = load_rf_model()
+    snapshot = ModelSnapshot(rf_model, load_encoders(), source)
+    if not snapshot.ready:
+        raise RuntimeError('New model artifacts could not be loaded')
+    load_prediction_cube(snapshot, cleanup=False)
+    return snapshot
+
+def watch_artifacts(interval):
+    """Loop watcher: deteksi artifact baru, load di background, swap atomik"""
+    loaded = {'models': model_artifacts_signature(), 'predictions': predictions_signature()}
+    previous = dict(loaded)
+    while True:
+        time.sleep(interval)
+        stable = set()
+        try:
+            current = {'models': model_artifacts_signature(), 'predictions': predictions_signature()}
+            stable = {key for key in current if current[key] != loaded[key] and current[key] == previous[key]}
+            previous = current
+            if not stable:
+                continue
+            
+            new_models = reload_models() if 'models' in stable else None
+            new_payload = None
+            snapshot = new_models or models
+            thresholds_changed = new_models is not None and prophet_payload is not None and \
+                prophet_payload['thresholds'] != (snapshot.threshold_low, snapshot.threshold_high)
+            if ('predictions' in stable or thresholds_changed) and current['predictions']:
+                new_payload = load_prophet_payload(current['predictions'][0], snapshot)
+            
+            swap_artifacts(new_models, new_payload)
+            print(f"✓ Artifacts reloaded: {', '.join(sorted(stable))} (pid {os.getpid()})")
+        except Exception as e:
+            reload_state['last_error'] = f"{datetime.now().isoformat(timespec='seconds')}: {e}"
+            print(f"⚠ Artifact reload error: {e}")
+        # Artifact yang gagal di-load tidak dicoba lagi sampai file-nya berubah
+        loaded.update({key: previous[key] for key in stable})
+
+def start_service_threads():
+    """Spectral clustering (jika ditunda di master), ingest tailer dan artifact watcher (setelah data selesai di-load)"""
+    if spectral_thread is None and spectral_inputs is not None and get_spectral_result() is None:
+        start_spectral_thread()
+    if INGEST_TAIL_PATH and traffic_aggregates is not None:
+        threading.Thread(target=tail_ingest_log, args=(INGEST_TAIL_PATH, INGEST_TAIL_INTERVAL),
+                         name='ingest-tail', daemon=True).start()
+        print(f"✓ Following live readings: {INGEST_TAIL_PATH} (pid {os.getpid()})")
+    if ARTIFACT_WATCH_INTERVAL > 0:
+        threading.Thread(target=watch_artifacts, args=(ARTIFACT_WATCH_INTERVAL,),
+                         name='artifact-watcher', daemon=True).start()
+
+# ============================================================================
+# MULTI-CITY SHARDS
+# ============================================================================
+# Setiap endpoint menerima ?city=<citycode> (detectors_public.csv). Home city
+# (marseille) dilayani dari globals di atas. Kota lain di-load lazy sebagai
+# CityShard dari CITIES_DIR/<city>/ saat pertama diminta:
+#   traffic_model_compact.npz / traffic_model_optimized.pkl + model_encoders_optimized.pkl
+#   <city>_clean.csv (readings, format sama dengan marseille_clean.csv)
+#   sensor_predictions_*.csv, clustering_models_comparison.csv
+# Semua file opsional kecuali detectors; file juga bisa di-download lewat artifacts.json
+# (nama artifact 'cities/<city>/...'). Shard tidak punya prediction cube (batched
+# inference per request), live ingestion dan hot reload hanya untuk home city.
+# Shards disimpan di LRU per worker: CITY_CACHE_MAX shard, CITY_CACHE_MB total
+# (estimasi), dan CITY_MEMORY_LIMIT_MB (USS worker, 0 = tidak dicek).
+
+CITIES_DIR = os.environ.get('CITIES_DIR', os.path.join(BASE_PATH, 'cities'))
+CITY_LOAD_WAIT = float(os.environ.get('CITY_LOAD_WAIT', 2))
+city_catalog = None   # DataFrame citycode -> jumlah sensor, center lat/long
+
+def get_city_catalog():
+    """Semua citycode di detectors_public.csv (dibaca sekali per process)"""
+    global city_catalog
+    if city_catalog is None:
+        detectors = pd.read_csv(detectors_csv_path, usecols=['citycode', 'lat', 'long'])
+        city_catalog = detectors.groupby('citycode').agg(sensors=('lat', 'size'), lat=('lat', 'mean'),
+                                                         long=('long', 'mean'))
+    return city_catalog
+
+def request_city(city=None):
+    """City dari argumen / query string (default home city), lowercase"""
+    return str(city or request.args.get('city') or HOME_CITY).strip().lower()
+
+def home_shard():
+    """CityShard ringan di atas globals home city (dibuat per request, tidak di-cache)"""
+    return CityShard(
+        HOME_CITY, detectors_df=detectors_df, detector_grid=detector_grid, detector_records=detector_records,
+        detector_columns=detector_columns, detector_road_types=detector_road_types,
+        detector_road_type_index=detector_road_type_index, traffic_aggregates=traffic_aggregates, sensor_stats=sensor_stats,
+        hourly_avg_table=hourly_avg_table, hourly_avg_index=hourly_avg_index, historical=historical_features,
+        models=models, prophet_payload=prophet_payload, clustering_comparison=clustering_comparison,
+        spectral_inputs=spectral_inputs, spectral_error=spectral_error, version=DATA_VERSION
+    )
+
+@stage('load_city_shard')
+def load_city_shard(city):
+    """Load semua data satu kota (dipanggil oleh city_shards di background thread)"""
+    directory = os.path.join(CITIES_DIR, city)
+    city_file = lambda name: os.path.join(directory, name)
+    available = lambda path: artifact_manager.available(artifact_name(path))
     
-    feature_columns = model_encoders.get('feature_columns', list(features.keys()))
-    feature_df = pd.DataFrame([features])
+    df, _ = load_detector_frames(city)
+    if len(df) == 0:
+        raise ValueError(f'No detectors for {city}')
+    columns = build_detector_columns(df)
+    road_types, road_type_index = build_road_types(df)
+    shard = CityShard(city, detectors_df=df, detector_columns=columns, detector_road_types=road_types,
+                      detector_road_type_index=road_type_index,
+                      detector_records=records_from_columns(columns, len(df)),
+                      detector_grid=GridIndex(df['lat'].to_numpy(), df['long'].to_numpy()),
+                      historical=HistoricalFeatures.empty())
+    sources = [detectors_csv_path]
     
-    for col in feature_columns:
-        if col not in feature_df.columns:
-            feature_df[col] = 0
+    compact_path, pickle_path = city_file('traffic_model_compact.npz'), city_file('traffic_model_optimized.pkl')
+    rf_model, source = (None, None)
+    if available(compact_path) or available(pickle_path):
+        rf_model, source = load_rf_model(compact_path, pickle_path)
+    encoders = load_encoders(city_file('model_encoders_optimized.pkl')) if rf_model is not None else None
+    shard.models = ModelSnapshot(rf_model, encoders, source)
+    sources += [source, city_file('model_encoders_optimized.pkl')] if source else []
     
-    feature_df = feature_df[feature_columns]
+    csv_path = city_file(f'{city}_clean.csv')
+    if available(csv_path) and ensure_model_exists(csv_path):
+        aggregates, _ = load_traffic_aggregates(csv_path, f'traffic_aggregates_{city}_v{FRAMES_VERSION}')
+        shard.traffic_aggregates = aggregates
+        shard.hourly_avg_table = aggregates.hourly_avg_table()
+        shard.hourly_avg_index = dict(aggregates.detector_index)
+        shard.historical = HistoricalFeatures.from_aggregates(aggregates)
+        shard.sensor_stats = aggregates.sensor_stats()
+        sources.append(csv_path)
     
-    prediction = rf_model.predict(feature_df)[0]
-    probabilities = rf_model.predict_proba(feature_df)[0]
+    predictions_path = latest_predictions_path(directory)
+    if predictions_path:
+        shard.prophet_payload = load_prophet_payload(predictions_path, shard.models)
+        sources.append(predictions_path)
+    comparison_path = city_file('clustering_models_comparison.csv')
+    if os.path.exists(comparison_path):
+        shard.clustering_comparison = pd.read_csv(comparison_path)
+        sources.append(comparison_path)
     
-    status_names = {0: 'Lancar', 1: 'Sedang', 2: 'Macet'}
-    colors = {0: '#2ecc71', 1: '#f39c12', 2: '#e74c3c'}
+    shard.spectral_inputs = prepare_spectral_inputs(shard)
+    if shard.spectral_inputs is not None:
+        shard.spectral_result = load_result(CACHE_DIR, shard.spectral_inputs[2])
     
-    return {
-        'level': int(prediction),
-        'status': status_names[prediction],
-        'color': colors[prediction],
-        'probabilities': {
-            'Lancar': round(float(probabilities[0]) * 100, 1),
-            'Sedang': round(float(probabilities[1]) * 100, 1),
-            'Macet': round(float(probabilities[2]) * 100, 1)
-        }
-    }
+    h = hashlib.sha1(f"{city};features:{FEATURES_VERSION};".encode())
+    for path in sources:
+        h.update(f"{artifact_name(path)}:{file_signature(path)};".encode())
+    shard.sources = [artifact_name(path) for path in sources]
+    shard.version = h.hexdigest()[:12]
+    return shard
+
+def city_memory_mb():
+    memory = process_memory()
+    return memory.get('uss_mb', memory.get('peak_rss_mb'))
+
+city_shards = ShardCache(
+    load_city_shard,
+    max_entries=int(os.environ.get('CITY_CACHE_MAX', 4)),
+    max_bytes=int(os.environ.get('CITY_CACHE_MB', 256)) * 1024 * 1024,
+    memory_limit_mb=float(os.environ.get('CITY_MEMORY_LIMIT_MB', 0)) or None,
+    memory_fn=city_memory_mb
+)
+
+def request_data_version():
+    """Data version kota yang diminta (bagian dari response cache key)"""
+    city = request_city()
+    if city == HOME_CITY:
+        return DATA_VERSION
+    shard = city_shards.peek(city)
+    # Shard belum di-load: key unik, response yang dihitung saat itu tidak pernah dipakai ulang
+    return f"{city}:{shard.version}" if shard is not None else f"{city}:loading:{time.monotonic_ns()}"
+
+def request_shard(*components, city=None):
+    """
+    CityShard untuk request ini -> (shard, None) atau (None, error response)
+    
+    Home city: 503 selama startup components belum siap. Kota lain: 404 jika tidak
+    ada di detectors_public.csv, 503 + Retry-After selama shard masih di-load.
+    """
+    city = request_city(city)
+    if city == HOME_CITY:
+        loading = component_loading(*components)
+        return (None, loading) if loading else (home_shard(), None)
+    if city not in get_city_catalog().index:
+        return None, (jsonify({'error': f'Unknown city: {city}', 'cities': '/api/cities'}), 404)
+    try:
+        shard = city_shards.get(city, timeout=CITY_LOAD_WAIT)
+    except RuntimeError as e:
+        return None, (jsonify({'error': f'City {city} could not be loaded: {e}'}), 503)
+    if shard is None:
+        response = jsonify({
+            'error': f"Server sedang memuat data {city}, coba lagi sebentar",
+            'status': 'loading',
+            'loading': [city]
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+        return None, response
+    return shard, None
+
+def shard_spectral_result(shard):
+    """Hasil spectral clustering sebuah shard: dari cache, atau mulai hitung di background"""
+    if shard.spectral_result is None and shard.spectral_inputs is not None:
+        shard.spectral_result = load_result(CACHE_DIR, shard.spectral_inputs[2])
+        if shard.spectral_result is None and shard.spectral_thread is None:
+            def run():
+                result, shard.spectral_error = compute_spectral(shard.spectral_inputs)
+                shard.spectral_result = result or shard.spectral_result
+            shard.spectral_thread = threading.Thread(target=run, name=f'spectral-{shard.city}', daemon=True)
+            shard.spectral_thread.start()
+    return shard.spectral_result
+
+# ============================================================================
+# DETECTOR CATALOG
+# ============================================================================
+# /api/detectors/list: semua detector di detectors_public.csv (semua kota) dengan
+# index detid / nama jalan (detector_catalog.py). Dibangun sekali saat startup
+# (component 'catalog') dan dibangun ulang jika file detectors berubah.
+
+detector_catalog = CatalogLoader(detectors_csv_path, file_signature, stage('load_catalog')(read_catalog))
+
+def load_detector_catalog():
+    catalog = detector_catalog.get()
+    if catalog is None:
+        return False
+    print(f"✓ Detector catalog: {len(catalog)} detectors, {len(catalog.city_ranges)} cities")
+    return True
+
+# ============================================================================
+# STARTUP
+# ============================================================================
+# Setiap component di-load oleh loader-nya setelah dependencies selesai. Mode 'lazy':
+# satu thread per component, jadi gunicorn langsung bind port dan menjawab /healthz,
+# /readyz, dan '/'; endpoint yang component-nya belum siap menjawab 503 + Retry-After.
+# Mode 'eager': berurutan saat import (perilaku lama, port baru dibuka setelah selesai).
+# Status: 'pending' -> 'loading' -> 'ready' | 'unavailable' (file tidak ada) | 'failed'.
+
+STARTUP_COMPONENTS = [
+    # (name, loader, dependencies) - urutan list valid untuk mode eager
+    ('detectors', load_detectors, ()),
+    ('catalog', load_detector_catalog, ()),
+    ('clustering_comparison', load_clustering_comparison, ()),
+    ('model', load_models, ()),
+    ('traffic', load_traffic_data, ()),
+    ('prophet', load_prophet_predictions, ('model',)),
+    ('cube', load_cube, ('model', 'detectors', 'traffic')),
+    ('spectral', start_spectral_clustering, ('detectors', 'traffic')),
+]
+STARTUP_RETRY_AFTER = 5
+
+startup_events = {name: threading.Event() for name, _, _ in STARTUP_COMPONENTS}
+startup_thread = None
+startup_state.update({name: {'status': 'pending'} for name, _, _ in STARTUP_COMPONENTS})
+startup_began = time.time()
+
+def run_component(name, loader, depends):
+    """Jalankan satu loader setelah dependencies-nya selesai, catat status & durasi"""
+    for dependency in depends:
+        startup_events[dependency].wait()
+    state = startup_state[name]
+    state.update(status='loading', started=round(time.time() - startup_began, 3))
+    start = time.time()
+    try:
+        state['status'] = 'ready' if loader() else 'unavailable'
+    except Exception as e:
+        state.update(status='failed', error=str(e))
+        print(f"⚠ {name} not loaded: {e}")
+    state['seconds'] = round(time.time() - start, 3)
+    refresh_data_version()
+    startup_events[name].set()
+
+def run_startup(parallel):
+    """Load semua component (parallel: satu thread per component), lalu mulai service threads"""
+    global startup_began
+    startup_began = time.time()
+    prefetch_artifacts()
+    if parallel:
+        threads = [threading.Thread(target=run_component, args=component, name=f'startup-{component[0]}', daemon=True)
+                   for component in STARTUP_COMPONENTS]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        for component in STARTUP_COMPONENTS:
+            run_component(*component)
+    print(f"✓ Startup complete ({STARTUP_MODE}): {time.time() - startup_began:.1f}s (pid {os.getpid()})")
+    print("=" * 60)
+
+def startup_finished():
+    return all(event.is_set() for event in startup_events.values())
+
+def wait_for_startup(timeout=None):
+    """Blok sampai semua component selesai (untuk scripts/benchmark yang meng-import app)"""
+    deadline = None if timeout is None else time.time() + timeout
+    for event in startup_events.values():
+        if not event.wait(None if deadline is None else max(0, deadline - time.time())):
+            return False
+    return True
+
+def component_loading(*names):
+    """Response 503 jika salah satu component masih di-load, None jika semua sudah selesai"""
+    loading = [name for name in names if not startup_events[name].is_set()]
+    if not loading:
+        return None
+    response = jsonify({
+        'error': f"Server sedang memuat {', '.join(loading)}, coba lagi sebentar",
+        'status': 'loading',
+        'loading': loading
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+    return response
+
+def start_worker_threads():
+    """Per process (thread tidak ikut fork ke gunicorn workers): lazy startup lalu service threads"""
+    global startup_thread
+    if startup_finished():
+        start_service_threads()
+    elif startup_thread is None:
+        startup_thread = threading.Thread(target=lambda: (run_startup(parallel=True), start_service_threads()),
+                                          name='startup', daemon=True)
+        startup_thread.start()
+
+# `python app.py`: pool processes cube (spawn) meng-import file ini sebagai __mp_main__,
+# di sana tidak ada yang di-load
+if STARTUP_MODE == 'eager' and __name__ != '__mp_main__':
+    run_startup(parallel=False)
+
+# Dengan preload, import terjadi di gunicorn master: threads (dan lazy startup) dimulai
+# di setiap worker oleh post_worker_init (gunicorn.conf.py)
+if not in_gunicorn_master() and __name__ != '__mp_main__':
+    start_worker_threads()
+
+# ============================================================================
+# METRICS & PROFILING
+# ============================================================================
+# /metrics (Prometheus text, per worker process): durasi request per endpoint,
+# durasi per stage (metrics.stage: avg_lookup, features, inference, cube_lookup,
+# format, serialize, load_*), status startup components, memory dan cache.
+# Setiap response membawa header Server-Timing dengan stages request itu.
+#
+# Profiler opt-in: set PROFILE_TOKEN, lalu request dengan ?profile=1 (pstats text) atau
+# ?profile=prof (file .prof) dan header X-Profile-Token. Opsional: profile_sort, profile_limit.
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+
+request_seconds = registry.histogram('traffic_request_seconds',
+                                     'Durasi request per endpoint (body streaming tidak termasuk)', ('endpoint',))
+requests_total = registry.counter('traffic_requests_total', 'Jumlah request per endpoint, method dan status',
+                                  ('endpoint', 'method', 'status'))
+
+def memory_samples():
+    memory = process_memory()
+    samples = {(kind,): int(memory[f'{kind}_mb'] * 1024 * 1024) for kind in ('rss', 'pss', 'uss')
+               if f'{kind}_mb' in memory}
+    samples[('peak_rss',)] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return samples
+
+registry.gauge('traffic_process_memory_bytes', 'Memory process ini (rss, pss, uss, peak_rss)', ('kind',),
+               fn=memory_samples)
+registry.gauge('traffic_process_info', 'Info worker process (nilai selalu 1)', ('pid', 'mode', 'data_version'),
+               fn=lambda: {(os.getpid(), STARTUP_MODE, DATA_VERSION): 1})
+registry.gauge('traffic_uptime_seconds', 'Detik sejak startup dimulai', fn=lambda: {(): round(time.time() - startup_began, 3)})
+registry.gauge('traffic_ready', '1 jika semua startup components selesai', fn=lambda: {(): int(startup_finished())})
+registry.gauge('traffic_startup_component_seconds', 'Durasi load per startup component (model, traffic, cube, ...)',
+               ('component', 'status'),
+               fn=lambda: {(name, state['status']): state.get('seconds') for name, state in startup_state.items()})
+registry.gauge('traffic_cube_slots_ready', f'Slot (day, hour) prediction cube yang sudah dihitung (dari {CUBE_SLOTS})',
+               fn=lambda: {(): cube_slots_ready(models)})
+registry.counter('traffic_response_cache_hits_total', 'Response cache hits',
+                 fn=lambda: {(): response_cache.stats()['hits']})
+registry.counter('traffic_response_cache_misses_total', 'Response cache misses',
+                 fn=lambda: {(): response_cache.stats()['misses']})
+registry.gauge('traffic_response_cache_bytes', 'Ukuran response cache', fn=lambda: {(): response_cache.stats()['bytes']})
+registry.gauge('traffic_city_shards_loaded', 'City shards di memory worker ini (tanpa home city)',
+               fn=lambda: {(): len(city_shards.status()['loaded'])})
+registry.counter('traffic_city_shard_evictions_total', 'City shards yang di-evict',
+                 fn=lambda: {(): city_shards.status()['evictions']})
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    if PROFILE_TOKEN and request.args.get('profile') and request.headers.get('X-Profile-Token') == PROFILE_TOKEN:
+        g.profiler = start_profile()
+        if g.profiler is None:
+            return jsonify({'error': 'Profiler sedang dipakai request lain, coba lagi'}), 429
+
+@app.after_request
+def finish_request_metrics(response):
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    endpoint = request.endpoint or 'unmatched'
+    request_seconds.observe(elapsed, endpoint)
+    requests_total.inc(endpoint, request.method, response.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        stop_profile(profiler)
+        response = profile_response(profiler, request.args.get('profile'), request.args.get('profile_sort', 'cumulative'),
+                                    request.args.get('profile_limit', 40, type=int))
+    timing = server_timing(elapsed)
+    if timing:
+        response.headers['Server-Timing'] = timing
+    return response
+
+@app.teardown_request
+def release_profiler(error=None):
+    # View raise exception: after_request tidak dipanggil, profiler tetap harus dilepas
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        stop_profile(profiler)
+
+# ============================================================================
+# COMPRESSION
+# ============================================================================
+# gzip / brotli sesuai Accept-Encoding (serialization.Compressor), JSON >= COMPRESS_MIN_BYTES.
+# Response dengan ETag (response cache) dikompres sekali per encoding dengan level tinggi
+# dan disimpan (COMPRESSED_CACHE_MB). RESPONSE_COMPRESSION=0 jika proxy sudah kompres.
+# Didaftarkan setelah hook metrics: after_request berjalan terbalik, jadi 'compress'
+# ikut di Server-Timing.
+
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '1') == '1'
+compressor = Compressor(min_bytes=int(os.environ.get('COMPRESS_MIN_BYTES', 1024)),
+                        cache_bytes=int(os.environ.get('COMPRESSED_CACHE_MB', 16)) * 1024 * 1024)
+if RESPONSE_COMPRESSION:
+    app.after_request(compressor)
+
+def compression_samples():
+    stats = compressor.stats()
+    samples = {(encoding, 'in'): n for encoding, n in stats['bytes_in'].items()}
+    samples.update({(encoding, 'out'): n for encoding, n in stats['bytes_out'].items()})
+    return samples
+
+registry.counter('traffic_compression_bytes_total', 'Bytes response sebelum (in) / sesudah (out) kompresi',
+                 ('encoding', 'direction'), fn=compression_samples)
+registry.counter('traffic_compression_cache_hits_total', 'Response terkompresi yang diambil dari cache',
+                 fn=lambda: {(): compressor.stats()['precompressed']['hits']})
 
 # ============================================================================
 # ROUTES
@@ -292,29 +1527,57 @@ def predict_with_rf(hour, day_of_week, detector_id=None, road_type='secondary'):
 def index():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    """Liveness: process hidup dan menjawab request (tidak menunggu model/data)"""
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'uptime': round(time.time() - startup_began, 1)})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 setelah semua component selesai di-load, 503 selama startup"""
+    ready = startup_finished()
+    response = jsonify({
+        'ready': ready,
+        'mode': STARTUP_MODE,
+        'elapsed': round(time.time() - startup_began, 3),
+        'components': {name: dict(state) for name, state in startup_state.items()},
+        'cube': {'slots_ready': cube_slots_ready(models), 'slots': CUBE_SLOTS},
+        'degraded': [name for name, state in startup_state.items() if state['status'] in ('unavailable', 'failed')]
+    })
+    if not ready:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+    return response
+
 @app.route('/api/models/info')
 def get_models_info():
     """Info tentang model yang tersedia"""
+    shard, error = request_shard()
+    if error:
+        return error
+    snapshot, payload = shard.models, shard.prophet_payload
+    home = shard.city == HOME_CITY
     return jsonify({
+        'city': shard.city,
         'random_forest': {
-            'available': rf_model is not None,
+            'available': snapshot.rf_model is not None,
             'name': 'Random Forest Classifier',
             'type': 'Supervised Learning - Classification',
             'description': 'Klasifikasi status traffic (Lancar/Sedang/Macet) berdasarkan waktu dan lokasi sensor',
-            'features': len(model_encoders.get('feature_columns', [])) if model_encoders else 0,
+            'features': len(snapshot.encoders.get('feature_columns', [])) if snapshot.encoders else 0,
             'accuracy': '85%',
             'use_case': 'Prediksi real-time status traffic per jam'
         },
         'prophet': {
-            'available': predictions_df is not None,
+            'available': payload is not None,
             'name': 'Facebook Prophet',
             'type': 'Time Series Forecasting',
             'description': 'Prediksi occupancy traffic 24 jam mendatang untuk setiap sensor',
-            'sensors': len(predictions_df) if predictions_df is not None else 0,
+            'sensors': payload['total'] if payload is not None else 0,
             'use_case': 'Forecasting jangka pendek (24 jam)'
         },
         'spectral': {
-            'available': traffic_df is not None and detectors_df is not None,
+            'available': shard.sensor_stats is not None and shard.detectors_df is not None,
             'name': 'Spectral Clustering',
             'type': 'Unsupervised Learning - Clustering',
             'description': 'Mengelompokkan sensor berdasarkan pola karakteristik traffic yang serupa',
@@ -322,23 +1585,41 @@ def get_models_info():
             'use_case': 'Analisis pola dan segmentasi sensor'
         },
         'thresholds': {
-            'low': round(THRESHOLD_LOW, 4),
-            'high': round(THRESHOLD_HIGH, 4)
-        }
+            'low': round(snapshot.threshold_low, 4),
+            'high': round(snapshot.threshold_high, 4)
+        },
+        'loading': [name for name in ('model', 'prophet', 'traffic', 'detectors')
+                    if home and not startup_events[name].is_set()]
     })
 
 @app.route('/api/predict/24hours')
+@cached(defaults={'day': current_day})
 def predict_24_hours():
     """Prediksi 24 jam untuk hari tertentu"""
+    shard, error = request_shard('model', 'traffic')
+    if error:
+        return error
     day = request.args.get('day', type=int, default=datetime.now().weekday())
     detector_id = request.args.get('detector', default=None)
     
     days_name = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
     
+    snapshot = shard.models
+    cube = snapshot.cube
+    if cube is not None and 0 <= day < 7 and (detector_id is None or detector_id in snapshot.cube_index) \
+            and slots_ready(snapshot.cube_progress, day):
+        row = snapshot.cube_index[detector_id] if detector_id is not None else len(snapshot.cube_index)
+        result = cube_lookup(cube, row, day)
+    else:
+        # Road type detector seperti di cube, supaya hasil sama dengan/tanpa cube
+        road_type = shard.detector_road_type_index.get(detector_id, 'secondary')
+        result = predict_rf_batch(np.arange(24), day, [detector_id] * 24, [road_type] * 24, snapshot,
+                                  shard.historical)
+    
     predictions = []
     for hour in range(24):
-        if rf_model is not None:
-            pred = predict_with_rf(hour, day, detector_id)
+        if result is not None:
+            pred = format_prediction(result[0][hour], result[1][hour])
         else:
             pred = {
                 'level': 1 if 7 <= hour <= 9 or 17 <= hour <= 19 else 0,
@@ -360,207 +1641,294 @@ def predict_24_hours():
     }
     
     return jsonify({
+        'city': shard.city,
         'day': day,
         'day_name': days_name[day],
         'detector': detector_id,
         'predictions': predictions,
         'stats': stats,
-        'model_used': 'Random Forest' if rf_model else 'Pattern-based'
+        'model_used': 'Random Forest' if snapshot.rf_model else 'Pattern-based'
     })
 
 @app.route('/api/predict/map')
+@cached(defaults={'hour': current_hour, 'day': current_day})
 def predict_map():
     """Prediksi untuk semua sensor pada jam tertentu"""
+    shard, error = request_shard('detectors', 'model', 'traffic')
+    if error:
+        return error
     hour = request.args.get('hour', type=int, default=datetime.now().hour)
     day = request.args.get('day', type=int, default=datetime.now().weekday())
     
-    if detectors_df is None:
+    detectors = shard.detectors_df
+    if detectors is None:
         return jsonify({'error': 'Detector data not available'})
+    try:
+        bbox, zoom = parse_viewport()
+        shape = parse_shape(request.args.get('shape'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    sensors = []
-    stats = {'Lancar': 0, 'Sedang': 0, 'Macet': 0}
+    detector_ids = detectors['detid'].to_numpy(dtype=object)
+    road_types = shard.detector_road_types
+    # Hanya sensor di viewport yang diprediksi dan diformat
+    grid = shard.detector_grid
+    with stage('viewport'):
+        visible = grid.query(bbox) if bbox is not None else np.arange(len(detector_ids))
+    rows = visible if bbox is not None else slice(0, len(detector_ids))
     
-    for _, sensor in detectors_df.iterrows():
-        if rf_model is not None:
-            pred = predict_with_rf(hour, day, sensor['detid'], sensor.get('fclass', 'secondary'))
-        else:
-            pred = {'level': 0, 'status': 'Lancar', 'color': '#2ecc71', 'probabilities': {}}
-        
-        if pred:
-            stats[pred['status']] += 1
-            
-            # Handle NaN values
-            road_value = sensor.get('road', 'Unknown')
-            if pd.isna(road_value):
-                road_value = 'Unknown'
-            
-            fclass_value = sensor.get('fclass', 'Unknown')
-            if pd.isna(fclass_value):
-                fclass_value = 'Unknown'
-            
-            sensors.append({
-                'detid': str(sensor['detid']),
-                'lat': float(sensor['lat']),
-                'long': float(sensor['long']),
-                'road': str(road_value),
-                'fclass': str(fclass_value),
-                **pred
-            })
+    snapshot = shard.models
+    cube = snapshot.cube
+    if cube is not None and 0 <= day < 7 and 0 <= hour < 24 and slots_ready(snapshot.cube_progress, day, hour):
+        result = cube_lookup(cube, rows, day, hour)
+    else:
+        result = predict_rf_batch(hour, day, detector_ids[rows], road_types[rows], snapshot, shard.historical)
+    levels = result[0] if result is not None else np.zeros(len(visible), dtype=int)
     
-    return jsonify({
+    response = {
+        'city': shard.city,
         'hour': hour,
         'hour_label': f"{hour:02d}:00",
         'day': day,
         'day_name': ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu'][day],
-        'sensors': sensors,
-        'stats': stats,
-        'total_sensors': len(sensors)
-    })
+        'stats': level_stats(levels),
+        'total_sensors': len(visible)
+    }
+    if use_clusters(zoom):
+        with stage('cluster'):
+            clusters = format_clusters(cluster_points(grid.lat[visible], grid.long[visible], levels, zoom))
+        return jsonify({**response, 'sensors': [], 'clusters': clusters, 'zoom': zoom, 'bbox': bbox})
+    
+    if bbox is not None or zoom is not None:
+        response.update(clusters=[], zoom=zoom, bbox=bbox)
+    with stage('format'):
+        if result is not None:
+            percent = np.asarray(result[1], dtype=np.float64) * 100
+            probabilities = {STATUS_NAMES[i]: round_list(percent[:, i], 1) for i in range(3)}
+        else:
+            probabilities = None
+        
+        if shape == 'columns':
+            # Parallel arrays; status / color dari level lewat status_names / status_colors
+            sensors = {name: take(values, visible) for name, values in shard.detector_columns.items()}
+            sensors.update(level=np.asarray(levels, dtype=np.int64), probabilities=probabilities or {})
+            response.update(shape='columns', status_names=list(STATUS_NAMES.values()),
+                            status_colors=list(STATUS_COLORS.values()))
+        else:
+            records = shard.detector_records
+            levels = np.asarray(levels).tolist()
+            if probabilities is not None:
+                probabilities = [dict(zip(STATUS_NAMES.values(), row)) for row in zip(*probabilities.values())]
+            else:
+                probabilities = [{}] * len(levels)
+            sensors = [
+                {**records[i], 'level': level, 'status': STATUS_NAMES[level], 'color': STATUS_COLORS[level],
+                 'probabilities': proba}
+                for i, level, proba in zip(visible.tolist(), levels, probabilities)
+            ]
+    return jsonify({**response, 'sensors': sensors})
+
+@app.route('/api/predict/batch', methods=['GET', 'POST'])
+def predict_batch():
+    """
+    Prediksi banyak detector x banyak jam (mis. heatmap satu minggu untuk satu koridor)
+    
+    Parameter (query string atau JSON body): detectors, start + end/horizon atau days,
+    hours, format (json | ndjson | npz). Lihat parse_batch_request.
+    """
+    args = request.get_json(silent=True) if request.method == 'POST' else None
+    args = args if isinstance(args, dict) else request.args.to_dict()
+    shard, error = request_shard('detectors', 'model', 'traffic', city=args.get('city'))
+    if error:
+        return error
+    if shard.detectors_df is None:
+        return jsonify({'error': 'Detector data not available'}), 503
+    snapshot = shard.models
+    if not snapshot.ready:
+        return jsonify({'error': 'Random Forest model not available'}), 503
+    
+    fmt = args.get('format', 'json')
+    if fmt not in BATCH_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(BATCH_FORMATS)}"}), 400
+    try:
+        batch = parse_batch_request(args, shard)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if fmt == 'ndjson':
+        return Response(stream_batch(batch, shard), mimetype='application/x-ndjson')
+    
+    cells = len(batch['detector_ids']) * len(batch['hours'])
+    if cells > BATCH_MAX_CELLS:
+        return jsonify({'error': f'{cells:,} predictions exceed BATCH_MAX_CELLS ({BATCH_MAX_CELLS:,}), '
+                                 'use format=ndjson or a smaller request'}), 413
+    
+    levels, probabilities = predict_batch_block(batch['detector_ids'], batch['road_types'], batch['days'],
+                                                batch['hours'], snapshot, snapshot.cube, snapshot.cube_index,
+                                                shard.historical)
+    if fmt == 'npz':
+        arrays = {
+            'detectors': batch['detector_ids'].astype(str),
+            'day': batch['days'].astype(np.int8),
+            'hour': batch['hours'].astype(np.int8),
+            'level': levels,
+            'probabilities': probabilities
+        }
+        if batch['timestamps'] is not None:
+            arrays['timestamp'] = batch['timestamps'].to_numpy(dtype='datetime64[s]')
+        buffer = io.BytesIO()
+        with stage('serialize'):
+            np.savez(buffer, **arrays)
+        return Response(buffer.getvalue(), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename=predictions.npz'})
+    
+    with stage('format'):
+        response = {
+            'city': shard.city,
+            'detectors': [str(d) for d in batch['detector_ids']],
+            **batch_header(batch),
+            'level': levels.tolist(),
+            'probabilities': probability_columns(probabilities)
+        }
+    return jsonify(response)
 
 @app.route('/api/prophet/predictions')
+@cached()
 def get_prophet_predictions():
     """Get Prophet time series predictions"""
-    if predictions_df is None:
+    shard, error = request_shard('prophet')
+    if error:
+        return error
+    payload = shard.prophet_payload
+    if payload is None:
         return jsonify({'error': 'Prophet predictions not available', 'available': False})
     
     hour = request.args.get('hour', type=int, default=None)
+    try:
+        bbox, zoom = parse_viewport()
+        shape = parse_shape(request.args.get('shape'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    result = []
-    stats = {'Lancar': 0, 'Sedang': 0, 'Macet': 0}
-    
-    for _, row in predictions_df.iterrows():
-        hourly = []
-        for h in range(24):
-            col = f'hour_{h:02d}'
-            if col in row:
-                occ = row[col]
-                cat = categorize_traffic(occ)
-                hourly.append({
-                    'hour': h,
-                    'occupancy': round(occ * 100, 1),
-                    'status': cat['status'],
-                    'color': cat['color']
-                })
-        
-        if hour is not None:
-            col = f'hour_{hour:02d}'
-            if col in row:
-                current_occ = row[col]
-            else:
-                current_occ = row['avg_occupancy']
-        else:
-            current_occ = row['peak_occupancy']
-        
-        cat = categorize_traffic(current_occ)
-        stats[cat['status']] += 1
-        
-        # Handle NaN values
-        road_value = row.get('road', 'Unknown')
-        if pd.isna(road_value):
-            road_value = 'Unknown'
-        
-        result.append({
-            'detid': str(row['detid']),
-            'lat': float(row['lat']),
-            'long': float(row['long']),
-            'road': str(road_value),
-            'prediction_date': str(row['prediction_date']),
-            'avg_occupancy': round(float(row['avg_occupancy']) * 100, 1),
-            'peak_occupancy': round(float(row['peak_occupancy']) * 100, 1),
-            'min_occupancy': round(float(row['min_occupancy']) * 100, 1),
-            'peak_hour': int(row['peak_hour']),
-            'current_status': cat['status'],
-            'current_color': cat['color'],
-            'hourly': hourly
-        })
+    # Pilih kolom status yang sudah dihitung: jam tertentu, avg (jam tidak ada), atau peak
+    if hour is None:
+        levels = payload['peak_levels']
+    else:
+        levels = payload['hour_levels'].get(hour, payload['avg_levels'])
+    grid = payload['grid']
+    with stage('viewport'):
+        visible = grid.query(bbox) if bbox is not None else np.arange(len(levels))
+    levels = levels[visible]
     
-    return jsonify({
+    response = {
         'available': True,
+        'city': shard.city,
         'hour': hour,
-        'prediction_date': predictions_df['prediction_date'].iloc[0] if len(predictions_df) > 0 else None,
-        'sensors': result,
-        'stats': stats,
-        'total': len(result)
-    })
+        'prediction_date': payload['prediction_date'],
+        'stats': level_stats(levels),
+        'total': len(visible)
+    }
+    if use_clusters(zoom):
+        with stage('cluster'):
+            clusters = format_clusters(cluster_points(grid.lat[visible], grid.long[visible], levels, zoom))
+        return jsonify({**response, 'sensors': [], 'clusters': clusters, 'zoom': zoom, 'bbox': bbox})
+    
+    if bbox is not None or zoom is not None:
+        response.update(clusters=[], zoom=zoom, bbox=bbox)
+    if shape == 'columns':
+        with stage('format'):
+            sensors = {name: take(values, visible) for name, values in payload['columns'].items()}
+            sensors['current_level'] = levels
+        return jsonify({**response, 'shape': 'columns', 'sensors': sensors, 'hours': payload['hours'],
+                        'status_names': list(STATUS_NAMES.values()), 'status_colors': list(STATUS_COLORS.values())})
+    
+    records = payload['records']
+    with stage('format'):
+        response['sensors'] = [
+            {**records[i], 'current_status': STATUS_NAMES[level], 'current_color': STATUS_COLORS[level]}
+            for i, level in zip(visible.tolist(), levels.tolist())
+        ]
+    return jsonify(response)
 
 @app.route('/api/clustering/spectral')
+@cached_response(response_cache, spectral_version, max_age=RESPONSE_CACHE_MAX_AGE)
 def get_spectral_clustering():
     """Get spectral clustering results"""
+    shard, error = request_shard('spectral')
+    if error:
+        return error
     try:
-        if traffic_df is None or detectors_df is None:
+        if shard.spectral_inputs is None:
             return jsonify({'error': 'Required data not available'})
+
+        result = get_spectral_result() if shard.city == HOME_CITY else shard_spectral_result(shard)
+        if result is None:
+            if shard.spectral_error:
+                return jsonify({'error': f'Spectral clustering failed: {shard.spectral_error}'})
+            # 202 tidak di-cache; dashboard mencoba lagi setelah Retry-After
+            return jsonify({
+                'status': 'computing',
+                'error': 'Spectral clustering sedang dihitung, coba lagi sebentar'
+            }), 202, {'Retry-After': str(STARTUP_RETRY_AFTER)}
+        labels, meta = result
+        with stage('format'):
+            cluster_by_detid = dict(zip(labels['detid'], labels['cluster']))
+
+            # Merge statistik per sensor (pre-computed saat load) dengan detector info untuk koordinat
+            result_df = shard.sensor_stats.merge(
+                shard.detectors_df[['detid', 'lat', 'long', 'road']], 
+                on='detid', 
+                how='inner'
+            )
+            result_df['cluster'] = result_df['detid'].astype(str).map(cluster_by_detid)
+            result_df = result_df[result_df['cluster'].notna()].copy()
+            result_df['cluster'] = result_df['cluster'].astype(int)
         
-        # Hitung rata-rata occupancy per sensor
-        sensor_stats = traffic_df.groupby('detid')['occ'].agg(['mean', 'std', 'count']).reset_index()
-        sensor_stats.columns = ['detid', 'avg_occ', 'std_occ', 'count']
-        
-        # Merge dengan detector info untuk mendapatkan koordinat
-        result_df = sensor_stats.merge(
-            detectors_df[['detid', 'lat', 'long', 'road']], 
-            on='detid', 
-            how='inner'
-        )
-        
-        # Filter sensor dengan data yang cukup
-        result_df = result_df[result_df['count'] >= 100].copy()
-        
-        # Simple clustering berdasarkan occupancy level (simulasi Spectral Clustering)
-        # Cluster 0: High traffic (>7%), Cluster 1: Medium (3.5-7%), Cluster 2: Low (<3.5%)
-        def assign_cluster(avg_occ):
-            if avg_occ > 0.07:
-                return 0  # Padat
-            elif avg_occ > 0.035:
-                return 1  # Sedang
-            else:
-                return 2  # Lancar
-        
-        result_df['cluster'] = result_df['avg_occ'].apply(assign_cluster)
-        
-        # Format hasil
-        sensors = []
-        for _, row in result_df.iterrows():
-            sensors.append({
-                'detid': row['detid'],
-                'lat': float(row['lat']),
-                'long': float(row['long']),
-                'road': str(row['road']) if pd.notna(row['road']) else 'Unknown',
-                'cluster': int(row['cluster']),
-                'avg_occupancy': round(float(row['avg_occ']) * 100, 2),
-                'std_occupancy': round(float(row['std_occ']) * 100, 2) if pd.notna(row['std_occ']) else 0,
-                'sample_count': int(row['count'])
-            })
-        
-        # Cluster statistics
-        cluster_stats = result_df.groupby('cluster').agg({
-            'detid': 'count',
-            'avg_occ': 'mean'
-        }).reset_index()
+            # Format hasil (per column, bukan per row pandas)
+            std_percent = (result_df['std_occ'].to_numpy(dtype=float) * 100).tolist()
+            sensors = records_from_columns({
+                'detid': result_df['detid'].tolist(),
+                'lat': result_df['lat'].to_numpy(dtype=np.float64),
+                'long': result_df['long'].to_numpy(dtype=np.float64),
+                'road': [str(road) for road in result_df['road'].fillna('Unknown').tolist()],
+                'cluster': result_df['cluster'].to_numpy(dtype=np.int64),
+                'avg_occupancy': round_list(result_df['avg_occ'].to_numpy(dtype=float) * 100, 2),
+                'std_occupancy': [round(std, 2) if std == std else 0 for std in std_percent],
+                'sample_count': result_df['count'].to_numpy(dtype=np.int64)
+            }, len(result_df))
         
-        stats = {}
-        for _, row in cluster_stats.iterrows():
-            stats[int(row['cluster'])] = {
-                'count': int(row['detid']),
-                'avg_occupancy': round(float(row['avg_occ']) * 100, 2)
+            # Cluster statistics
+            cluster_stats = result_df.groupby('cluster').agg(count=('detid', 'count'), avg_occ=('avg_occ', 'mean'))
+            stats = {
+                cluster: {'count': count, 'avg_occupancy': round(avg_occ * 100, 2)}
+                for cluster, count, avg_occ in zip(cluster_stats.index.tolist(), cluster_stats['count'].tolist(),
+                                                   cluster_stats['avg_occ'].astype(float).tolist())
             }
         
         return jsonify({
+            'city': shard.city,
             'sensors': sensors,
             'stats': stats,
             'total': len(sensors),
-            'n_clusters': 3
+            'n_clusters': meta['n_clusters'],
+            'silhouette': meta['silhouette'],
+            'method': meta['method']
         })
-        
     except Exception as e:
         return jsonify({'error': str(e)})
 
 @app.route('/api/clustering/models')
+@cached()
 def get_clustering_models():
     """Get clustering models comparison"""
-    if clustering_comparison is None:
+    shard, error = request_shard('clustering_comparison')
+    if error:
+        return error
+    if shard.clustering_comparison is None:
         return jsonify({'error': 'Clustering comparison not available'})
     
     models = []
-    for _, row in clustering_comparison.iterrows():
+    for _, row in shard.clustering_comparison.iterrows():
         models.append({
             'name': row['Model'],
             'n_clusters': int(row['N_Clusters']) if pd.notna(row.get('N_Clusters')) else None,
@@ -584,19 +1952,140 @@ def get_clustering_models():
 
 @app.route('/api/detectors/list')
 def get_detectors_list():
-    """Get list of detectors for dropdown"""
-    if detectors_df is None:
-        return jsonify([])
-    
-    detectors = []
-    for _, row in detectors_df.iterrows():
-        detectors.append({
-            'detid': row['detid'],
-            'road': row.get('road', 'Unknown'),
-            'fclass': row.get('fclass', 'Unknown')
-        })
+    """
+    Katalog detector untuk dropdown / pencarian (cursor pagination)
+    
+    Parameter: q (detid / nama jalan, prefix untuk 1-2 huruf, substring untuk >= 3),
+    city (default kota utama, 'all' = semua kota), fclass ("primary,trunk"),
+    limit (default 50, maks 500), cursor (next_cursor dari halaman sebelumnya).
+    """
+    loading = component_loading('catalog')
+    if loading:
+        return loading
+    catalog = detector_catalog.get()
+    if catalog is None:
+        return jsonify({'error': 'Detector data not available'})
+    
+    city = request_city()
+    if city == 'all':
+        city = None
+    elif city not in catalog.city_ranges:
+        return jsonify({'error': f'Unknown city: {city}', 'cities': '/api/cities'}), 404
+    try:
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'cursor must be a next_cursor value from a previous page'}), 400
+    limit = min(max(request.args.get('limit', type=int, default=DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    query = request.args.get('q', '').strip() or None
+    fclasses = parse_list(request.args.get('fclass'))
     
-    return jsonify(detectors[:100])
+    with stage('search'):
+        ids, total, next_cursor = catalog.search(query, city, fclasses, cursor, limit)
+    return jsonify({
+        'city': city or 'all',
+        'q': query,
+        'fclass': fclasses,
+        'total': total,
+        'limit': limit,
+        'next_cursor': str(next_cursor) if next_cursor is not None else None,
+        'detectors': catalog.records(ids),
+        'fclasses': catalog.fclass_counts(city)
+    })
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text format (worker yang menerima request)"""
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/system/memory')
+def get_memory_report():
+    """Memory per process (RSS/PSS/USS) untuk worker ini dan semua gunicorn workers"""
+    master_pid = os.environ.get('GUNICORN_MASTER_PID')
+    return jsonify({**memory_report(int(master_pid) if master_pid else None), 'city_shards': city_shards.status(),
+                    'compression': compressor.stats()})
+
+@app.route('/api/cities')
+def get_cities():
+    """Kota yang bisa dipilih dengan ?city= (detectors_public.csv) dan shard yang sedang di-load"""
+    catalog = get_city_catalog()
+    status = city_shards.status()
+    return jsonify({
+        'home': HOME_CITY,
+        'cities': [
+            {
+                'city': city,
+                'sensors': int(row.sensors),
+                'center': [round(float(row.lat), 6), round(float(row.long), 6)],
+                'loaded': city == HOME_CITY or city in status['loaded']
+            }
+            for city, row in catalog.iterrows()
+        ],
+        'shards': status
+    })
+
+@app.route('/api/system/artifacts')
+def get_artifacts_status():
+    """Artifact yang sedang dipakai worker ini dan status hot reload"""
+    snapshot, payload = models, prophet_payload
+    return jsonify({
+        'model': os.path.basename(snapshot.source) if snapshot.source else None,
+        'predictions': os.path.basename(payload['path']) if payload else None,
+        'data_version': DATA_VERSION,
+        'watch_interval': ARTIFACT_WATCH_INTERVAL,
+        **reload_state,
+        'downloads': artifact_manager.status()
+    })
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_readings():
+    """
+    Live readings: JSON list / {"readings": [...]} atau CSV body (header detid,datetime,occ,flow)
+    """
+    # Tanpa INGEST_TOKEN endpoint nonaktif (sama seperti PROFILE_TOKEN untuk profiler)
+    if not INGEST_TOKEN:
+        return jsonify({'error': 'Live ingestion is disabled (set INGEST_TOKEN)'}), 403
+    if request.headers.get('X-Ingest-Token') != INGEST_TOKEN:
+        return jsonify({'error': 'Invalid ingest token'}), 403
+    if request_city() != HOME_CITY:
+        return jsonify({'error': f'Live ingestion is only available for {HOME_CITY}'}), 400
+    loading = component_loading('traffic')
+    if loading:
+        return loading
+    if traffic_aggregates is None:
+        return jsonify({'error': 'Traffic data not available'}), 503
+    
+    try:
+        if request.is_json:
+            payload = request.get_json()
+            readings = payload.get('readings', []) if isinstance(payload, dict) else payload
+            frame = pd.DataFrame(readings)
+        else:
+            frame = pd.read_csv(io.BytesIO(request.get_data()))
+        
+        if INGEST_TAIL_PATH:
+            result = append_to_ingest_log(frame)
+            result['mode'] = 'queued'
+        else:
+            result = apply_readings(frame)
+            result['mode'] = 'applied'
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/ingest/status')
+def get_ingest_status():
+    """Status live ingestion di worker ini"""
+    return jsonify({
+        **ingest_state,
+        'data_version': DATA_VERSION,
+        'detectors': len(hourly_avg_index),
+        'total_records': traffic_aggregates.total_records if traffic_aggregates is not None else 0,
+        'tail_path': INGEST_TAIL_PATH,
+        'cube_ready': models.cube is not None,
+        'cube_slots_ready': cube_slots_ready(models),
+        'rebuild_pending': rebuild_timer is not None and rebuild_timer.is_alive()
+    })
 
 # ============================================================================
 # RUN
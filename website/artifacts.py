@@ -0,0 +1,320 @@
+# ============================================================================
+# ARTIFACT MANAGER - Parallel, resumable, checksummed downloads
+# ============================================================================
+# Artifact besar (model, encoders, marseille_clean.csv) di-download paralel
+# (thread pool) dengan HTTP Range resume (file .part tetap ada jika koneksi
+# putus atau process mati), diverifikasi SHA-256 terhadap manifest, lalu
+# disimpan di content-addressed store (CACHE_DIR/artifacts/sha256/<hash>).
+# File di BASE_PATH adalah hardlink (atau copy) dari store.
+#
+# Dua cara pakai:
+#   - pre-start: `python website/artifacts.py fetch` sebelum gunicorn
+#   - lazy: prefetch() memulai semua download di background, ensure(name)
+#     hanya menunggu artifact yang dibutuhkan saat itu
+#
+# Manifest (artifacts.json di BASE_PATH, atau ARTIFACT_MANIFEST):
+#   {"artifacts": {"marseille_clean.csv": {"url": "https://...", "sha256": "...", "size": 206000000},
+#                  "traffic_model_compact.npz": {"gdrive_id": "1a2B3c...", "sha256": "..."}}}
+# Buat dengan `python website/artifacts.py manifest <files> --url-prefix https://host/path/`.
+# Nama artifact boleh path relatif ke BASE_PATH, mis. "cities/<city>/<city>_clean.csv".
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from data_cache import file_sha256, source_hash
+
+GDRIVE_URL = 'https://drive.usercontent.google.com/download?id={}&export=download&confirm=t'
+BLOCK_SIZE = 1024 * 1024
+
+
+def load_manifest(path, gdrive_ids=None):
+    """
+    Dict name -> spec (url, sha256, size) dari manifest JSON + Google Drive IDs lama
+
+    Args:
+        path: Path artifacts.json (boleh tidak ada)
+        gdrive_ids: Dict name -> (file_id, sha256 atau None) dari env GDRIVE_* (kompatibilitas)
+    """
+    specs = {}
+    for name, (file_id, sha256) in (gdrive_ids or {}).items():
+        if file_id:
+            specs[name] = {'gdrive_id': file_id, 'sha256': sha256 or None}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            specs.update(json.load(f).get('artifacts', {}))
+
+    for name, spec in specs.items():
+        if not spec.get('url') and spec.get('gdrive_id'):
+            spec['url'] = GDRIVE_URL.format(spec['gdrive_id'])
+        if spec.get('sha256'):
+            spec['sha256'] = spec['sha256'].lower()
+    return specs
+
+
+def _looks_like_html(path):
+    """Google Drive mengirim halaman HTML (quota/virus scan) dengan status 200"""
+    with open(path, 'rb') as f:
+        header = f.read(100).lstrip().lower()
+    return header.startswith(b'<!doctype') or header.startswith(b'<html')
+
+
+def download(url, part_path, expected_size=None, timeout=60, progress=None):
+    """
+    Download url ke part_path, lanjut dari ukuran part_path yang sudah ada (HTTP Range)
+
+    Returns:
+        Ukuran file setelah download
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if expected_size is not None and offset > expected_size:
+        offset = 0
+    headers = {'User-Agent': 'marseille-traffic-artifacts/1.0'}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=timeout)
+    except HTTPError as e:
+        # 416: .part sudah lengkap (SHA-256 diperiksa oleh pemanggil)
+        if e.code == 416 and offset and expected_size in (None, offset):
+            return offset
+        raise
+
+    with response:
+        if offset and response.status != 206:
+            offset = 0  # server tidak mendukung Range, mulai ulang
+        length = response.headers.get('Content-Length')
+        if progress:
+            progress(offset, reset=True)
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for block in iter(lambda: response.read(BLOCK_SIZE), b''):
+                f.write(block)
+                if progress:
+                    progress(len(block))
+
+    # Koneksi yang putus di tengah tidak selalu raise: cek ukuran yang diterima
+    size = os.path.getsize(part_path)
+    expected_end = offset + int(length) if length is not None else expected_size
+    if expected_end is not None and size < expected_end:
+        raise ConnectionError(f'connection closed after {size:,} of {expected_end:,} bytes')
+    return size
+
+
+class ArtifactManager:
+    """Download artifact dari manifest secara paralel ke content-addressed store"""
+
+    def __init__(self, specs, dest_dir, store_dir, max_workers=4, retries=4, timeout=60):
+        self.specs = specs
+        self.dest_dir = dest_dir
+        self.store_dir = store_dir
+        self.retries = retries
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artifact')
+        self.futures = {}
+        self.state = {}
+        self.lock = threading.Lock()
+        # Lock files yang sedang dipegang (flock): child hasil fork menutup salinannya
+        self.lock_files = set()
+        # Process hasil fork (gunicorn worker) tidak mewarisi download threads
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """Executor + lock baru di child; download yang belum selesai dimulai ulang saat dibutuhkan"""
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='artifact')
+        self.lock = threading.Lock()
+        # flock milik open file description: salinan fd di child ikut menahan lock parent selamanya
+        for lock_file in list(self.lock_files):
+            lock_file.close()
+        self.lock_files = set()
+        self.futures = {name: future for name, future in self.futures.items() if future.done()}
+        for name, entry in self.state.items():
+            if name not in self.futures:
+                entry['status'] = 'pending'
+
+    def dest_path(self, name):
+        return os.path.join(self.dest_dir, name)
+
+    def store_path(self, sha256):
+        return os.path.join(self.store_dir, 'sha256', sha256[:2], sha256)
+
+    def available(self, name):
+        """Artifact ada di disk atau bisa di-download"""
+        return os.path.exists(self.dest_path(name)) or name in self.specs
+
+    def _set_state(self, name, **values):
+        with self.lock:
+            self.state.setdefault(name, {}).update(values)
+
+    def _progress(self, name):
+        def progress(n, reset=False):
+            with self.lock:
+                entry = self.state[name]
+                entry['bytes'] = n if reset else entry.get('bytes', 0) + n
+        return progress
+
+    def _link(self, source, dest):
+        """Hardlink source -> dest secara atomik (copy jika beda filesystem)"""
+        tmp_path = f'{dest}.{os.getpid()}.{threading.get_ident()}.tmp'
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, dest)
+
+    def _verified(self, path, sha256):
+        """File ada dan (jika manifest punya sha256) isinya cocok"""
+        if not os.path.exists(path):
+            return False
+        if not sha256:
+            return True
+        return source_hash(path, self.store_dir) == sha256
+
+    def fetch(self, name):
+        """Pastikan artifact ada di dest_dir. Returns path, atau None jika tidak tersedia"""
+        dest = self.dest_path(name)
+        spec = self.specs.get(name)
+        if spec is None:
+            # Tidak ada di manifest: pakai file lokal apa adanya
+            self._set_state(name, status='ready' if os.path.exists(dest) else 'missing', source='local')
+            return dest if os.path.exists(dest) else None
+
+        sha256 = spec.get('sha256')
+        os.makedirs(os.path.join(self.store_dir, 'tmp'), exist_ok=True)
+        if self._verified(dest, sha256):
+            self._set_state(name, status='ready', source='local', sha256=sha256)
+            return dest
+
+        # Satu process per artifact (workers tanpa preload berbagi store yang sama)
+        lock_path = os.path.join(self.store_dir, 'tmp', f"{name.replace('/', '_')}.lock")
+        with open(lock_path, 'w') as lock_file:
+            self.lock_files.add(lock_file)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if self._verified(dest, sha256):
+                    self._set_state(name, status='ready', source='local', sha256=sha256)
+                    return dest
+                if os.path.exists(dest):
+                    print(f"⚠ {name}: SHA-256 mismatch, downloading again")
+
+                # Store juga diverifikasi: dest adalah hardlink, jadi tulisan in-place ke dest ikut mengubahnya
+                if sha256 and self._verified(self.store_path(sha256), sha256):
+                    self._link(self.store_path(sha256), dest)
+                    self._set_state(name, status='ready', source='store', sha256=sha256)
+                    return dest
+
+                sha256 = self._download(name, spec)
+                self._link(self.store_path(sha256), dest)
+                self._set_state(name, status='ready')
+            finally:
+                self.lock_files.discard(lock_file)
+        return dest
+
+    def _download(self, name, spec):
+        """Download (dengan retry + resume) ke store, returns sha256"""
+        expected = spec.get('sha256')
+        expected_size = spec.get('size')
+        part_path = os.path.join(self.store_dir, 'tmp', f"{expected or name.replace('/', '_')}.part")
+        self._set_state(name, status='downloading', source='download', total=expected_size, bytes=0)
+        start = time.time()
+
+        for attempt in range(self.retries):
+            try:
+                size = download(spec['url'], part_path, expected_size, self.timeout, self._progress(name))
+                break
+            except (URLError, OSError) as e:
+                if attempt == self.retries - 1:
+                    raise
+                print(f"⚠ {name}: download interrupted ({e}), resuming (attempt {attempt + 2}/{self.retries})")
+                time.sleep(min(2 ** attempt, 30))
+
+        if _looks_like_html(part_path):
+            os.remove(part_path)
+            raise ValueError('received HTML instead of file (check Google Drive sharing / quota)')
+        sha256 = file_sha256(part_path)
+        if expected and sha256 != expected:
+            os.remove(part_path)
+            raise ValueError(f'SHA-256 mismatch: expected {expected[:12]}..., got {sha256[:12]}...')
+
+        store_path = self.store_path(sha256)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        os.replace(part_path, store_path)
+        elapsed = time.time() - start
+        self._set_state(name, sha256=sha256, bytes=size, seconds=round(elapsed, 2))
+        print(f"✓ Downloaded: {name} ({size:,} bytes, {elapsed:.1f}s)")
+        return sha256
+
+    def _run(self, name):
+        try:
+            return self.fetch(name)
+        except Exception as e:
+            self._set_state(name, status='failed', error=str(e))
+            print(f"❌ Failed to download {name}: {e}")
+            return None
+
+    def prefetch(self, names=None):
+        """Mulai download (background) untuk names (default: semua di manifest)"""
+        with self.lock:
+            for name in (self.specs if names is None else names):
+                future = self.futures.get(name)
+                # Artifact yang gagal / belum ada dicoba lagi di panggilan berikutnya
+                if future is None or (future.done() and future.result() is None):
+                    self.state[name] = {'status': 'pending'}
+                    self.futures[name] = self.executor.submit(self._run, name)
+            return dict(self.futures)
+
+    def ensure(self, name, timeout=None):
+        """Tunggu satu artifact (mulai download jika belum). Returns path atau None"""
+        future = self.prefetch([name])[name]
+        return future.result(timeout=timeout)
+
+    def status(self):
+        with self.lock:
+            return {name: dict(entry) for name, entry in self.state.items()}
+
+
+if __name__ == '__main__':
+    # Pre-start step: `python website/artifacts.py fetch && gunicorn ...`
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Fetch / describe deployment artifacts")
+    sub = parser.add_subparsers(dest='command', required=True)
+    fetch_parser = sub.add_parser('fetch', help='Download artifacts in the manifest (parallel, resumable)')
+    fetch_parser.add_argument('names', nargs='*')
+    fetch_parser.add_argument('--manifest', default=os.environ.get('ARTIFACT_MANIFEST', os.path.join(base_path, 'artifacts.json')))
+    fetch_parser.add_argument('--dest', default=base_path)
+    fetch_parser.add_argument('--store', default=os.path.join(os.environ.get('CACHE_DIR', os.path.join(base_path, 'cache')), 'artifacts'))
+    fetch_parser.add_argument('--jobs', type=int, default=int(os.environ.get('ARTIFACT_FETCH_WORKERS', 4)))
+    manifest_parser = sub.add_parser('manifest', help='Print manifest entries (sha256, size) for local files')
+    manifest_parser.add_argument('files', nargs='+')
+    manifest_parser.add_argument('--url-prefix', default='')
+    manifest_parser.add_argument('--root', default=base_path, help='Artifact names are paths relative to this directory')
+    args = parser.parse_args()
+
+    if args.command == 'manifest':
+        artifacts = {}
+        for path in args.files:
+            # Nama = path relatif ke root, sama dengan ArtifactManager (mis. 'cities/<city>/<file>')
+            name = os.path.relpath(os.path.abspath(path), os.path.abspath(args.root)).replace(os.sep, '/')
+            if name.startswith('../'):
+                parser.error(f'{path} is outside --root {args.root}')
+            artifacts[name] = {'url': args.url_prefix + name, 'sha256': file_sha256(path), 'size': os.path.getsize(path)}
+        print(json.dumps({'artifacts': artifacts}, indent=2))
+        sys.exit(0)
+
+    manager = ArtifactManager(load_manifest(args.manifest), args.dest, args.store, max_workers=args.jobs)
+    futures = manager.prefetch(args.names or None)
+    wait(futures.values())
+    failed = [name for name, future in futures.items() if future.result() is None]
+    for name, entry in sorted(manager.status().items()):
+        print(f"  {name}: {entry.get('status')} ({entry.get('source', '-')})")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,203 @@
+# ============================================================================
+# CITY SHARDS - State per kota, di-load lazy dan disimpan di LRU terbatas
+# ============================================================================
+# Satu CityShard = semua yang dibutuhkan endpoint untuk satu citycode:
+# detectors + spatial index, traffic aggregates / historical averages,
+# ModelSnapshot, Prophet payload dan spectral clustering.
+#
+# ShardCache memuat shard di background thread saat pertama diminta (request
+# menunggu paling lama `timeout`, lalu 503 + Retry-After), dan membuang shard
+# yang paling lama tidak dipakai jika:
+#   - jumlah shard > max_entries
+#   - estimasi ukuran semua shard > max_bytes
+#   - memory process (memory_fn, MB) > memory_limit_mb
+# Shard yang sedang dipakai request tetap valid sampai request selesai (request
+# memegang referensi); memory-nya dilepas setelah itu.
+
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MEMORY_CHECK_INTERVAL = 10   # detik antar pemeriksaan memory_fn saat get()
+
+
+class CityShard:
+    """Semua state satu kota yang dipakai endpoints"""
+
+    def __init__(self, city, **fields):
+        self.city = city
+        self.detectors_df = None
+        self.detector_grid = None
+        self.detector_records = []
+        self.detector_columns = {}
+        self.detector_road_types = None
+        self.detector_road_type_index = {}
+        self.traffic_aggregates = None
+        self.sensor_stats = None
+        self.hourly_avg_table = None
+        self.hourly_avg_index = {}
+        self.historical = None
+        self.models = None
+        self.prophet_payload = None
+        self.clustering_comparison = None
+        self.spectral_inputs = None
+        self.spectral_result = None
+        self.spectral_error = None
+        self.spectral_thread = None
+        self.version = None
+        self.sources = []
+        self.loaded_at = None
+        self.seconds = None
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @property
+    def nbytes(self):
+        """Estimasi memory (DataFrames, arrays, model) dalam bytes"""
+        total = 0
+        for value in (self.detectors_df, self.sensor_stats, self.clustering_comparison):
+            if isinstance(value, pd.DataFrame):
+                total += int(value.memory_usage(deep=True).sum())
+        if self.hourly_avg_table is not None:
+            total += self.hourly_avg_table.nbytes
+        if self.traffic_aggregates is not None:
+            total += sum(v.nbytes for v in vars(self.traffic_aggregates).values() if isinstance(v, np.ndarray))
+        if self.historical is not None:
+            total += sum(getattr(self.historical, name).nbytes for name in ('occ_by_hour', 'flow_by_hour', 'detector_occ'))
+        rf_model = self.models.rf_model if self.models is not None else None
+        total += getattr(rf_model, 'nbytes', 0) or 0
+        if self.prophet_payload is not None:
+            total += self.prophet_payload.get('nbytes', 0)
+        return total
+
+
+class ShardCache:
+    """LRU CityShard dengan load lazy (satu loader per kota) dan eviction by size / memory"""
+
+    def __init__(self, loader, max_entries=4, max_bytes=256 * 1024 * 1024, memory_limit_mb=None, memory_fn=None):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_limit_mb = memory_limit_mb
+        self.memory_fn = memory_fn
+        self.shards = OrderedDict()
+        self.loading = {}        # city -> threading.Event
+        self.errors = {}         # city -> pesan error load terakhir
+        self.sizes = {}          # city -> nbytes (dihitung sekali saat insert)
+        self.evictions = 0
+        self.last_memory_check = 0
+        self.lock = threading.Lock()
+
+    def get(self, city, timeout=None):
+        """
+        Shard untuk city; mulai load di background jika belum ada
+
+        Returns:
+            CityShard, atau None jika masih di-load setelah `timeout` detik
+
+        Raises:
+            RuntimeError jika load gagal (load dicoba lagi pada panggilan berikutnya)
+        """
+        with self.lock:
+            shard = self.shards.get(city)
+            if shard is not None:
+                self.shards.move_to_end(city)
+            else:
+                event = self.loading.get(city)
+                if event is None:
+                    event = self.loading[city] = threading.Event()
+                    self.errors.pop(city, None)
+                    threading.Thread(target=self._load, args=(city, event), name=f'city-{city}', daemon=True).start()
+        if shard is not None:
+            self._check_memory()
+            return shard
+
+        if not event.wait(timeout):
+            return None
+        with self.lock:
+            if city in self.errors:
+                raise RuntimeError(self.errors[city])
+            return self.shards.get(city)
+
+    def _load(self, city, event):
+        start = time.time()
+        try:
+            shard = self.loader(city)
+            shard.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+            shard.seconds = round(time.time() - start, 3)
+            size = shard.nbytes
+            with self.lock:
+                self.shards[city] = shard
+                self.sizes[city] = size
+                self._trim(keep=city)
+            print(f"✓ City shard loaded: {city} ({len(shard.detector_records)} sensors, "
+                  f"{size / 1024 / 1024:.1f} MB, {shard.seconds}s)")
+        except Exception as e:
+            with self.lock:
+                self.errors[city] = str(e)
+            print(f"⚠ City shard {city} error: {e}")
+        finally:
+            with self.lock:
+                self.loading.pop(city, None)
+            event.set()
+        self._check_memory(force=True)
+
+    def _evict_oldest(self):
+        city, _ = self.shards.popitem(last=False)
+        self.sizes.pop(city, None)
+        self.evictions += 1
+        print(f"✓ City shard evicted: {city}")
+
+    def _trim(self, keep=None):
+        """Evict LRU sampai jumlah dan total ukuran di bawah batas (dipanggil dengan lock)"""
+        while len(self.shards) > 1 and (len(self.shards) > self.max_entries or
+                                        sum(self.sizes.values()) > self.max_bytes):
+            if next(iter(self.shards)) == keep:
+                self.shards.move_to_end(keep)
+            self._evict_oldest()
+
+    def _check_memory(self, force=False):
+        """Memory pressure: evict LRU (shard terbaru tetap) selama memory process di atas batas"""
+        if not self.memory_limit_mb or self.memory_fn is None:
+            return
+        now = time.time()
+        if not force and now - self.last_memory_check < MEMORY_CHECK_INTERVAL:
+            return
+        self.last_memory_check = now
+        while True:
+            used = self.memory_fn()
+            with self.lock:
+                if used is None or used <= self.memory_limit_mb or len(self.shards) <= 1:
+                    break
+                self._evict_oldest()
+            # Lepas memory shard sebelum diukur lagi
+            gc.collect()
+
+    def peek(self, city):
+        """Shard jika sudah di-load (tanpa load dan tanpa mengubah urutan LRU)"""
+        with self.lock:
+            return self.shards.get(city)
+
+    def evict(self, city):
+        with self.lock:
+            if self.shards.pop(city, None) is not None:
+                self.sizes.pop(city, None)
+                self.evictions += 1
+
+    def status(self):
+        with self.lock:
+            return {
+                'loaded': {city: {'sensors': len(shard.detector_records), 'mb': round(self.sizes[city] / 1024 / 1024, 1),
+                                  'loaded_at': shard.loaded_at, 'seconds': shard.seconds}
+                           for city, shard in self.shards.items()},
+                'loading': sorted(self.loading),
+                'errors': dict(self.errors),
+                'max_entries': self.max_entries,
+                'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+                'memory_limit_mb': self.memory_limit_mb,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,235 @@
+# ============================================================================
+# SPECTRAL CLUSTERING - Sparse k-NN affinity + Lanczos eigensolver
+# ============================================================================
+# Feature per sensor = profil occupancy 7 hari x 24 jam (168 kolom) dari
+# historical averages. Affinity graph k-NN (sparse, O(n*k) memory, bukan dense
+# n x n), normalized affinity D^-1/2 W D^-1/2, eigenvector terbesar via ARPACK
+# (Lanczos), lalu K-Means di embedding (Ng-Jordan-Weiss).
+#
+# Hasil di-persist di CACHE_DIR dengan key dari isi profil + parameter, jadi
+# dihitung sekali (offline: `python clustering.py`, atau background thread di
+# app.py) dan request hanya membaca hasilnya.
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+N_CLUSTERS = 3
+N_NEIGHBORS = 10
+MIN_SAMPLES = 100
+RESULT_PREFIX = 'spectral_clusters_'
+
+
+def clustering_sensors(detector_ids, counts, known):
+    """
+    Sensor yang di-cluster: data cukup (count >= MIN_SAMPLES) dan ada di detectors (punya koordinat)
+
+    Dipakai app.py dan offline run, jadi key (dan file hasil) sama.
+    """
+    return [d for d, count in zip(detector_ids, counts) if count >= MIN_SAMPLES and d in known]
+
+
+def hourly_profiles(hourly_avg_table):
+    """
+    Matrix fitur (n_detectors, 168) dari historical averages (detector x day x hour)
+
+    Slot tanpa data diisi rata-rata detector itu (atau rata-rata global).
+    """
+    profiles = np.asarray(hourly_avg_table, dtype=np.float64).reshape(len(hourly_avg_table), -1)
+    missing = np.isnan(profiles)
+    if missing.all():
+        return np.zeros_like(profiles)
+
+    counts = (~missing).sum(axis=1)
+    sums = np.where(missing, 0.0, profiles).sum(axis=1)
+    detector_mean = np.where(counts > 0, sums / np.maximum(counts, 1), np.nanmean(profiles))
+    return np.where(missing, detector_mean[:, None], profiles)
+
+
+def spectral_embedding(X, n_components, n_neighbors=N_NEIGHBORS, random_state=42):
+    """Top eigenvectors dari normalized k-NN affinity (sparse, ARPACK/Lanczos)"""
+    from scipy.sparse import diags
+    from scipy.sparse.linalg import eigsh
+    from sklearn.neighbors import kneighbors_graph
+
+    n = len(X)
+    k = min(n_neighbors, n - 1)
+    distances = kneighbors_graph(X, k, mode='distance', include_self=False)
+
+    # Gaussian kernel dengan bandwidth = median jarak k-NN
+    sigma = np.median(distances.data) if distances.nnz else 1.0
+    sigma = sigma if sigma > 0 else 1.0
+    affinity = distances.copy()
+    affinity.data = np.exp(-(distances.data ** 2) / (2 * sigma ** 2))
+    affinity = affinity.maximum(affinity.T).tocsr()
+
+    degree = np.asarray(affinity.sum(axis=1)).ravel()
+    inv_sqrt_degree = diags(1.0 / np.sqrt(np.maximum(degree, 1e-12)))
+    normalized = inv_sqrt_degree @ affinity @ inv_sqrt_degree
+
+    if n <= 2 * n_components + 1:
+        # Graph sangat kecil: ARPACK butuh k < n, pakai dense solver
+        _, vectors = np.linalg.eigh(normalized.toarray())
+        vectors = vectors[:, -n_components:]
+    else:
+        v0 = np.random.default_rng(random_state).uniform(-1, 1, n)
+        _, vectors = eigsh(normalized, k=n_components, which='LA', v0=v0)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def spectral_clusters(X, n_clusters=N_CLUSTERS, n_neighbors=N_NEIGHBORS, random_state=42):
+    """Label cluster per baris X (K-Means pada spectral embedding)"""
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    n = len(X)
+    if n <= n_clusters:
+        return np.arange(n)
+
+    X_scaled = StandardScaler().fit_transform(X)
+    embedding = spectral_embedding(X_scaled, n_clusters, n_neighbors=n_neighbors, random_state=random_state)
+    return KMeans(n_clusters=n_clusters, n_init=10, random_state=random_state).fit_predict(embedding)
+
+
+def order_by_occupancy(labels, mean_occ):
+    """Relabel supaya cluster 0 = occupancy tertinggi (Padat), ..., terakhir = terendah (Lancar)"""
+    clusters = np.unique(labels)
+    cluster_mean = np.array([mean_occ[labels == c].mean() for c in clusters])
+    mapping = {c: rank for rank, c in enumerate(clusters[np.argsort(-cluster_mean)])}
+    return np.array([mapping[c] for c in labels])
+
+
+def clustering_key(detector_ids, profiles, n_clusters=N_CLUSTERS, n_neighbors=N_NEIGHBORS):
+    """Key hasil clustering: berubah jika data profil atau parameter berubah"""
+    h = hashlib.sha1()
+    h.update('\n'.join(str(d) for d in detector_ids).encode())
+    h.update(np.ascontiguousarray(profiles, dtype=np.float32).tobytes())
+    h.update(f'{n_clusters}:{n_neighbors}'.encode())
+    return h.hexdigest()[:16]
+
+
+def result_path(cache_dir, key):
+    return os.path.join(cache_dir, f'{RESULT_PREFIX}{key}.csv')
+
+
+def load_result(cache_dir, key):
+    """(labels DataFrame, meta dict) dari cache, atau None"""
+    path = result_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    labels = pd.read_csv(path, dtype={'detid': str})
+    with open(path[:-4] + '.json') as f:
+        meta = json.load(f)
+    return labels, meta
+
+
+def compute_and_save(cache_dir, key, detector_ids, profiles, n_clusters=N_CLUSTERS, n_neighbors=N_NEIGHBORS):
+    """Hitung clustering dan simpan (CSV label + JSON meta), tulis atomik"""
+    from sklearn.metrics import silhouette_score
+
+    start = time.time()
+    labels = spectral_clusters(profiles, n_clusters=n_clusters, n_neighbors=n_neighbors)
+    labels = order_by_occupancy(labels, profiles.mean(axis=1))
+    elapsed = time.time() - start
+
+    silhouette = None
+    if 1 < len(np.unique(labels)) < len(labels):
+        silhouette = float(silhouette_score(profiles, labels))
+
+    meta = {
+        'key': key,
+        'n_clusters': int(len(np.unique(labels))),
+        'n_neighbors': n_neighbors,
+        'n_sensors': len(detector_ids),
+        'silhouette': silhouette,
+        'training_time': round(elapsed, 3),
+        'method': 'Spectral (k-NN affinity, ARPACK)'
+    }
+    result = pd.DataFrame({'detid': [str(d) for d in detector_ids], 'cluster': labels})
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = result_path(cache_dir, key)
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    with open(path[:-4] + '.json' + tmp_suffix, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path[:-4] + '.json' + tmp_suffix, path[:-4] + '.json')
+    # CSV ditulis terakhir: keberadaannya menandakan hasil lengkap
+    result.to_csv(path + tmp_suffix, index=False)
+    os.replace(path + tmp_suffix, path)
+    return result, meta
+
+
+def _lock_is_stale(lock_path, stale_after):
+    """Lock basi jika process pemiliknya sudah mati atau lock terlalu lama"""
+    try:
+        if time.time() - os.path.getmtime(lock_path) > stale_after:
+            return True
+        with open(lock_path) as f:
+            pid = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return False
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def claim_computation(cache_dir, key, stale_after=3600):
+    """Lock file (berisi PID) supaya hanya satu process (worker) yang menghitung key yang sama"""
+    os.makedirs(cache_dir, exist_ok=True)
+    return claim_lock(result_path(cache_dir, key) + '.lock', stale_after)
+
+
+def claim_lock(lock_path, stale_after=3600):
+    """Buat lock file berisi PID -> lock_path, None jika dipegang process lain yang masih hidup"""
+    if _lock_is_stale(lock_path, stale_after):
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(os.getpid()))
+    return lock_path
+
+
+if __name__ == '__main__':
+    # Offline stage: hitung clustering dari marseille_clean.csv dan simpan ke cache
+    from traffic_stats import aggregate_traffic_csv
+
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Compute spectral clustering of sensors (offline)")
+    parser.add_argument('--data', default=os.path.join(base_path, 'marseille_clean.csv'))
+    parser.add_argument('--detectors', default=os.path.join(base_path, 'detectors_public.csv'))
+    parser.add_argument('--city', default='marseille')
+    parser.add_argument('--cache-dir', default=os.environ.get('CACHE_DIR', os.path.join(base_path, 'cache')))
+    parser.add_argument('--clusters', type=int, default=N_CLUSTERS)
+    parser.add_argument('--neighbors', type=int, default=N_NEIGHBORS)
+    args = parser.parse_args()
+
+    aggregates = aggregate_traffic_csv(args.data)
+    detectors = pd.read_csv(args.detectors)
+    known = set(detectors.loc[detectors['citycode'] == args.city, 'detid'])
+    detector_ids = clustering_sensors(aggregates.detector_ids, aggregates.detector_count, known)
+    rows = [aggregates.detector_index[d] for d in detector_ids]
+    profiles = hourly_profiles(aggregates.hourly_avg_table()[rows])
+
+    key = clustering_key(detector_ids, profiles, args.clusters, args.neighbors)
+    _, meta = compute_and_save(args.cache_dir, key, detector_ids, profiles, args.clusters, args.neighbors)
+    print(f"✓ Spectral clustering: {meta['n_sensors']} sensors, {meta['n_clusters']} clusters, "
+          f"silhouette={meta['silhouette']}, {meta['training_time']}s -> {result_path(args.cache_dir, key)}")
@@ -0,0 +1,202 @@
+# ============================================================================
+# CUBE PRECOMPUTE - Prediction cube per slot (day, hour) di process pool
+# ============================================================================
+# Cube (n_rows, 7, 24, 4) ditulis langsung ke file .npy di CACHE_DIR yang di-mmap
+# (MAP_SHARED): semua gunicorn workers membaca file yang sama dari page cache,
+# tanpa copy per worker.
+#
+# Build:
+#   - hanya satu process per version (lock file); process lain attach ke file
+#     partial yang sama dan menunggu
+#   - 168 slot (day, hour) dibagi ke process pool (spawn, bukan fork: process app
+#     sudah menjalankan threads). Encoders dan historical averages di-pickle sekali per
+#     process; compact forest di-mmap ulang dari file-nya (pages dibagi lewat page
+#     cache). Model sklearn (pickle besar) dan cube kecil dihitung di process sendiri.
+#     Setiap process menulis hasilnya langsung ke cube partial, lalu menandai slot
+#     di progress bitmap (file 168 byte)
+#   - urutan mulai dari slot sekarang (posisi default slider jam di dashboard)
+#   - selesai: partial di-rename ke cube final (inode sama, mmap reader tetap valid)
+# Reader memakai slot yang bitmap-nya sudah 1 dan inference biasa untuk sisanya.
+# Build yang terputus dilanjutkan dari bitmap (slot yang sudah selesai tidak dihitung ulang).
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import build_features
+from forest_runtime import CompactForest
+
+DAYS = 7
+HOURS = 24
+CUBE_SLOTS = DAYS * HOURS
+# Detector x slot per task: cukup besar untuk inference vectorized, cukup kecil untuk progress
+TASK_SAMPLES = 4096
+# Di bawah ini (detector x slot) start process pool (~0.5 s per process) lebih mahal dari build-nya
+PARALLEL_MIN_SAMPLES = 200_000
+
+# (job, cube, progress) di setiap pool process (diisi _init_worker)
+_active = None
+
+
+def cube_paths(cache_dir, version):
+    base = os.path.join(cache_dir, f'prediction_cube_{version}')
+    return {
+        'cube': base + '.npy',
+        'partial': base + '.partial.npy',
+        'progress': base + '.progress',
+        'lock': base + '.lock'
+    }
+
+
+def slots_ready(progress, days, hours=None):
+    """True jika semua slot (days, hours) sudah ada di cube; hours None = semua jam; progress None = cube lengkap"""
+    if progress is None:
+        return True
+    if hours is None:
+        return bool(progress.reshape(DAYS, HOURS)[days].all())
+    return bool(progress[np.asarray(days) * HOURS + np.asarray(hours)].all())
+
+
+def slot_order(first_slot=0):
+    """Semua slot, mulai dari first_slot (mis. jam sekarang) lalu berputar"""
+    return [(first_slot + i) % CUBE_SLOTS for i in range(CUBE_SLOTS)]
+
+
+class CubeJob:
+    """Input build satu cube: rows (detector + profil default), encoder, model dan historical averages"""
+
+    def __init__(self, detector_ids, road_types, encoder, rf_model, historical, model_path=None):
+        self.detector_ids = np.asarray(detector_ids, dtype=object)
+        self.road_types = np.asarray(road_types, dtype=object)
+        self.encoder = encoder
+        self.rf_model = rf_model
+        self.historical = historical
+        # File compact forest: pool process me-load model dari sini (mmap) alih-alih pickle
+        self.model_path = model_path if isinstance(rf_model, CompactForest) else None
+
+    @property
+    def n_rows(self):
+        return len(self.detector_ids)
+
+    @property
+    def parallel(self):
+        """Build boleh dibagi ke process pool: model bisa di-mmap ulang dan cube cukup besar"""
+        return self.model_path is not None and self.n_rows * CUBE_SLOTS >= PARALLEL_MIN_SAMPLES
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if self.model_path is not None:
+            state['rf_model'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.rf_model is None and self.model_path is not None:
+            self.rf_model = CompactForest.load(self.model_path)
+
+    def predict(self, slots):
+        """Slots -> block float32 (n_rows, len(slots), 4): [level, p_lancar, p_sedang, p_macet]"""
+        slots = np.asarray(slots, dtype=np.int64)
+        hours = np.tile(slots % HOURS, self.n_rows)
+        detector_ids = np.repeat(self.detector_ids, len(slots))
+        averages = self.historical.lookup(detector_ids, hours) if self.historical is not None else None
+        X = build_features(self.encoder, hours, np.tile(slots // HOURS, self.n_rows), detector_ids,
+                           np.repeat(self.road_types, len(slots)), averages=averages)
+        probabilities = self.rf_model.predict_proba(X)
+        block = np.empty((len(X), 4), dtype=np.float32)
+        block[:, 0] = np.asarray(self.rf_model.classes_)[probabilities.argmax(axis=1)].astype(int)
+        block[:, 1:] = probabilities[:, :3]
+        return block.reshape(self.n_rows, len(slots), 4)
+
+
+def fill_slots(job, cube, progress, slots):
+    """Hitung slots, tulis ke cube, lalu tandai di progress (data dulu, baru bitmap)"""
+    slots = np.asarray(slots, dtype=np.int64)
+    cube[:, slots // HOURS, slots % HOURS] = job.predict(slots)
+    progress[slots] = 1
+    return len(slots)
+
+
+def _init_worker(job, paths):
+    global _active
+    _active = (job, np.load(paths['partial'], mmap_mode='r+'),
+               np.memmap(paths['progress'], dtype=np.uint8, mode='r+', shape=(CUBE_SLOTS,)))
+
+
+def _fill_task(slots):
+    job, cube, progress = _active
+    return fill_slots(job, cube, progress, slots)
+
+
+def create_partial(paths, n_rows):
+    """Cube partial + progress bitmap kosong; yang sudah ada (build terputus) dipakai ulang"""
+    if os.path.exists(paths['partial']) and os.path.exists(paths['progress']):
+        if np.load(paths['partial'], mmap_mode='r').shape == (n_rows, DAYS, HOURS, 4):
+            return False
+    # Progress dulu: reader hanya attach jika partial ada, dan saat itu bitmap (nol) sudah ada
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    with open(paths['progress'] + tmp_suffix, 'wb') as f:
+        f.write(bytes(CUBE_SLOTS))
+    os.replace(paths['progress'] + tmp_suffix, paths['progress'])
+    cube = np.lib.format.open_memmap(paths['partial'] + tmp_suffix, mode='w+', dtype=np.float32,
+                                     shape=(n_rows, DAYS, HOURS, 4))
+    del cube
+    os.replace(paths['partial'] + tmp_suffix, paths['partial'])
+    return True
+
+
+def attach_cube(paths):
+    """
+    Cube read-only (memory-mapped) -> (cube, progress)
+
+    Cube final: (cube, None). Build sedang berjalan: (cube partial, progress bitmap).
+    Belum ada: (None, None).
+    """
+    for _ in range(2):
+        if os.path.exists(paths['cube']):
+            return np.load(paths['cube'], mmap_mode='r'), None
+        try:
+            progress = np.memmap(paths['progress'], dtype=np.uint8, mode='r', shape=(CUBE_SLOTS,))
+            return np.load(paths['partial'], mmap_mode='r'), progress
+        except (FileNotFoundError, ValueError):
+            # Build selesai (partial -> final) di antara dua pemeriksaan, atau file partial baru dibuat
+            continue
+    return None, None
+
+
+def build_cube(paths, job, workers=1, first_slot=0):
+    """
+    Hitung slot yang belum selesai ke cube partial, lalu rename ke cube final
+
+    Caller memegang lock (cube_paths()['lock']) dan sudah memanggil create_partial().
+    Process pool hanya jika workers > 1 dan job.parallel.
+
+    Returns:
+        (jumlah slot yang dihitung, jumlah process yang dipakai)
+    """
+    cube = np.load(paths['partial'], mmap_mode='r+')
+    progress = np.memmap(paths['progress'], dtype=np.uint8, mode='r+', shape=(CUBE_SLOTS,))
+    pending = [slot for slot in slot_order(first_slot) if not progress[slot]]
+    per_task = max(1, min(HOURS, TASK_SAMPLES // max(job.n_rows, 1)))
+    tasks = [pending[i:i + per_task] for i in range(0, len(pending), per_task)]
+    workers = min(workers, len(tasks))
+
+    if workers > 1 and job.parallel:
+        # Spawn: process baru tanpa threads / locks dari app (fork bisa deadlock di locks warisan)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(job, paths)) as pool:
+            for _ in pool.map(_fill_task, tasks):
+                pass
+    else:
+        workers = 1
+        for slots in tasks:
+            fill_slots(job, cube, progress, slots)
+
+    cube.flush()
+    progress.flush()
+    del cube, progress
+    os.replace(paths['partial'], paths['cube'])
+    os.remove(paths['progress'])
+    return len(pending), workers
@@ -0,0 +1,118 @@
+# ============================================================================
+# DERIVED DATA CACHE - Columnar (Feather) artifacts keyed by source files
+# ============================================================================
+# Hasil turunan yang mahal (filter detectors, agregasi traffic) disimpan sebagai
+# Feather di CACHE_DIR. Key = SHA-256 dari isi source file; hash hanya dihitung
+# ulang jika size/mtime file berubah, jadi startup berikutnya cukup stat() +
+# baca Feather. Jika pyarrow tidak terinstall, cache dilewati (build langsung).
+
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+SOURCES_MANIFEST = 'sources.json'
+# sources.json di-update dari beberapa thread (startup components, ArtifactManager)
+_manifest_lock = threading.Lock()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _tmp_path(path):
+    """Nama file sementara unik per process dan thread"""
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _write_json(path, data):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """SHA-256 isi file (streaming)"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_hash(path, cache_dir):
+    """SHA-256 source file, memakai hash tersimpan selama size & mtime tidak berubah"""
+    manifest_path = os.path.join(cache_dir, SOURCES_MANIFEST)
+    manifest = _read_json(manifest_path)
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    entry = manifest.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    sha256 = file_sha256(path)
+    # Baca ulang di dalam lock: entry yang ditulis thread lain sejak pembacaan pertama tidak hilang
+    with _manifest_lock:
+        manifest = _read_json(manifest_path)
+        manifest[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        _write_json(manifest_path, manifest)
+    return sha256
+
+
+def feather_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def cached_frames(cache_dir, name, sources, build):
+    """
+    Load DataFrames turunan dari cache, atau build + simpan jika source berubah
+
+    Args:
+        cache_dir: Direktori cache
+        name: Nama artifact (prefix file)
+        sources: List path source file yang menentukan isi artifact
+        build: Callable tanpa argumen -> dict {frame_name: DataFrame}
+
+    Returns:
+        (frames, from_cache) - dict DataFrame dan apakah dibaca dari cache
+    """
+    if not feather_available():
+        return build(), False
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = hashlib.sha256(';'.join(source_hash(p, cache_dir) for p in sources).encode()).hexdigest()
+    manifest_path = os.path.join(cache_dir, f'{name}.json')
+    manifest = _read_json(manifest_path)
+
+    if manifest.get('key') == key:
+        try:
+            frames = {
+                frame: pd.read_feather(os.path.join(cache_dir, filename))
+                for frame, filename in manifest['frames'].items()
+            }
+            return frames, True
+        except Exception as e:
+            print(f"⚠ Cache {name} unreadable, rebuilding: {e}")
+
+    frames = build()
+    filenames = {}
+    for frame, df in frames.items():
+        filename = f'{name}.{frame}.feather'
+        tmp_path = _tmp_path(os.path.join(cache_dir, filename))
+        df.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, os.path.join(cache_dir, filename))
+        filenames[frame] = filename
+    # Manifest ditulis terakhir: cache hanya valid jika semua frame sudah tersimpan
+    _write_json(manifest_path, {'key': key, 'sources': [os.path.basename(p) for p in sources], 'frames': filenames})
+    return frames, False
@@ -0,0 +1,216 @@
+# ============================================================================
+# DETECTOR CATALOG - Index pencarian detid / nama jalan + cursor pagination
+# ============================================================================
+# Semua detector di detectors_public.csv (semua kota), diurutkan (citycode, detid):
+# posisi di urutan ini adalah id detector dan juga cursor pagination.
+#
+# Index yang dibangun sekali:
+#   - city_ranges: citycode -> range posisi [lo, hi) (kota contiguous)
+#   - fclass_ids: fclass -> posisi (sorted)
+#   - prefix: sorted array term (detid, nama jalan, tiap kata nama jalan) + posisi,
+#     untuk query 1-2 huruf (searchsorted, O(log n)); juga per kota ('city\0term')
+#     supaya query satu kota tidak membaca hasil kota lain
+#   - trigrams: trigram -> posisi (sorted), untuk query >= 3 huruf (substring):
+#     intersect posting lists lalu verifikasi substring pada kandidat
+# Teks dinormalisasi: casefold tanpa aksen ('Canebière' cocok dengan 'canebiere').
+# Biaya query sebanding dengan jumlah kandidat / hasil, bukan jumlah detector.
+
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Karakter terbesar di BMP: batas atas range prefix di searchsorted
+PREFIX_END = '\uffff'
+
+
+def normalize(text):
+    """Casefold tanpa aksen (NFKD): 'Canebière' -> 'canebiere', 'Straße' -> 'strasse'"""
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def in_range(ids, lo, hi):
+    """Bagian array posisi (sorted) dalam [lo, hi)"""
+    return ids[np.searchsorted(ids, lo):np.searchsorted(ids, hi)]
+
+
+def intersect(arrays):
+    """Irisan beberapa array posisi (sorted, unique), mulai dari yang terkecil"""
+    arrays = sorted(arrays, key=len)
+    result = arrays[0]
+    for array in arrays[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, array, assume_unique=True)
+    return result
+
+
+class DetectorCatalog:
+    """Index statis atas DataFrame detectors (detid, road, fclass, citycode, lat, long)"""
+
+    def __init__(self, df):
+        def fill(name):
+            return (df[name] if name in df.columns else pd.Series('Unknown', index=df.index)).fillna('Unknown')
+        frame = pd.DataFrame({
+            'detid': df['detid'].astype(str),
+            'road': fill('road').astype(str),
+            'fclass': fill('fclass').astype(str),
+            'city': fill('citycode').astype(str).str.lower(),
+            'lat': df['lat'].astype(float),
+            'long': df['long'].astype(float)
+        }).sort_values(['city', 'detid'], kind='stable')
+        self.detid = frame['detid'].to_numpy(dtype=object)
+        self.road = frame['road'].to_numpy(dtype=object)
+        self.fclass = frame['fclass'].to_numpy(dtype=object)
+        self.city = frame['city'].to_numpy(dtype=object)
+        self.lat = frame['lat'].to_numpy()
+        self.long = frame['long'].to_numpy()
+
+        # Kota contiguous karena sort (city, detid)
+        cities, starts = np.unique(self.city, return_index=True)
+        ends = list(starts[1:]) + [len(self.city)]
+        self.city_ranges = {city: (int(lo), int(hi)) for city, lo, hi in zip(cities, starts, ends)}
+        self.fclass_ids = {fclass: np.flatnonzero(self.fclass == fclass) for fclass in np.unique(self.fclass)}
+
+        self.text = [f'{normalize(detid)}\n{normalize(road)}' for detid, road in zip(self.detid, self.road)]
+        terms, term_ids = [], []
+        postings = {}
+        for i, text in enumerate(self.text):
+            detid, road = text.split('\n')
+            for term in {detid, road, *road.split()}:
+                terms.append(term)
+                term_ids.append(i)
+            for gram in trigrams(detid) | trigrams(road):
+                postings.setdefault(gram, []).append(i)
+        terms = np.asarray(terms, dtype=object)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(terms, kind='stable')
+        self.prefix_terms, self.prefix_ids = terms[order], term_ids[order]
+        city_terms = np.asarray([f'{city}\0{term}' for city, term in zip(self.city[term_ids], terms)], dtype=object)
+        order = np.argsort(city_terms, kind='stable')
+        self.city_prefix_terms, self.city_prefix_ids = city_terms[order], term_ids[order]
+        self.trigrams = {gram: np.asarray(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.detid)
+
+    def cities(self):
+        return sorted(self.city_ranges)
+
+    def range(self, city=None):
+        """Range posisi [lo, hi) satu kota (None = semua)"""
+        return self.city_ranges.get(city, (0, 0)) if city else (0, len(self))
+
+    def fclass_counts(self, city=None):
+        """{fclass: jumlah detector} (untuk filter), satu kota atau semua"""
+        lo, hi = self.range(city)
+        counts = {}
+        for fclass, ids in self.fclass_ids.items():
+            n = len(in_range(ids, lo, hi))
+            if n:
+                counts[fclass] = n
+        return counts
+
+    def match(self, query, city=None):
+        """Posisi detector (sorted) yang detid / nama jalannya cocok dengan query, satu kota atau semua"""
+        query = normalize(query).strip()
+        if len(query) < 3:
+            # Prefix detid, nama jalan atau kata di nama jalan
+            if city:
+                terms, ids, key = self.city_prefix_terms, self.city_prefix_ids, f'{city}\0{query}'
+            else:
+                terms, ids, key = self.prefix_terms, self.prefix_ids, query
+            start = np.searchsorted(terms, key, side='left')
+            end = np.searchsorted(terms, key + PREFIX_END, side='left')
+            return np.unique(ids[start:end])
+        lo, hi = self.range(city)
+        grams = trigrams(query)
+        if any(gram not in self.trigrams for gram in grams):
+            return np.empty(0, dtype=np.int64)
+        candidates = intersect([in_range(self.trigrams[gram], lo, hi) for gram in grams])
+        return np.asarray([i for i in candidates.tolist() if query in self.text[i]], dtype=np.int64)
+
+    def search(self, query=None, city=None, fclasses=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Satu halaman hasil pencarian
+
+        Args:
+            query: substring detid / nama jalan (prefix untuk 1-2 huruf), None = semua
+            city: citycode, None = semua kota
+            fclasses: list fclass, None = semua
+            cursor: next_cursor dari halaman sebelumnya (None = halaman pertama)
+            limit: jumlah detector per halaman
+
+        Returns:
+            (posisi detector di halaman ini, total hasil, next_cursor atau None)
+        """
+        lo, hi = self.range(city)
+        start = lo if cursor is None else max(lo, cursor + 1)
+
+        sets = []
+        if fclasses:
+            # Setiap detector punya satu fclass: posting lists disjoint, cukup sort
+            ids = [in_range(self.fclass_ids[f], lo, hi) for f in set(fclasses) if f in self.fclass_ids]
+            sets.append(np.sort(np.concatenate(ids)) if ids else np.empty(0, dtype=np.int64))
+        if query:
+            sets.append(self.match(query, city))
+
+        if not sets:
+            # Tanpa filter: range posisi, tidak perlu materialisasi semua id
+            page = np.arange(start, min(start + limit, hi))
+            total = hi - lo
+            more = start + limit < hi
+        else:
+            ids = intersect(sets)
+            total = len(ids)
+            offset = np.searchsorted(ids, start)
+            page = ids[offset:offset + limit]
+            more = offset + limit < len(ids)
+        next_cursor = int(page[-1]) if more and len(page) else None
+        return page, total, next_cursor
+
+    def records(self, ids):
+        """Record ringan per detector"""
+        return [
+            {'detid': detid, 'road': road, 'fclass': fclass, 'city': city,
+             'lat': round(lat, 6), 'long': round(long, 6)}
+            for detid, road, fclass, city, lat, long in zip(
+                self.detid[ids].tolist(), self.road[ids].tolist(), self.fclass[ids].tolist(),
+                self.city[ids].tolist(), self.lat[ids].tolist(), self.long[ids].tolist())
+        ]
+
+
+def read_catalog(path):
+    return DetectorCatalog(pd.read_csv(path))
+
+
+class CatalogLoader:
+    """DetectorCatalog dari file CSV, dibangun sekali dan dibangun ulang jika file berubah"""
+
+    def __init__(self, path, signature, build=read_catalog):
+        self.path = path
+        self.signature = signature
+        self.build = build
+        self.catalog = None
+        self.loaded_signature = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """DetectorCatalog saat ini, None jika file tidak ada"""
+        signature = self.signature(self.path)
+        if signature is None:
+            return None
+        if self.catalog is None or signature != self.loaded_signature:
+            with self.lock:
+                if self.catalog is None or signature != self.loaded_signature:
+                    self.catalog = self.build(self.path)
+                    self.loaded_signature = signature
+        return self.catalog
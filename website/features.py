@@ -0,0 +1,324 @@
+# ============================================================================
+# FEATURE ENGINEERING - Dipakai bersama oleh serving (app.py) dan training
+# (optimize_model.py), supaya definisi feature tidak bisa berbeda (drift)
+# ============================================================================
+# Input: array (hour, day_of_week, detector, road_type) + historical averages.
+# Output: matrix float32 C-contiguous dalam urutan encoders['feature_columns'].
+#   - LabelEncoder -> dict lookup (dihitung sekali per encoders), transform via
+#     pd.factorize: lookup hanya untuk nilai unik, bukan per baris
+#   - sin/cos dan time_period sebagai table 24 jam / 7 hari
+#   - avg_occ_per_hour / avg_flow_per_hour per (detector, hour) dan
+#     detector_avg_occ per detector, sama seperti groupby di notebook training
+# float32 cukup: sklearn dan CompactForest membandingkan threshold dalam float32.
+
+import numpy as np
+import pandas as pd
+
+# Naikkan jika definisi feature berubah (bagian dari version key prediction cube)
+FEATURES_VERSION = 2
+
+DEFAULT_FEATURE_COLUMNS = [
+    'hour', 'hour_sin', 'hour_cos', 'day_of_week', 'day_sin', 'day_cos', 'is_weekend', 'is_rush_hour',
+    'time_period_encoded', 'interval', 'road_type_encoded', 'detector_encoded',
+    'avg_flow_per_hour', 'avg_occ_per_hour', 'detector_avg_occ'
+]
+# Interval pengukuran (detik) dataset Marseille; training memakai kolom 'interval' dari CSV
+DEFAULT_INTERVAL = 180
+# Default jika detector / jam tidak punya historical data
+DEFAULT_AVG_OCC = 0.05
+DEFAULT_AVG_FLOW = 100.0
+
+HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+DAY_SIN = np.sin(2 * np.pi * np.arange(7) / 7)
+DAY_COS = np.cos(2 * np.pi * np.arange(7) / 7)
+
+
+def get_time_period(hour):
+    """Get time period from hour (sama dengan notebook training)"""
+    if 0 <= hour < 6:
+        return 'Night'
+    elif 6 <= hour < 9:
+        return 'Morning Rush'
+    elif 9 <= hour < 12:
+        return 'Late Morning'
+    elif 12 <= hour < 14:
+        return 'Lunch'
+    elif 14 <= hour < 17:
+        return 'Afternoon'
+    elif 17 <= hour < 20:
+        return 'Evening Rush'
+    else:
+        return 'Evening'
+
+
+def _cyclic(table, fn, values):
+    """table[values] untuk nilai dalam periode, fn(2*pi*value/period) langsung untuk sisanya"""
+    period = len(table)
+    inside = (values >= 0) & (values < period)
+    if inside.all():
+        return table[values]
+    return np.where(inside, table[np.where(inside, values, 0)], fn(2 * np.pi * values / period))
+
+
+class FeatureEncoder:
+    """Lookup tables dari encoders training (LabelEncoder -> dict, time_period per jam)"""
+
+    def __init__(self, encoders):
+        encoders = encoders or {}
+        self.feature_columns = list(encoders.get('feature_columns', DEFAULT_FEATURE_COLUMNS))
+        self.lookups = {}
+        for name in ('road_type', 'detector', 'time_period'):
+            try:
+                classes = encoders[name].classes_
+            except Exception:
+                classes = []
+            self.lookups[name] = {label: i for i, label in enumerate(classes)}
+        # Index 24 = jam di luar 0-23 (get_time_period -> 'Evening')
+        self.time_period_codes = self.encode('time_period', [get_time_period(h) for h in range(25)])
+
+    def encode(self, name, values):
+        """Vectorized LabelEncoder transform (label tidak dikenal / None -> 0)"""
+        lookup = self.lookups.get(name, {})
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+        mapped = np.fromiter((lookup.get(v, 0) for v in uniques), dtype=np.int64, count=len(uniques))
+        return np.where(codes >= 0, mapped[np.maximum(codes, 0)] if len(mapped) else 0, 0)
+
+    def time_period(self, hours):
+        return self.time_period_codes[np.where((hours >= 0) & (hours < 24), hours, 24)]
+
+
+class HistoricalFeatures:
+    """
+    Historical averages per detector seperti saat training:
+    occ/flow per (detector, hour) atas semua hari, dan occ per detector
+    """
+
+    def __init__(self, detector_index, occ_by_hour, flow_by_hour, detector_occ):
+        self.detector_index = detector_index
+        self.occ_by_hour = occ_by_hour
+        self.flow_by_hour = flow_by_hour
+        self.detector_occ = detector_occ
+
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        """Dari TrafficAggregates (accumulator per detector x day x hour)"""
+        def by_hour(count, mean):
+            total = count.sum(axis=1)
+            sums = (count * mean).sum(axis=1)
+            return np.divide(sums, total, out=np.full(total.shape, np.nan), where=total > 0)
+
+        detector_occ = np.where(aggregates.detector_count > 0, aggregates.detector_mean, np.nan)
+        return cls(dict(aggregates.detector_index),
+                   by_hour(aggregates.hourly_count, aggregates.hourly_mean),
+                   by_hour(aggregates.hourly_flow_count, aggregates.hourly_flow_mean),
+                   detector_occ)
+
+    @classmethod
+    def empty(cls):
+        """Tanpa historical data: semua lookup NaN (-> default averages)"""
+        return cls({}, np.empty((0, 24)), np.empty((0, 24)), np.empty(0))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Dari DataFrame readings (detid, hour, occ, flow), untuk training / holdout"""
+        detector_ids, codes = np.unique(df['detid'].astype(str).to_numpy(), return_inverse=True)
+        hours = df['hour'].to_numpy(dtype=np.int64)
+        keys = codes * 24 + hours
+        size = len(detector_ids) * 24
+
+        def mean_by(keys, values, size):
+            valid = ~np.isnan(values)
+            count = np.bincount(keys[valid], minlength=size)
+            sums = np.bincount(keys[valid], weights=values[valid], minlength=size)
+            return np.divide(sums, count, out=np.full(size, np.nan), where=count > 0)
+
+        occ = df['occ'].to_numpy(dtype=np.float64)
+        flow = df['flow'].to_numpy(dtype=np.float64)
+        return cls({d: i for i, d in enumerate(detector_ids)},
+                   mean_by(keys, occ, size).reshape(-1, 24),
+                   mean_by(keys, flow, size).reshape(-1, 24),
+                   mean_by(codes, occ, len(detector_ids)))
+
+    def lookup(self, detector_ids, hours):
+        """(avg_occ_per_hour, avg_flow_per_hour, detector_avg_occ), NaN jika tidak ada data"""
+        n = len(hours)
+        codes, uniques = pd.factorize(np.asarray(detector_ids, dtype=object))
+        unique_rows = np.fromiter((self.detector_index.get(d, -1) for d in uniques), dtype=np.int64, count=len(uniques))
+        rows = np.where(codes >= 0, unique_rows[np.maximum(codes, 0)] if len(unique_rows) else -1, -1)
+        valid = (rows >= 0) & (rows < len(self.detector_occ)) & (hours >= 0) & (hours < 24)
+
+        occ = np.full(n, np.nan)
+        flow = np.full(n, np.nan)
+        detector_occ = np.full(n, np.nan)
+        occ[valid] = self.occ_by_hour[rows[valid], hours[valid]]
+        flow[valid] = self.flow_by_hour[rows[valid], hours[valid]]
+        detector_occ[valid] = self.detector_occ[rows[valid]]
+        return occ, flow, detector_occ
+
+
+def build_features(encoder, hours, days, detector_ids, road_types, historical=None, interval=DEFAULT_INTERVAL,
+                   fill_missing=True, averages=None):
+    """
+    Feature matrix float32 (n_samples, n_features) dalam urutan encoder.feature_columns
+
+    Args:
+        encoder: FeatureEncoder
+        hours, days, detector_ids, road_types: array dengan panjang sama
+        historical: HistoricalFeatures (None -> default averages)
+        interval: Scalar atau array kolom 'interval'
+        fill_missing: Historical average yang tidak ada -> DEFAULT_AVG_*; False = tetap NaN
+            (training mengisi NaN dengan median kolom)
+        averages: Hasil historical.lookup() yang sudah dihitung (mis. untuk timing terpisah),
+            menggantikan historical
+
+    Returns:
+        np.ndarray float32 C-contiguous; kolom yang tidak dikenal bernilai 0
+    """
+    hours = np.asarray(hours, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    n = len(hours)
+    if averages is not None:
+        avg_occ, avg_flow, detector_occ = averages
+    elif historical is not None:
+        avg_occ, avg_flow, detector_occ = historical.lookup(detector_ids, hours)
+    else:
+        avg_occ = avg_flow = detector_occ = np.full(n, np.nan)
+    if fill_missing:
+        avg_occ = np.where(np.isnan(avg_occ), DEFAULT_AVG_OCC, avg_occ)
+        avg_flow = np.where(np.isnan(avg_flow), DEFAULT_AVG_FLOW, avg_flow)
+        detector_occ = np.where(np.isnan(detector_occ), DEFAULT_AVG_OCC, detector_occ)
+
+    columns = {
+        'hour': lambda: hours,
+        'hour_sin': lambda: _cyclic(HOUR_SIN, np.sin, hours),
+        'hour_cos': lambda: _cyclic(HOUR_COS, np.cos, hours),
+        'day_of_week': lambda: days,
+        'day_sin': lambda: _cyclic(DAY_SIN, np.sin, days),
+        'day_cos': lambda: _cyclic(DAY_COS, np.cos, days),
+        'is_weekend': lambda: days >= 5,
+        'is_rush_hour': lambda: (days < 5) & (((hours >= 7) & (hours <= 9)) | ((hours >= 17) & (hours <= 19))),
+        'time_period_encoded': lambda: encoder.time_period(hours),
+        'interval': lambda: interval,
+        'road_type_encoded': lambda: encoder.encode('road_type', road_types),
+        'detector_encoded': lambda: encoder.encode('detector', detector_ids),
+        'avg_flow_per_hour': lambda: avg_flow,
+        'avg_occ_per_hour': lambda: avg_occ,
+        'detector_avg_occ': lambda: detector_occ
+    }
+
+    X = np.zeros((n, len(encoder.feature_columns)), dtype=np.float32)
+    for i, column in enumerate(encoder.feature_columns):
+        if column in columns:
+            X[:, i] = columns[column]()
+    return X
+
+
+# ============================================================================
+# MICROBENCHMARK - vectorized vs jalur per-row lama (predict_with_rf)
+# ============================================================================
+
+def legacy_row_features(encoders, hour, day_of_week, detector_id, road_type, avg_occ=DEFAULT_AVG_OCC):
+    """Feature per baris seperti predict_with_rf lama (hanya untuk benchmark / pembanding)"""
+    is_weekend = 1 if day_of_week >= 5 else 0
+    is_rush = 1 if (day_of_week < 5 and ((7 <= hour <= 9) or (17 <= hour <= 19))) else 0
+
+    encoded = {}
+    for name, value in (('detector', detector_id), ('road_type', road_type), ('time_period', get_time_period(hour))):
+        try:
+            encoded[name] = encoders[name].transform([value])[0]
+        except Exception:
+            encoded[name] = 0
+
+    features = {
+        'hour': hour,
+        'hour_sin': np.sin(2 * np.pi * hour / 24),
+        'hour_cos': np.cos(2 * np.pi * hour / 24),
+        'day_of_week': day_of_week,
+        'day_sin': np.sin(2 * np.pi * day_of_week / 7),
+        'day_cos': np.cos(2 * np.pi * day_of_week / 7),
+        'is_weekend': is_weekend,
+        'is_rush_hour': is_rush,
+        'time_period_encoded': encoded['time_period'],
+        'interval': DEFAULT_INTERVAL,
+        'road_type_encoded': encoded['road_type'],
+        'detector_encoded': encoded['detector'],
+        'avg_flow_per_hour': DEFAULT_AVG_FLOW,
+        'avg_occ_per_hour': avg_occ,
+        'detector_avg_occ': avg_occ
+    }
+    feature_columns = encoders.get('feature_columns', list(features.keys()))
+    feature_df = pd.DataFrame([features])
+    for col in feature_columns:
+        if col not in feature_df.columns:
+            feature_df[col] = 0
+    return feature_df[feature_columns]
+
+
+def synthetic_encoders(n_detectors=500):
+    """Encoders palsu (LabelEncoder) jika model_encoders_optimized.pkl tidak ada"""
+    from sklearn.preprocessing import LabelEncoder
+    encoders = {'feature_columns': list(DEFAULT_FEATURE_COLUMNS)}
+    labels = {
+        'detector': [f'DET{i:05d}' for i in range(n_detectors)],
+        'road_type': ['motorway', 'primary', 'secondary', 'tertiary', 'trunk'],
+        'time_period': sorted({get_time_period(h) for h in range(24)})
+    }
+    for name, values in labels.items():
+        encoders[name] = LabelEncoder().fit(values)
+    return encoders
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import time
+
+    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Benchmark vectorized features vs per-row path")
+    parser.add_argument('--encoders', default=os.path.join(base_path, 'model_encoders_optimized.pkl'))
+    parser.add_argument('--samples', type=int, default=24 * 500)
+    parser.add_argument('--legacy-samples', type=int, default=2000,
+                        help="Jalur per-row lambat: diukur pada subset lalu diekstrapolasi")
+    args = parser.parse_args()
+
+    if os.path.exists(args.encoders):
+        import joblib
+        encoders = joblib.load(args.encoders)
+        print(f"✓ Encoders: {args.encoders}")
+    else:
+        encoders = synthetic_encoders()
+        print(f"⚠ {args.encoders} not found, using synthetic encoders")
+
+    rng = np.random.default_rng(42)
+    detectors = np.asarray(encoders['detector'].classes_, dtype=object)
+    road_types = np.asarray(encoders['road_type'].classes_, dtype=object)
+    hours = rng.integers(0, 24, args.samples)
+    days = rng.integers(0, 7, args.samples)
+    detector_ids = detectors[rng.integers(0, len(detectors), args.samples)]
+    # Sebagian label tidak dikenal (fallback ke 0, seperti except di jalur lama)
+    detector_ids[::50] = 'UNKNOWN'
+    road = road_types[rng.integers(0, len(road_types), args.samples)]
+
+    start = time.perf_counter()
+    encoder = FeatureEncoder(encoders)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    X = build_features(encoder, hours, days, detector_ids, road)
+    vectorized = time.perf_counter() - start
+
+    n_legacy = min(args.legacy_samples, args.samples)
+    start = time.perf_counter()
+    legacy = np.vstack([legacy_row_features(encoders, int(hours[i]), int(days[i]), detector_ids[i], road[i]).to_numpy(dtype=np.float64)
+                        for i in range(n_legacy)])
+    legacy_time = (time.perf_counter() - start) * args.samples / n_legacy
+
+    max_diff = float(np.abs(X[:n_legacy].astype(np.float64) - legacy.astype(np.float32)).max())
+    print(f"\n📊 {args.samples:,} rows x {X.shape[1]} features")
+    print(f"   Per-row (legacy):   {legacy_time * 1000:10.1f} ms  ({legacy_time / args.samples * 1e6:.1f} µs/row, from {n_legacy:,} rows)")
+    print(f"   Vectorized:         {vectorized * 1000:10.1f} ms  ({vectorized / args.samples * 1e6:.3f} µs/row, setup {setup * 1000:.1f} ms)")
+    print(f"   Speedup:            {legacy_time / vectorized:10.0f}x")
+    print(f"   Max |diff| vs legacy: {max_diff:.2e}")
+    if max_diff > 0:
+        raise SystemExit("❌ Vectorized features differ from per-row path")
+    print("✅ Identical features (float32)")
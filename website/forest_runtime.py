@@ -0,0 +1,175 @@
+# ============================================================================
+# COMPACT FOREST RUNTIME - Flat-array Random Forest + NumPy inference
+# ============================================================================
+# Format (.npz, uncompressed supaya bisa di-memory-map):
+#   feature   int16   (n_nodes,)   feature index, -1 untuk leaf
+#   threshold float32 (n_nodes,)   split threshold (dibulatkan ke bawah ke float32)
+#   children  int32   (n_nodes, 2) [kiri, kanan]; untuk leaf: [row di `value`, -1]
+#   value     float32 (n_leaves, n_classes)  probabilitas kelas per leaf
+#   roots     int32   (n_trees,)   node index root setiap tree
+#   classes   int64   (n_classes,)
+#   n_features int64  (1,)
+# Semua tree disambung dalam satu set array dengan global node index.
+
+import struct
+import zipfile
+
+import numpy as np
+
+# Sample per batch saat traversal (membatasi memory sementara)
+TRAVERSAL_BATCH = 16384
+
+
+def _float32_floor(values):
+    """Bulatkan float64 ke float32 terbesar yang <= value (X float32 <= t tetap sama)"""
+    rounded = values.astype(np.float32)
+    too_big = rounded.astype(np.float64) > values
+    rounded[too_big] = np.nextafter(rounded[too_big], np.float32(-np.inf))
+    return rounded
+
+
+def compact_arrays_from_sklearn(rf_model):
+    """Konversi sklearn RandomForestClassifier ke dict flat arrays (lihat format di atas)"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    node_offset = 0
+    leaf_offset = 0
+
+    for estimator in rf_model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+
+        leaf_rows = np.full(n_nodes, -1, dtype=np.int64)
+        leaf_rows[is_leaf] = leaf_offset + np.arange(is_leaf.sum())
+
+        leaf_value = tree.value[is_leaf, 0, :]
+        leaf_value = leaf_value / leaf_value.sum(axis=1, keepdims=True)
+
+        features.append(np.where(is_leaf, -1, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, leaf_rows, tree.children_left + node_offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + node_offset))
+        values.append(leaf_value)
+        roots.append(node_offset)
+
+        node_offset += n_nodes
+        leaf_offset += int(is_leaf.sum())
+
+    n_features = rf_model.n_features_in_
+    if n_features >= np.iinfo(np.int16).max:
+        raise ValueError(f"Too many features for int16 index: {n_features}")
+    if node_offset >= np.iinfo(np.int32).max:
+        raise ValueError(f"Too many nodes for int32 index: {node_offset}")
+
+    return {
+        'feature': np.concatenate(features).astype(np.int16),
+        'threshold': _float32_floor(np.concatenate(thresholds)),
+        'children': np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).astype(np.int32),
+        'value': np.concatenate(values).astype(np.float32),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'classes': np.asarray(rf_model.classes_, dtype=np.int64),
+        'n_features': np.asarray([n_features], dtype=np.int64)
+    }
+
+
+def export_compact_forest(rf_model, output_path):
+    """Simpan sklearn forest sebagai compact .npz (uncompressed, mmap-able)"""
+    arrays = compact_arrays_from_sklearn(rf_model)
+    with open(output_path, 'wb') as f:
+        np.savez(f, **arrays)
+    return arrays
+
+
+def _load_npz_mmap(path):
+    """Memory-map setiap array di .npz uncompressed (np.load tidak mendukung mmap untuk npz)"""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed, cannot memory-map")
+            # Local file header: 30 bytes + nama file + extra field, lalu data .npy
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+
+class CompactForest:
+    """Random Forest inference dari flat arrays, API kompatibel (predict / predict_proba)"""
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.value = arrays['value']
+        self.roots = np.asarray(arrays['roots'])
+        self.classes_ = np.asarray(arrays['classes'])
+        self.n_features_in_ = int(arrays['n_features'][0])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load compact forest; mmap=True berbagi pages antar process (gunicorn workers)"""
+        if mmap:
+            try:
+                return cls(_load_npz_mmap(path))
+            except ValueError:
+                pass
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def _leaf_rows(self, X):
+        """Traverse semua tree untuk semua sample sekaligus -> leaf row (n_samples, n_trees)"""
+        n_samples, n_features = X.shape
+        n_trees = len(self.roots)
+        X_flat = X.ravel()
+        nodes = np.tile(self.roots.astype(np.intp), n_samples)
+        offsets = np.repeat(np.arange(n_samples, dtype=np.intp) * n_features, n_trees)
+
+        # Hanya (sample, tree) yang belum sampai leaf yang diproses di setiap level
+        active = np.arange(len(nodes))
+        while len(active):
+            current = nodes[active]
+            feature = self.feature[current]
+            internal = feature >= 0
+            if not internal.all():
+                active, current, feature = active[internal], current[internal], feature[internal]
+                if not len(active):
+                    break
+            go_right = X_flat[offsets[active] + feature] > self.threshold[current]
+            nodes[active] = self.children[current, go_right.view(np.int8)]
+
+        return self.children[nodes, 0].reshape(n_samples, n_trees)
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected X with {self.n_features_in_} features, got shape {X.shape}")
+
+        proba = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), TRAVERSAL_BATCH):
+            batch = X[start:start + TRAVERSAL_BATCH]
+            leaves = self._leaf_rows(batch)
+            proba[start:start + len(batch)] = self.value[leaves].sum(axis=1, dtype=np.float64)
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
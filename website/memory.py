@@ -0,0 +1,76 @@
+# ============================================================================
+# MEMORY REPORT - RSS / PSS / USS per process (Linux /proc)
+# ============================================================================
+# RSS menghitung shared pages di setiap worker, jadi tidak berguna untuk melihat
+# efek copy-on-write. PSS membagi shared pages secara proporsional dan USS hanya
+# menghitung private pages: total PSS semua worker = memory sebenarnya.
+
+import os
+import resource
+
+
+def _read_smaps_rollup(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def process_memory(pid='self'):
+    """Memory satu process dalam MB: rss, pss, uss (private) dan shared"""
+    try:
+        kb = _read_smaps_rollup(pid)
+        private = kb.get('Private_Clean', 0) + kb.get('Private_Dirty', 0)
+        shared = kb.get('Shared_Clean', 0) + kb.get('Shared_Dirty', 0)
+        return {
+            'pid': os.getpid() if pid == 'self' else int(pid),
+            'rss_mb': round(kb.get('Rss', 0) / 1024, 1),
+            'pss_mb': round(kb.get('Pss', 0) / 1024, 1),
+            'uss_mb': round(private / 1024, 1),
+            'shared_mb': round(shared / 1024, 1)
+        }
+    except (OSError, ValueError):
+        # Non-Linux: hanya peak RSS process sendiri yang tersedia
+        if pid != 'self':
+            return None
+        return {
+            'pid': os.getpid(),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        }
+
+
+def child_pids(parent_pid):
+    """PID semua child process (mis. gunicorn workers dari master)"""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Field ke-4 adalah ppid; nama process (field 2) bisa mengandung spasi
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == parent_pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def memory_report(master_pid=None):
+    """Report memory untuk process ini, dan master + semua worker jika master_pid diketahui"""
+    report = {'current': process_memory()}
+    if master_pid:
+        workers = [m for m in (process_memory(pid) for pid in child_pids(master_pid)) if m]
+        report['master'] = process_memory(master_pid)
+        report['workers'] = workers
+        report['total_pss_mb'] = round(
+            sum(m.get('pss_mb', 0) for m in workers) + (report['master'] or {}).get('pss_mb', 0), 1
+        )
+    return report
@@ -0,0 +1,230 @@
+# ============================================================================
+# METRICS - Histograms / counters / gauges (Prometheus text) + stage timings
+# ============================================================================
+# stage(name) mencatat durasi satu tahap (feature build, historical lookup,
+# inference, serialization, load artifact, ...) ke histogram
+# traffic_stage_seconds{stage=...}. Di dalam request, durasi juga dikumpulkan
+# per request dan dikirim sebagai header Server-Timing (terlihat di DevTools).
+#
+# Registry ada per process: dengan beberapa gunicorn workers, /metrics menjawab
+# untuk worker yang menerima request (label pid di traffic_process_info).
+#
+# Profiler (opt-in): request dengan ?profile=1 dijalankan di bawah cProfile,
+# response diganti dengan pstats text (atau ?profile=prof: file .prof untuk
+# snakeviz / flameprof / gprof2dot).
+
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context
+
+# Detik; request cepat (cube lookup ~1 ms) sampai load artifact (puluhan detik)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base: nilai per kombinasi label; `fn` (opsional) dipanggil saat render -> {label tuple: value}"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {labels}')
+        return tuple(str(v) for v in labels)
+
+    def samples(self):
+        """[(suffix, label pairs, value)]"""
+        if self.fn is not None:
+            values = self.fn() or {}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [('', list(zip(self.labelnames, labels)), value) for labels, value in values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, pairs, value in self.samples():
+            if value is not None:
+                lines.append(f'{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)   # bucket pertama dengan le >= value
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        samples = []
+        for labels, (counts, total, count) in sorted(values.items()):
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                samples.append(('_bucket', pairs + [('le', _format_value(float(bound)))], cumulative))
+            samples.append(('_sum', pairs, round(total, 6)))
+            samples.append(('_count', pairs, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), fn=None):
+        return self._add(Counter(name, documentation, labelnames, fn))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None):
+        return self._add(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Satu callback gagal tidak boleh membuat seluruh scrape gagal
+                lines.append(f'# {metric.name} error: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram('traffic_stage_seconds',
+                                   'Durasi per stage (features, avg_lookup, inference, serialize, load_*, ...)',
+                                   ('stage',))
+
+# ============================================================================
+# STAGES (per request: header Server-Timing)
+# ============================================================================
+
+@contextmanager
+def stage(name):
+    """Catat durasi block ke traffic_stage_seconds dan ke stages request saat ini"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, name)
+        if has_request_context():
+            stages = g.setdefault('stages', {})
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def server_timing(total=None):
+    """Nilai header Server-Timing dari stages request ini (ms), None jika tidak ada"""
+    parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in g.get('stages', {}).items()]
+    if total is not None:
+        parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts) or None
+
+# ============================================================================
+# PROFILER (opt-in per request)
+# ============================================================================
+
+PROFILE_SORTS = ('cumulative', 'tottime', 'calls', 'ncalls')
+# Hanya satu cProfile aktif per process (Python 3.12+ menolak profiler kedua)
+_profile_lock = threading.Lock()
+
+
+def start_profile():
+    """cProfile untuk request ini; None jika profiler lain sedang berjalan"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def stop_profile(profiler):
+    """Stop profiler dan lepas lock (juga dipanggil jika view raise exception)"""
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+
+
+def profile_response(profiler, fmt='text', sort='cumulative', limit=40):
+    """Response hasil profiler yang sudah di-stop: pstats text, atau binary .prof jika fmt == 'prof'"""
+    if fmt == 'prof':
+        profiler.create_stats()
+        return Response(marshal.dumps(profiler.stats), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename=request.prof'})
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(sort if sort in PROFILE_SORTS else 'cumulative').print_stats(limit)
+    return Response(output.getvalue(), mimetype='text/plain')
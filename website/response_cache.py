@@ -0,0 +1,125 @@
+# ============================================================================
+# RESPONSE CACHE - LRU cache of serialized JSON + ETag / Cache-Control
+# ============================================================================
+# Endpoint prediksi deterministik untuk (endpoint, query args, data version).
+# Body JSON disimpan sebagai bytes (sudah di-serialize), dibatasi total bytes
+# dengan LRU eviction. Client yang mengirim If-None-Match dengan ETag yang sama
+# mendapat 304 tanpa body. Default 'no-cache': browser selalu revalidate, jadi
+# data baru (hot reload / live ingestion) langsung terlihat.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+
+class ResponseCache:
+    """Thread-safe LRU cache: key -> (body bytes, etag, mimetype), dibatasi jumlah bytes"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entries=1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old[0])
+            self.entries[key] = entry
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted[0])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def _not_modified(etag, cache_control):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def cached_response(cache, version, max_age=0, defaults=None):
+    """
+    Decorator untuk Flask view: cache response body per (endpoint, args, version)
+
+    Args:
+        cache: ResponseCache
+        version: Callable -> string data/model version (bagian dari key dan ETag)
+        max_age: Cache-Control max-age (detik) untuk request dengan args eksplisit;
+            0 = 'no-cache' (revalidate dengan ETag setiap request)
+        defaults: Dict arg -> callable untuk query arg yang default-nya berubah terhadap
+            waktu (mis. hour=now). Nilai ini ikut di key; response dikirim dengan
+            'no-cache' supaya browser selalu revalidate (tetap dapat 304 via ETag).
+    """
+    defaults = defaults or {}
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            query = sorted(request.args.items(multi=True))
+            implicit = sorted((name, str(fn())) for name, fn in defaults.items() if name not in request.args)
+            current_version = version()
+            key = (request.endpoint, tuple(query), tuple(implicit), current_version)
+            cache_control = 'no-cache' if implicit or not max_age else f'public, max-age={max_age}'
+
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(current_version.encode() + body).hexdigest()
+                entry = (body, etag, response.mimetype)
+                cache.put(key, entry)
+                hit = 'MISS'
+            else:
+                hit = 'HIT'
+
+            body, etag, mimetype = entry
+            # Weak comparison: response terkompresi dikirim dengan ETag weak (serialization.Compressor)
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag, cache_control)
+
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            response.headers['X-Cache'] = hit
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,161 @@
+# ============================================================================
+# SERIALIZATION - JSON cepat dari NumPy columns + negotiated compression
+# ============================================================================
+# - JSONProvider: orjson jika terinstall (NumPy arrays/scalars native, jauh lebih
+#   cepat dari json standar), fallback ke json standar. Serialisasi tercatat
+#   sebagai stage 'serialize' (metrics.py).
+# - Columnar shape (?shape=columns): parallel arrays per field, bukan array of
+#   objects. Nama field tidak diulang per sensor dan arrays langsung dari NumPy.
+# - Compressor (after_request): gzip / brotli sesuai Accept-Encoding (br jika modul
+#   brotli ada). Response dengan ETag (response cache, payload statis) dikompres
+#   sekali per (ETag, encoding) dengan level tinggi dan disimpan; response lain
+#   dikompres per request dengan level cepat.
+
+import gzip
+import json
+import threading
+
+import numpy as np
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import stage
+from response_cache import ResponseCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_SHAPES = ('records', 'columns')
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+# (dynamic, precompressed) level per encoding
+GZIP_LEVELS = (6, 9)
+BROTLI_QUALITY = (4, 6)   # quality >= 7: hanya beberapa persen lebih kecil, jauh lebih lambat
+
+
+def _default(value):
+    """NumPy scalar / array untuk json standar, selain itu default Flask (date, UUID, dataclass)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return DefaultJSONProvider.default(value)
+
+
+def dumps(obj):
+    """JSON compact (bytes), key diurutkan seperti jsonify"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, default=_default, separators=(',', ':'), sort_keys=True).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """JSON provider Flask: jsonify() lewat dumps() (orjson), indent (debug) tetap json standar"""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            if kwargs.get('indent') is None:
+                return dumps(obj).decode()
+            kwargs.setdefault('default', _default)
+            return super().dumps(obj, **kwargs)
+
+
+def parse_shape(value):
+    """?shape= -> 'records' (default, array of objects) atau 'columns'"""
+    shape = value or 'records'
+    if shape not in RESPONSE_SHAPES:
+        raise ValueError(f"shape must be one of {', '.join(RESPONSE_SHAPES)}")
+    return shape
+
+
+def take(values, rows):
+    """Subset satu column (NumPy array atau list) untuk index rows"""
+    if isinstance(values, np.ndarray):
+        return values[rows]
+    return [values[i] for i in rows]
+
+
+def records_from_columns(columns, n):
+    """Columns (arrays/lists, nested dict = object) -> list of dict, n baris"""
+    names, values = [], []
+    for name, column in columns.items():
+        names.append(name)
+        if isinstance(column, dict):
+            values.append(records_from_columns(column, n))
+        else:
+            values.append(column.tolist() if isinstance(column, np.ndarray) else column)
+    return [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in range(n)]
+
+
+def round_list(values, digits):
+    """round() Python per nilai (sama persis dengan round(float(x), digits))"""
+    return [round(v, digits) for v in np.asarray(values, dtype=np.float64).tolist()]
+
+# ============================================================================
+# COMPRESSION
+# ============================================================================
+
+class Compressor:
+    """Negotiated gzip / brotli untuk Flask responses, dengan cache hasil kompresi per ETag"""
+
+    def __init__(self, min_bytes=1024, cache_bytes=16 * 1024 * 1024):
+        self.min_bytes = min_bytes
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        self.cache = ResponseCache(max_bytes=cache_bytes)
+        self.bytes_in = {}
+        self.bytes_out = {}
+        self.lock = threading.Lock()
+
+    def compress(self, data, encoding, precompress=False):
+        if encoding == 'br':
+            return brotli.compress(data, quality=BROTLI_QUALITY[precompress])
+        return gzip.compress(data, compresslevel=GZIP_LEVELS[precompress], mtime=0)
+
+    def __call__(self, response):
+        """after_request hook"""
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < self.min_bytes:
+            return response
+
+        etag, _ = response.get_etag()
+        with stage('compress'):
+            if etag:
+                key = (etag, encoding)
+                entry = self.cache.get(key)
+                if entry is None:
+                    entry = (self.compress(data, encoding, precompress=True),)
+                    self.cache.put(key, entry)
+                compressed = entry[0]
+            else:
+                compressed = self.compress(data, encoding)
+
+        with self.lock:
+            self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + len(data)
+            self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + len(compressed)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # Representasi berbeda dari body asli: ETag weak (If-None-Match memakai weak comparison)
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        with self.lock:
+            return {
+                'encodings': list(self.encodings),
+                'bytes_in': dict(self.bytes_in),
+                'bytes_out': dict(self.bytes_out),
+                'precompressed': self.cache.stats()
+            }
@@ -0,0 +1,151 @@
+# ============================================================================
+# SPATIAL INDEX - Grid index lat/long untuk viewport (bbox) dan clustering
+# ============================================================================
+# Points di-sort per grid cell (CSR: order + offsets), jadi query bbox hanya
+# membaca cells yang overlap viewport: satu searchsorted per baris cell, lalu
+# filter exact. Biaya query sebanding dengan jumlah sensor yang terlihat,
+# bukan jumlah total detector.
+#
+# Pada zoom rendah, sensor yang terlihat digabung per cell layar (cluster_points):
+# satu marker per cluster dengan jumlah sensor per status.
+
+import math
+
+import numpy as np
+
+# Ukuran grid cell index (derajat). ~1.1 km lat: beberapa sensor per cell di Marseille
+GRID_CELL_DEG = 0.01
+# Jarak antar cluster di layar (pixel, tile 256 px) pada zoom rendah
+CLUSTER_CELL_PX = 64
+# Rentang zoom peta (Leaflet / OSM tiles)
+MIN_ZOOM, MAX_ZOOM = 0, 22
+
+
+def parse_bbox(value):
+    """'west,south,east,north' (format Leaflet toBBoxString) -> tuple float, None jika kosong"""
+    if not value:
+        return None
+    parts = [float(v) for v in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be west,south,east,north')
+    if not all(math.isfinite(v) for v in parts):
+        raise ValueError('bbox values must be finite numbers')
+    west, south, east, north = parts
+    if south > north or west > east:
+        raise ValueError('bbox must be west,south,east,north with west <= east and south <= north')
+    # Leaflet bisa memberi long di luar +-180 (peta di-wrap); points selalu di dalam rentang ini
+    return max(west, -180.0), max(south, -90.0), min(east, 180.0), min(north, 90.0)
+
+
+def clamp_zoom(zoom):
+    """Zoom ke [MIN_ZOOM, MAX_ZOOM], None tetap None"""
+    return None if zoom is None else min(max(int(zoom), MIN_ZOOM), MAX_ZOOM)
+
+
+class GridIndex:
+    """Grid index statis atas arrays lat/long (NaN diabaikan)"""
+
+    def __init__(self, lat, long, cell=GRID_CELL_DEG):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.long = np.asarray(long, dtype=np.float64)
+        self.cell = cell
+        valid = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.long))
+        if len(valid) == 0:
+            self.order = valid
+            self.keys = np.empty(0, dtype=np.int64)
+            return
+
+        self.row0 = int(math.floor(self.lat[valid].min() / cell))
+        self.col0 = int(math.floor(self.long[valid].min() / cell))
+        self.n_cols = int(math.floor(self.long[valid].max() / cell)) - self.col0 + 1
+        rows = np.floor(self.lat[valid] / cell).astype(np.int64) - self.row0
+        cols = np.floor(self.long[valid] / cell).astype(np.int64) - self.col0
+        keys = rows * self.n_cols + cols
+        sort = np.argsort(keys, kind='stable')
+        self.order = valid[sort]
+        self.keys = keys[sort]
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, bbox):
+        """Index points di dalam bbox (west, south, east, north), urutan asli"""
+        if len(self.order) == 0:
+            return np.empty(0, dtype=np.int64)
+        west, south, east, north = bbox
+        n_rows = int(self.keys[-1] // self.n_cols) + 1
+        row_lo = max(int(math.floor(south / self.cell)) - self.row0, 0)
+        row_hi = min(int(math.floor(north / self.cell)) - self.row0, n_rows - 1)
+        col_lo = max(int(math.floor(west / self.cell)) - self.col0, 0)
+        col_hi = min(int(math.floor(east / self.cell)) - self.col0, self.n_cols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+
+        # Per baris cell, cells [col_lo, col_hi] berurutan di keys
+        rows = np.arange(row_lo, row_hi + 1)
+        starts = np.searchsorted(self.keys, rows * self.n_cols + col_lo, side='left')
+        ends = np.searchsorted(self.keys, rows * self.n_cols + col_hi, side='right')
+        candidates = np.concatenate([self.order[s:e] for s, e in zip(starts, ends)]) if len(rows) else self.order[:0]
+
+        lat, long = self.lat[candidates], self.long[candidates]
+        inside = (lat >= south) & (lat <= north) & (long >= west) & (long <= east)
+        return np.sort(candidates[inside])
+
+
+def cluster_cell_size(zoom, lat):
+    """(cell lat, cell long) dalam derajat untuk CLUSTER_CELL_PX pada zoom (Web Mercator)"""
+    cell_long = CLUSTER_CELL_PX / 256 * 360 / 2 ** clamp_zoom(zoom)
+    return cell_long * math.cos(math.radians(lat)), cell_long
+
+
+def cluster_points(lat, long, levels, zoom):
+    """
+    Gabung points per cell layar
+
+    Args:
+        lat, long: arrays points yang terlihat
+        levels: status 0/1/2 per point (None = tanpa status)
+        zoom: zoom level peta
+
+    Returns:
+        List dict (lat/long rata-rata, count, bounds, stats per status jika levels ada),
+        cluster terbesar dulu
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    long = np.asarray(long, dtype=np.float64)
+    if len(lat) == 0:
+        return []
+    cell_lat, cell_long = cluster_cell_size(zoom, float(np.mean(lat)))
+    rows = np.floor(lat / cell_lat).astype(np.int64)
+    cols = np.floor(long / cell_long).astype(np.int64)
+    _, inverse = np.unique((rows - rows.min()) * (cols.max() - cols.min() + 1) + (cols - cols.min()),
+                           return_inverse=True)
+    n = inverse.max() + 1
+
+    counts = np.bincount(inverse, minlength=n)
+    mean_lat = np.bincount(inverse, weights=lat, minlength=n) / counts
+    mean_long = np.bincount(inverse, weights=long, minlength=n) / counts
+    south = np.full(n, np.inf)
+    north = np.full(n, -np.inf)
+    west = np.full(n, np.inf)
+    east = np.full(n, -np.inf)
+    np.minimum.at(south, inverse, lat)
+    np.maximum.at(north, inverse, lat)
+    np.minimum.at(west, inverse, long)
+    np.maximum.at(east, inverse, long)
+    level_counts = None
+    if levels is not None:
+        level_counts = np.bincount(inverse * 3 + np.asarray(levels, dtype=np.int64), minlength=n * 3).reshape(n, 3)
+
+    clusters = []
+    for i in np.argsort(-counts, kind='stable'):
+        cluster = {
+            'lat': round(float(mean_lat[i]), 6),
+            'long': round(float(mean_long[i]), 6),
+            'count': int(counts[i]),
+            'bounds': [float(west[i]), float(south[i]), float(east[i]), float(north[i])]
+        }
+        if level_counts is not None:
+            cluster['levels'] = level_counts[i].tolist()
+        clusters.append(cluster)
+    return clusters
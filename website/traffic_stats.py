@@ -0,0 +1,207 @@
+# ============================================================================
+# TRAFFIC STATISTICS - Streaming aggregation of marseille_clean.csv
+# ============================================================================
+# Membaca CSV per chunk (peak memory ~ chunksize, bukan ukuran file) dan
+# menyimpan statistik sebagai accumulator (count, mean, M2):
+#   - occupancy per (detector, day_of_week, hour) -> historical averages
+#   - flow per (detector, day_of_week, hour)      -> historical flow averages
+#   - occupancy per detector                      -> mean/std/count untuk clustering
+# Chunk digabung dengan parallel-merge (Chan et al.), jadi hasilnya identik
+# dengan groupby atas seluruh file tanpa pernah memuat semuanya sekaligus.
+# Accumulator yang sama dipakai untuk live readings (update per batch, tanpa
+# membaca ulang CSV).
+
+import numpy as np
+import pandas as pd
+
+TRAFFIC_USECOLS = ['detid', 'datetime', 'occ', 'flow']
+TRAFFIC_DTYPES = {'detid': 'category', 'occ': 'float32', 'flow': 'float32'}
+DEFAULT_CHUNKSIZE = 250_000
+# Naikkan jika kolom to_frames() berubah (bagian dari nama cache)
+FRAMES_VERSION = 2
+
+HOURLY_ACCUMULATORS = ('hourly_count', 'hourly_mean', 'hourly_m2',
+                       'hourly_flow_count', 'hourly_flow_mean', 'hourly_flow_m2')
+DETECTOR_ACCUMULATORS = ('detector_count', 'detector_mean', 'detector_m2')
+
+
+def merge_moments(count, mean, m2, count_b, mean_b, m2_b):
+    """Gabungkan dua set (count, mean, M2) secara in-place ke (count, mean, m2)"""
+    total = count + count_b
+    has_new = count_b > 0
+    delta = mean_b - mean
+    safe_total = np.where(total > 0, total, 1)
+    mean[has_new] += (delta * count_b / safe_total)[has_new]
+    m2[has_new] += (m2_b + delta ** 2 * count * count_b / safe_total)[has_new]
+    count[:] = total
+
+
+def batch_moments(keys, values, size):
+    """(count, mean, M2) per key untuk satu batch, via bincount"""
+    count = np.bincount(keys, minlength=size).astype(np.float64)
+    sums = np.bincount(keys, weights=values, minlength=size)
+    mean = np.divide(sums, count, out=np.zeros(size), where=count > 0)
+    m2 = np.bincount(keys, weights=(values - mean[keys]) ** 2, minlength=size)
+    return count, mean, m2
+
+
+class TrafficAggregates:
+    """Accumulator statistik occupancy/flow per detector dan per (detector, day, hour)"""
+
+    def __init__(self):
+        self.detector_ids = []
+        self.detector_index = {}
+        for name in HOURLY_ACCUMULATORS:
+            setattr(self, name, np.zeros((0, 7, 24)))
+        for name in DETECTOR_ACCUMULATORS:
+            setattr(self, name, np.zeros(0))
+
+    def detector_rows(self, detector_ids):
+        """Row index untuk setiap detector, detector baru ditambahkan"""
+        rows = np.empty(len(detector_ids), dtype=np.int64)
+        for i, detid in enumerate(detector_ids):
+            row = self.detector_index.get(detid)
+            if row is None:
+                row = len(self.detector_ids)
+                self.detector_index[detid] = row
+                self.detector_ids.append(detid)
+            rows[i] = row
+        self._grow(len(self.detector_ids))
+        return rows
+
+    def _grow(self, n):
+        extra = n - len(self.detector_count)
+        if extra <= 0:
+            return
+        for name in HOURLY_ACCUMULATORS:
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros((extra, 7, 24))]))
+        for name in DETECTOR_ACCUMULATORS:
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra)]))
+
+    def update(self, rows, days, hours, occ, flow=None):
+        """Tambahkan batch readings (row detector, day_of_week, hour, occ[, flow])"""
+        occ = np.asarray(occ, dtype=np.float64)
+        n = len(self.detector_ids)
+
+        keys = (rows * 7 + days) * 24 + hours
+        batch = batch_moments(keys, occ, n * 7 * 24)
+        merge_moments(self.hourly_count.reshape(-1), self.hourly_mean.reshape(-1), self.hourly_m2.reshape(-1), *batch)
+
+        batch = batch_moments(rows, occ, n)
+        merge_moments(self.detector_count, self.detector_mean, self.detector_m2, *batch)
+
+        if flow is not None:
+            flow = np.asarray(flow, dtype=np.float64)
+            has_flow = ~np.isnan(flow)
+            batch = batch_moments(keys[has_flow], flow[has_flow], n * 7 * 24)
+            merge_moments(self.hourly_flow_count.reshape(-1), self.hourly_flow_mean.reshape(-1),
+                          self.hourly_flow_m2.reshape(-1), *batch)
+
+    def update_frame(self, chunk):
+        """Tambahkan satu chunk DataFrame (detid, datetime, occ[, flow])"""
+        chunk = chunk.dropna(subset=['detid', 'occ'])
+        if len(chunk) == 0:
+            return
+
+        detid = chunk['detid']
+        if isinstance(detid.dtype, pd.CategoricalDtype):
+            # Map kategori (sedikit) ke row global, lalu index dengan codes
+            category_rows = self.detector_rows(list(detid.cat.categories))
+            rows = category_rows[detid.cat.codes.to_numpy()]
+        else:
+            codes, uniques = pd.factorize(detid)
+            rows = self.detector_rows(list(uniques))[codes]
+
+        timestamps = pd.to_datetime(chunk['datetime'])
+        flow = chunk['flow'].to_numpy() if 'flow' in chunk.columns else None
+        self.update(rows, timestamps.dt.dayofweek.to_numpy(), timestamps.dt.hour.to_numpy(),
+                    chunk['occ'].to_numpy(), flow)
+
+    def hourly_avg_table(self):
+        """float32 (n_detectors, 7, 24) rata-rata occupancy, NaN jika tidak ada data"""
+        table = np.where(self.hourly_count > 0, self.hourly_mean, np.nan)
+        return table.astype(np.float32)
+
+    def hourly_flow_table(self):
+        """float32 (n_detectors, 7, 24) rata-rata flow, NaN jika tidak ada data"""
+        table = np.where(self.hourly_flow_count > 0, self.hourly_flow_mean, np.nan)
+        return table.astype(np.float32)
+
+    def sensor_stats(self):
+        """DataFrame per detector: detid, avg_occ, std_occ, count (std ddof=1 seperti pandas)"""
+        count = self.detector_count
+        std = np.sqrt(np.divide(self.detector_m2, count - 1, out=np.full(len(count), np.nan), where=count > 1))
+        return pd.DataFrame({
+            'detid': self.detector_ids,
+            'avg_occ': self.detector_mean,
+            'std_occ': std,
+            'count': count.astype(np.int64)
+        })
+
+    @property
+    def total_records(self):
+        return int(self.detector_count.sum())
+
+    def to_frames(self):
+        """Accumulator sebagai DataFrame kolumnar (untuk Parquet/Feather cache)"""
+        rows, days, hours = np.nonzero((self.hourly_count > 0) | (self.hourly_flow_count > 0))
+        detector_ids = np.asarray(self.detector_ids, dtype=object)
+        hourly = pd.DataFrame({
+            'detid': detector_ids[rows],
+            'day_of_week': days.astype(np.int8),
+            'hour': hours.astype(np.int8),
+            'count': self.hourly_count[rows, days, hours],
+            'mean': self.hourly_mean[rows, days, hours],
+            'm2': self.hourly_m2[rows, days, hours],
+            'flow_count': self.hourly_flow_count[rows, days, hours],
+            'flow_mean': self.hourly_flow_mean[rows, days, hours],
+            'flow_m2': self.hourly_flow_m2[rows, days, hours]
+        })
+        detectors = pd.DataFrame({
+            'detid': detector_ids,
+            'count': self.detector_count,
+            'mean': self.detector_mean,
+            'm2': self.detector_m2
+        })
+        return {'hourly': hourly, 'detectors': detectors}
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Kebalikan dari to_frames()"""
+        aggregates = cls()
+        detectors = frames['detectors']
+        aggregates.detector_rows(list(detectors['detid']))
+        aggregates.detector_count[:] = detectors['count'].to_numpy()
+        aggregates.detector_mean[:] = detectors['mean'].to_numpy()
+        aggregates.detector_m2[:] = detectors['m2'].to_numpy()
+
+        hourly = frames['hourly']
+        codes, uniques = pd.factorize(hourly['detid'])
+        rows = aggregates.detector_rows(list(uniques))[codes]
+        days = hourly['day_of_week'].to_numpy(dtype=np.int64)
+        hours = hourly['hour'].to_numpy(dtype=np.int64)
+        aggregates.hourly_count[rows, days, hours] = hourly['count'].to_numpy()
+        aggregates.hourly_mean[rows, days, hours] = hourly['mean'].to_numpy()
+        aggregates.hourly_m2[rows, days, hours] = hourly['m2'].to_numpy()
+        aggregates.hourly_flow_count[rows, days, hours] = hourly['flow_count'].to_numpy()
+        aggregates.hourly_flow_mean[rows, days, hours] = hourly['flow_mean'].to_numpy()
+        aggregates.hourly_flow_m2[rows, days, hours] = hourly['flow_m2'].to_numpy()
+        return aggregates
+
+
+def aggregate_traffic_csv(path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming aggregation seluruh file traffic CSV dalam satu pass
+
+    Args:
+        path: Path ke marseille_clean.csv (kolom detid, datetime, occ, flow)
+        chunksize: Jumlah baris per chunk (membatasi peak memory)
+
+    Returns:
+        TrafficAggregates
+    """
+    aggregates = TrafficAggregates()
+    reader = pd.read_csv(path, usecols=TRAFFIC_USECOLS, dtype=TRAFFIC_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        aggregates.update_frame(chunk)
+    return aggregates